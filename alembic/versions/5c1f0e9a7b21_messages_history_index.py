@@ -0,0 +1,33 @@
+"""messages (chat_id, created_at, id) index for history pagination
+
+Revision ID: 5c1f0e9a7b21
+Revises: a244f0fca603
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0e9a7b21'
+down_revision: Union[str, Sequence[str], None] = 'a244f0fca603'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_chat_created_id', 'messages', ['chat_id', 'created_at', 'id'], unique=False
+    )
+    # Префикс нового индекса полностью покрывает старый ix_messages_chat_id
+    op.drop_index('ix_messages_chat_id', table_name='messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_messages_chat_id', 'messages', ['chat_id'], unique=False)
+    op.drop_index('ix_messages_chat_created_id', table_name='messages')
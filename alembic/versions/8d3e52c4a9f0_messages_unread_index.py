@@ -0,0 +1,31 @@
+"""partial index on unread messages for chat list counters
+
+Revision ID: 8d3e52c4a9f0
+Revises: 5c1f0e9a7b21
+Create Date: 2026-10-18 11:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3e52c4a9f0'
+down_revision: Union[str, Sequence[str], None] = '5c1f0e9a7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_unread', 'messages', ['chat_id', 'sender_id'],
+        unique=False, postgresql_where=sa.text('is_read = false')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_unread', table_name='messages')
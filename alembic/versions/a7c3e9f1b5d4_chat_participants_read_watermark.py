@@ -0,0 +1,68 @@
+"""chat_participants read watermark instead of messages.is_read
+
+Revision ID: a7c3e9f1b5d4
+Revises: f6b2d8e0a4c3
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f1b5d4'
+down_revision: Union[str, Sequence[str], None] = 'f6b2d8e0a4c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'chat_participants',
+        sa.Column('chat_id', sa.BigInteger(), sa.ForeignKey('chats.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('last_read_message_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('chat_id', 'user_id'),
+    )
+    op.create_index('ix_chat_participants_user_id', 'chat_participants', ['user_id'])
+    op.create_index('ix_messages_chat_id_id', 'messages', ['chat_id', 'id'])
+
+    # Watermark — до первого непрочитанного входящего; если их нет — до
+    # последнего сообщения чата. Непрочитанные остаются непрочитанными.
+    op.execute("""
+        INSERT INTO chat_participants (chat_id, user_id, last_read_message_id)
+        SELECT p.chat_id, p.user_id, COALESCE(
+            (SELECT min(m.id) - 1 FROM messages m
+             WHERE m.chat_id = p.chat_id AND m.sender_id <> p.user_id AND m.is_read = false),
+            (SELECT max(m.id) FROM messages m WHERE m.chat_id = p.chat_id),
+            0
+        )
+        FROM (
+            SELECT id AS chat_id, buyer_id AS user_id FROM chats
+            UNION
+            SELECT id, seller_id FROM chats
+        ) p
+    """)
+
+    op.drop_index('ix_messages_unread', table_name='messages')
+    op.drop_column('messages', 'is_read')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('messages', sa.Column('is_read', sa.Boolean(), server_default='false', nullable=False))
+    op.execute("""
+        UPDATE messages m SET is_read = true
+        FROM chat_participants p
+        WHERE p.chat_id = m.chat_id AND p.user_id <> m.sender_id AND m.id <= p.last_read_message_id
+    """)
+    op.create_index(
+        'ix_messages_unread', 'messages', ['chat_id', 'sender_id'],
+        unique=False, postgresql_where=sa.text('is_read = false')
+    )
+    op.drop_index('ix_messages_chat_id_id', table_name='messages')
+    op.drop_index('ix_chat_participants_user_id', table_name='chat_participants')
+    op.drop_table('chat_participants')
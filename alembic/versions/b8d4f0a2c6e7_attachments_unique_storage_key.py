@@ -0,0 +1,44 @@
+"""unique storage_key for attachments
+
+Revision ID: b8d4f0a2c6e7
+Revises: a7c3e9f1b5d4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f0a2c6e7'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e9f1b5d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Повторно завершённые прямые загрузки: сообщения и refcount — на первую запись
+    op.execute("""
+        UPDATE messages SET attachment_id = (
+            SELECT MIN(a2.id) FROM attachments a1
+            JOIN attachments a2 ON a2.storage_key = a1.storage_key
+            WHERE a1.id = messages.attachment_id
+        )
+        WHERE attachment_id IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE attachments SET refcount = (
+            SELECT SUM(a2.refcount) FROM attachments a2 WHERE a2.storage_key = attachments.storage_key
+        )
+        WHERE id IN (SELECT MIN(id) FROM attachments GROUP BY storage_key HAVING COUNT(*) > 1)
+    """)
+    op.execute("DELETE FROM attachments WHERE id NOT IN (SELECT MIN(id) FROM attachments GROUP BY storage_key)")
+    op.create_unique_constraint('uq_attachments_storage_key', 'attachments', ['storage_key'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_attachments_storage_key', 'attachments', type_='unique')
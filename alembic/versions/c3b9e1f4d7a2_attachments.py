@@ -0,0 +1,46 @@
+"""attachments table with content hash and refcount
+
+Revision ID: c3b9e1f4d7a2
+Revises: 8d3e52c4a9f0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b9e1f4d7a2'
+down_revision: Union[str, Sequence[str], None] = '8d3e52c4a9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'attachments',
+        sa.Column('id', sa.BigInteger(), primary_key=True, nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('storage_key', sa.String(length=500), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()')),
+        sa.UniqueConstraint('sha256', name='uq_attachments_sha256'),
+    )
+    # Старые сообщения остаются со своим file_url без вложения
+    op.add_column('messages', sa.Column('attachment_id', sa.BigInteger(), nullable=True))
+    op.create_foreign_key(
+        'fk_messages_attachment', 'messages', 'attachments', ['attachment_id'], ['id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('fk_messages_attachment', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'attachment_id')
+    op.drop_table('attachments')
@@ -0,0 +1,36 @@
+"""thumbnail and blurhash columns for attachments and messages
+
+Revision ID: d4f0a2b8e6c1
+Revises: c3b9e1f4d7a2
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f0a2b8e6c1'
+down_revision: Union[str, Sequence[str], None] = 'c3b9e1f4d7a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('attachments', sa.Column('thumbnail_key', sa.String(length=500), nullable=True))
+    op.add_column('attachments', sa.Column('thumbnail_url', sa.String(length=500), nullable=True))
+    op.add_column('attachments', sa.Column('blurhash', sa.String(length=100), nullable=True))
+    op.add_column('messages', sa.Column('thumbnail_url', sa.String(length=500), nullable=True))
+    op.add_column('messages', sa.Column('blurhash', sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'blurhash')
+    op.drop_column('messages', 'thumbnail_url')
+    op.drop_column('attachments', 'blurhash')
+    op.drop_column('attachments', 'thumbnail_url')
+    op.drop_column('attachments', 'thumbnail_key')
@@ -0,0 +1,39 @@
+"""chats buyer_id / seller_id indexes, outbox_events.user_id for personal channels
+
+Revision ID: f6b2d8e0a4c3
+Revises: e5a1c7d9f3b2
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b2d8e0a4c3'
+down_revision: Union[str, Sequence[str], None] = 'e5a1c7d9f3b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Подписка /ws на все чаты пользователя: buyer_id = ? OR seller_id = ?
+    op.create_index('ix_chats_buyer_id', 'chats', ['buyer_id'], unique=False)
+    op.create_index('ix_chats_seller_id', 'chats', ['seller_id'], unique=False)
+    # События личного канала /ws: получатель — user_id, chat_id — настоящий чат
+    op.add_column('outbox_events', sa.Column('user_id', sa.BigInteger(), nullable=True))
+    op.create_index(
+        'ix_outbox_events_user_id', 'outbox_events', ['user_id', 'id'],
+        postgresql_where=sa.text('user_id IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_events_user_id', table_name='outbox_events')
+    op.drop_column('outbox_events', 'user_id')
+    op.drop_index('ix_chats_seller_id', table_name='chats')
+    op.drop_index('ix_chats_buyer_id', table_name='chats')
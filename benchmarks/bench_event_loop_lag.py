@@ -0,0 +1,172 @@
+"""
+Бенчмарк задержки event loop под параллельной нагрузкой на POST /support/chat.
+
+Сравнивает прежнее чтение промпта синхронным redis.Redis (каждый GET
+блокирует цикл на сетевой round trip) с services.prompts на redis.asyncio
+без кэша в памяти и с ним (PROMPT_CACHE_TTL). Redis — fakeredis TCP-сервер за прокси с задержкой
+--redis-latency-ms, Grok — фейковый upstream с задержкой --grok-ms.
+
+Задержка цикла меряется фоновой задачей: насколько позже запланированного
+она просыпается после asyncio.sleep.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_event_loop_lag --n 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+
+from benchmarks.common import Timer, create_engine, monitor_lag, percentiles, reset_schema, session_factory
+
+import fakeredis
+import redis
+import redis.asyncio as aioredis
+
+from core.config import settings
+from core.database import get_db
+from core.http import http_clients
+from main import app
+
+PROMPT_KEY = "support_prompt"
+
+
+class LatencyProxy(threading.Thread):
+    """TCP-прокси, задерживающий каждый ответ upstream на latency секунд."""
+
+    def __init__(self, target_port: int, latency: float):
+        super().__init__(daemon=True)
+        self.target_port = target_port
+        self.latency = latency
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+
+    @staticmethod
+    def _pump(src: socket.socket, dst: socket.socket, delay: float):
+        try:
+            while data := src.recv(65536):
+                if delay:
+                    time.sleep(delay)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            dst.close()
+
+    def run(self):
+        while True:
+            client, _ = self.sock.accept()
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            threading.Thread(target=self._pump, args=(client, upstream, 0), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client, self.latency), daemon=True).start()
+
+
+def start_redis(latency_ms: float) -> int:
+    """Поднимает fakeredis TCP-сервер за прокси с задержкой; возвращает порт прокси."""
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0))
+    # Потоки соединений не должны держать процесс после завершения
+    server.daemon_threads = True
+    server.block_on_close = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = LatencyProxy(server.server_address[1], latency_ms / 1000)
+    proxy.start()
+    return proxy.port
+
+
+async def run_variant(name: str, client: httpx.AsyncClient, n: int, concurrency: int) -> dict:
+    lag: list[float] = []
+    latency: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            with Timer(latency):
+                resp = await client.post("/support/chat", json={"user_id": i % 50 + 1, "message": "Привет"})
+                resp.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "variant": name,
+        "throughput_rps": round(n / elapsed, 1),
+        "request": percentiles(latency),
+        "loop_lag": percentiles(lag),
+    }
+
+
+async def main(n: int, concurrency: int, redis_latency_ms: float, grok_ms: float):
+    # Синхронные обработчики логов сами блокируют цикл — здесь меряем только Redis
+    logging.getLogger().setLevel(logging.WARNING)
+    port = start_redis(redis_latency_ms)
+    sync_redis = redis.Redis(port=port, decode_responses=True)
+    async_redis = aioredis.Redis(
+        connection_pool=aioredis.BlockingConnectionPool(port=port, decode_responses=True, max_connections=concurrency)
+    )
+    sync_redis.set(PROMPT_KEY, "Ты — ассистент поддержки.")
+
+    def legacy_read_prompt() -> str:
+        """Прежний read_prompt: синхронный GET прямо в обработчике."""
+        return sync_redis.get(PROMPT_KEY)
+
+    async def legacy_read_prompt_in_handler() -> str:
+        return legacy_read_prompt()
+
+    async def fake_grok(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(grok_ms / 1000)
+        return httpx.Response(200, json={"reply": "Здравствуйте!"})
+
+    http_clients.register("grok", timeout=30, max_connections=concurrency,
+                          transport=httpx.MockTransport(fake_grok))
+
+    engine = create_engine()
+    await reset_schema(engine)
+    sessions = session_factory(engine)
+
+    async def bench_db():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = bench_db
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        with patch("services.grok.read_prompt", legacy_read_prompt_in_handler):
+            # Прогрев: комнаты поддержки и кэши компиляции запросов
+            await run_variant("warmup", client, 50, concurrency)
+            results.append(await run_variant("sync_redis", client, n, concurrency))
+
+        with patch("services.prompts.get_async_redis", return_value=async_redis):
+            with patch.object(settings, "PROMPT_CACHE_TTL", 0):
+                await run_variant("warmup", client, 50, concurrency)
+                results.append(await run_variant("async_redis", client, n, concurrency))
+
+            await run_variant("warmup", client, 50, concurrency)
+            results.append(await run_variant("in_process_cache", client, n, concurrency))
+
+    app.dependency_overrides.pop(get_db, None)
+    await http_clients.aclose()
+    await async_redis.aclose()
+    await engine.dispose()
+    print(json.dumps({"benchmark": "event_loop_lag", "database": engine.url.get_backend_name(),
+                      "redis_latency_ms": redis_latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=500, help="число запросов на вариант")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-latency-ms", type=float, default=2.0, help="задержка ответа Redis")
+    parser.add_argument("--grok-ms", type=float, default=50.0, help="задержка ответа Grok")
+    args = parser.parse_args()
+    asyncio.run(main(args.n, args.concurrency, args.redis_latency_ms, args.grok_ms))
@@ -0,0 +1,90 @@
+"""
+Бенчмарк HTTP-клиентов upstream: новый httpx.AsyncClient на каждый запрос
+(прежнее поведение grok/PocketBase) против общего пула из core.http.
+
+Поднимает локальный HTTP/1.1 сервер с keep-alive и задержкой ответа
+--delay-ms, гоняет --n запросов с параллелизмом --concurrency.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_http_clients --n 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.common import Timer, percentiles
+from core.http import HttpClientRegistry
+
+
+async def start_upstream(delay_ms: float):
+    """Локальный upstream; возвращает (server, url, счётчик соединений)."""
+    connections = [0]
+
+    async def handle(reader, writer):
+        connections[0] += 1
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                await asyncio.sleep(delay_ms / 1000)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/", connections
+
+
+async def run(n: int, concurrency: int, request) -> list[float]:
+    samples: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            with Timer(samples):
+                await request()
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return samples
+
+
+async def main(n: int, concurrency: int, delay_ms: float):
+    server, url, connections = await start_upstream(delay_ms)
+    results = {}
+
+    async def per_call():
+        async with httpx.AsyncClient() as client:
+            (await client.get(url)).raise_for_status()
+
+    samples = await run(n, concurrency, per_call)
+    results["client_per_call"] = {**percentiles(samples), "connections": connections[0]}
+
+    connections[0] = 0
+    registry = HttpClientRegistry()
+    registry.register("bench", timeout=30, max_connections=concurrency, http2=False)
+    client = registry.get("bench")
+
+    async def pooled():
+        (await client.get(url)).raise_for_status()
+
+    samples = await run(n, concurrency, pooled)
+    await registry.aclose()
+    results["shared_pool"] = {**percentiles(samples), "connections": connections[0], **registry.stats()["bench"]}
+
+    server.close()
+    await server.wait_closed()
+    print(json.dumps({"benchmark": "http_clients", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=1000, help="число запросов на вариант")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=1.0, help="задержка ответа upstream")
+    args = parser.parse_args()
+    asyncio.run(main(args.n, args.concurrency, args.delay_ms))
@@ -0,0 +1,152 @@
+"""
+Бенчмарк задержки запросов POST /support/chat с включённым логированием.
+
+Сравнивает прежнюю схему (RotatingFileHandler и StreamHandler прямо на
+корневом логгере: запись на диск и ротация в потоке event loop) с
+core.logger: QueueHandler с ограниченной очередью и QueueListener.
+--disk-latency-ms моделирует медленный диск (сетевой том, конкуренция
+за I/O) задержкой каждой записи в файл. Консольный вывод уходит в /dev/null.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_logging --n 500 --concurrency 50 --level DEBUG
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from unittest.mock import patch
+
+import httpx
+from fakeredis import aioredis as fake_aioredis
+
+from benchmarks.common import Timer, create_engine, monitor_lag, percentiles, reset_schema, session_factory
+
+import core.logger as app_logging
+from core.config import settings
+from core.database import get_db
+from core.http import http_clients
+from main import app
+
+# Логгеры приложения; библиотеки остаются на уровне INFO корневого логгера
+APP_LOGGERS = ("api", "crud", "services", "core")
+
+
+class SlowFileHandler(RotatingFileHandler):
+    """Файловый обработчик с задержкой записи — модель медленного диска."""
+
+    latency = 0.0
+
+    def emit(self, record):
+        if self.latency:
+            time.sleep(self.latency)
+        super().emit(record)
+
+
+def legacy_handlers(log_dir: str) -> list[logging.Handler]:
+    """Прежний core.logger: обработчики прямо на корневом логгере."""
+    formatter = logging.Formatter(app_logging.TEXT_FORMAT)
+    file_handler = SlowFileHandler(os.path.join(log_dir, "legacy.log"), maxBytes=5_000_000, backupCount=5,
+                                   encoding="utf-8")
+    console_handler = logging.StreamHandler(open(os.devnull, "w"))
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    return [file_handler, console_handler]
+
+
+async def run_variant(name: str, client: httpx.AsyncClient, n: int, concurrency: int) -> dict:
+    lag: list[float] = []
+    latency: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            with Timer(latency):
+                resp = await client.post("/support/chat", json={"user_id": i % 50 + 1, "message": "Привет"})
+                resp.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "variant": name,
+        "throughput_rps": round(n / elapsed, 1),
+        "request": percentiles(latency),
+        "loop_lag": percentiles(lag),
+        "dropped": app_logging.log_stats()["dropped"],
+    }
+
+
+def set_app_level(level: str):
+    logging.getLogger().setLevel(logging.INFO)
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+async def main(n: int, concurrency: int, level: str, disk_latency_ms: float):
+    root = logging.getLogger()
+    log_dir = tempfile.mkdtemp(prefix="bench-logs-")
+    SlowFileHandler.latency = disk_latency_ms / 1000
+
+    redis = fake_aioredis.FakeRedis(decode_responses=True)
+    await redis.set("support_prompt", "Ты — ассистент поддержки.")
+
+    async def fake_grok(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"reply": "Здравствуйте!"})
+
+    http_clients.register("grok", timeout=30, max_connections=concurrency, transport=httpx.MockTransport(fake_grok))
+
+    engine = create_engine()
+    await reset_schema(engine)
+    sessions = session_factory(engine)
+
+    async def bench_db():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = bench_db
+    results = []
+    with patch("services.prompts.get_async_redis", return_value=redis), \
+            patch("core.logger.RotatingFileHandler", SlowFileHandler), \
+            patch.object(settings, "LOG_DIR", log_dir):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            app_logging.stop_logging()
+            handlers = legacy_handlers(log_dir)
+            for handler in handlers:
+                root.addHandler(handler)
+            set_app_level(level)
+            await run_variant("warmup", client, 50, concurrency)
+            results.append(await run_variant("sync_handlers", client, n, concurrency))
+            for handler in handlers:
+                root.removeHandler(handler)
+                handler.close()
+
+            app_logging.setup_logging(stream=open(os.devnull, "w"))
+            set_app_level(level)
+            await run_variant("warmup", client, 50, concurrency)
+            results.append(await run_variant("queue_handler", client, n, concurrency))
+            app_logging.stop_logging()
+
+    app.dependency_overrides.pop(get_db, None)
+    await http_clients.aclose()
+    await engine.dispose()
+    print(json.dumps({"benchmark": "logging", "database": engine.url.get_backend_name(), "level": level,
+                      "disk_latency_ms": disk_latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=500, help="число запросов на вариант")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--level", default="INFO", help="уровень логгеров приложения (api, crud, services, core)")
+    parser.add_argument("--disk-latency-ms", type=float, default=0.0, help="задержка записи строки в файл")
+    args = parser.parse_args()
+    asyncio.run(main(args.n, args.concurrency, args.level, args.disk_latency_ms))
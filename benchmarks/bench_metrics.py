@@ -0,0 +1,102 @@
+"""
+Бенчмарк накладных расходов метрик Prometheus на горячем пути.
+
+Один и тот же обработчик (два SELECT к БД бенчмарка) вызывается через
+ASGI без метрик и с MetricsMiddleware плюс инструментированным движком
+SQLAlchemy; запросы к вариантам чередуются. Отдельно замеряются цена
+одного наблюдения гистограммы и время сборки /metrics.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_metrics --n 3000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from benchmarks.common import Timer, create_engine, percentiles, reset_schema, session_factory
+from core import metrics
+
+
+def build_app(sessions, with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+    if with_metrics:
+        app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/chat/{chat_id}/messages")
+    async def messages(chat_id: int):
+        async with sessions() as db:
+            await db.execute(text("SELECT 1"))
+            await db.execute(text("SELECT 2"))
+        return {"chat_id": chat_id}
+
+    return app
+
+
+async def run_variants(n: int) -> list[dict]:
+    """Запросы к двум вариантам чередуются: дрейф машины делится поровну."""
+    variants = []
+    for name, with_metrics in (("no_metrics", False), ("metrics", True)):
+        engine = create_engine()
+        if with_metrics:
+            metrics.instrument_engine(engine)
+        await reset_schema(engine)
+        app = build_app(session_factory(engine), with_metrics)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        variants.append((name, engine, client, []))
+
+    try:
+        for i in range(n // 10 + n):
+            for name, engine, client, samples in variants:
+                if i < n // 10:
+                    await client.get(f"/chat/{i % 100}/messages")
+                    continue
+                with Timer(samples):
+                    await client.get(f"/chat/{i % 100}/messages")
+    finally:
+        for name, engine, client, samples in variants:
+            await client.aclose()
+            await engine.dispose()
+
+    return [{"variant": name, **percentiles(samples), "mean_ms": round(sum(samples) / len(samples), 3)}
+            for name, engine, client, samples in variants]
+
+
+def observe_cost_us(n: int = 100_000) -> float:
+    """Цена одного наблюдения гистограммы с метками (мкс)."""
+    started = time.perf_counter()
+    for _ in range(n):
+        metrics.DB_QUERY_DURATION.labels("SELECT").observe(0.001)
+    return round((time.perf_counter() - started) / n * 1e6, 2)
+
+
+async def main(n: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = await run_variants(n)
+
+    scrape: list[float] = []
+    for _ in range(50):
+        with Timer(scrape):
+            body, _ = metrics.render_metrics()
+
+    print(json.dumps({
+        "benchmark": "metrics_overhead",
+        "requests": n,
+        "results": results,
+        "overhead_p50_us": round((results[1]["p50_ms"] - results[0]["p50_ms"]) * 1000, 1),
+        "overhead_mean_us": round((results[1]["mean_ms"] - results[0]["mean_ms"]) * 1000, 1),
+        "observe_us": observe_cost_us(),
+        "scrape": {"bytes": len(body), **percentiles(scrape)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=3000, help="число запросов на вариант")
+    args = parser.parse_args()
+    asyncio.run(main(args.n))
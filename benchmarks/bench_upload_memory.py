@@ -0,0 +1,143 @@
+"""
+Бенчмарк памяти загрузки файлов через POST /chat/{chat_id}/send.
+
+Сравнивает прежний обработчик (await file.read() и байты в PocketBase)
+с текущим, который отдаёт спул Starlette потоком в хранилище
+(STORAGE_BACKEND, по умолчанию PocketBase). PocketBase — локальный
+сервер, отбрасывающий тело; send_message подменён, вложения пишутся
+в БД бенчмарка. Вариант streaming_duplicate повторно отправляет те же
+файлы: хэш уже есть в attachments, в хранилище ничего не уходит.
+Пиковая память — по tracemalloc (аллокации Python), плюс прирост maxrss.
+С STORAGE_BACKEND=s3 пик на загрузку сверяется с S3Storage.upload_memory_bound().
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_upload_memory --size-mb 50 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi import Depends, FastAPI, File, UploadFile
+
+from benchmarks.common import create_engine, reset_schema, session_factory, start_fake_upstream
+from api.v1 import chat as chat_api
+from core.config import settings
+from core.database import get_db
+from core.http import http_clients
+from core.pocketbase_client import PocketBaseClient
+from core.storage import S3Storage
+from core.uploads import BodySizeLimitMiddleware
+from models.messages import Message
+
+
+def build_app() -> FastAPI:
+    legacy_client = PocketBaseClient()
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware)
+    app.include_router(chat_api.router)
+
+    @app.post("/legacy/{chat_id}/send")
+    async def legacy_send(chat_id: int, user_id: int, file: UploadFile = File(None), db=Depends(get_db)):
+        """Прежняя реализация: файл целиком в память."""
+        file_bytes = await file.read()
+        file_url = await legacy_client.upload_file(file_bytes, file.filename)
+        return {"file_url": file_url}
+
+    return app
+
+
+async def run_variant(name: str, client: httpx.AsyncClient, path: str, sources: list[str]) -> dict:
+    async def one(source: str):
+        with open(source, "rb") as f:
+            resp = await client.post(path, params={"user_id": 2}, files={"file": ("video.mp4", f, "video/mp4")})
+            resp.raise_for_status()
+
+    concurrency = len(sources)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(source) for source in sources))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "variant": name,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "peak_alloc_mb": round((peak - base) / 2**20, 1),
+        "peak_alloc_per_upload_mb": round((peak - base) / 2**20 / concurrency, 2),
+        "maxrss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+    }
+
+
+async def main(size_mb: int, concurrency: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    server, pb_url = await start_fake_upstream(b'{"token": "t", "id": "rec", "field": "file.bin"}')
+
+    # Разное содержимое на каждую загрузку, иначе сработает дедупликация
+    sources = []
+    for _ in range(concurrency):
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as f:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(chunk)
+            sources.append(f.name)
+
+    message = Message(id=1, chat_id=1, sender_id=2, message_type="video", file_url="x")
+    engine = create_engine()
+    await reset_schema(engine)
+    sessions = session_factory(engine)
+
+    async def bench_db():
+        async with sessions() as session:
+            yield session
+
+    app = build_app()
+    app.dependency_overrides[get_db] = bench_db
+    results = []
+    try:
+        with patch.object(settings, "POCKETBASE_URL", pb_url), \
+                patch.object(settings, "MAX_UPLOAD_SIZE", (size_mb + 1) * 2**20), \
+                patch.object(chat_api, "send_message", AsyncMock(return_value=message)):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+                tracemalloc.start()
+                # Текущая реализация первой: maxrss только растёт
+                results.append(await run_variant("streaming", client, "/chat/1/send", sources))
+                results.append(await run_variant("streaming_duplicate", client, "/chat/1/send", sources))
+                results.append(await run_variant("legacy_read_all", client, "/legacy/1/send", sources))
+                tracemalloc.stop()
+    finally:
+        for source in sources:
+            os.unlink(source)
+        await http_clients.aclose()
+        await engine.dispose()
+        server.close()
+        await server.wait_closed()
+
+    bound_mb = round(S3Storage.upload_memory_bound() / 2**20, 2)
+    print(json.dumps({
+        "benchmark": "upload_memory", "file_size_mb": size_mb,
+        "s3_upload_bound_mb": bound_mb, "results": results,
+    }, indent=2))
+    if settings.STORAGE_BACKEND == "s3":
+        streaming = results[0]["peak_alloc_per_upload_mb"]
+        assert streaming <= bound_mb, f"пик {streaming} МБ на загрузку выше предела {bound_mb} МБ"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=50, help="размер файла")
+    parser.add_argument("--concurrency", type=int, default=4, help="одновременных загрузок")
+    args = parser.parse_args()
+    asyncio.run(main(args.size_mb, args.concurrency))
@@ -0,0 +1,116 @@
+"""
+Бенчмарк подключения клиента, следящего за списком чатов.
+
+- per_chat_legacy — сокет на каждый чат, доступ проверялся через
+  get_chat_with_messages (история + отметка о прочтении), как в старом /ws/{chat_id}
+- per_chat — сокет на каждый чат с проверкой is_chat_member (кэш участников
+  в памяти: первый клиент ходит в БД, остальные — нет)
+- per_user — один сокет /ws: один запрос списка чатов и подписка на все
+
+Для каждого варианта — время подключения клиента целиком, число сокетов
+и обращений к БД на клиента.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_ws_connect --chats 50 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from benchmarks.common import (
+    RoundTripCounter, Timer, create_engine, percentiles, reset_schema, seed_chats, session_factory,
+)
+from api.v1.websocket import ConnectionManager
+from core.config import settings
+from crud.chat_service import get_chat_with_messages, get_member_chat_ids, is_chat_member, user_channel
+
+
+class IdleSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+async def connect_client(variant: str, sessions, manager: ConnectionManager, user_id: int, chat_ids: list[int]):
+    if variant == "per_user":
+        async with sessions() as db:
+            subscribed = await get_member_chat_ids(user_id=user_id, db=db)
+        socket = IdleSocket()
+        await socket.accept()
+        await manager.subscribe(socket, user_channel(user_id))
+        for chat_id in subscribed:
+            await manager.subscribe(socket, chat_id)
+        return [socket]
+
+    sockets = []
+    for chat_id in chat_ids:
+        async with sessions() as db:
+            if variant == "per_chat_legacy":
+                await get_chat_with_messages(chat_id=chat_id, user_id=user_id, db=db)
+            else:
+                await is_chat_member(chat_id=chat_id, user_id=user_id, db=db)
+        socket = IdleSocket()
+        await manager.connect(socket, chat_id)
+        sockets.append(socket)
+    return sockets
+
+
+async def run_variant(variant: str, engine, clients: int, chat_ids: list[int]) -> dict:
+    sessions = session_factory(engine)
+    counter = RoundTripCounter(engine)
+    manager = ConnectionManager()
+    samples: list[float] = []
+    sockets = 0
+    for i in range(clients + 2):
+        if i == 2:
+            # Два прогрева, дальше — замер
+            samples.clear()
+            counter.reset()
+            sockets = 0
+        with Timer(samples):
+            connected = await connect_client(variant, sessions, manager, 1, chat_ids)
+        sockets += len(connected)
+        for socket in connected:
+            manager.remove(socket)
+    await manager.stop()
+    return {
+        "variant": variant,
+        "sockets_per_client": sockets // clients,
+        "db_round_trips_per_client": round(counter.total / clients, 1),
+        **percentiles(samples),
+    }
+
+
+async def main(chats: int, messages: int, clients: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    # Сброс счётчиков в Redis не относится к проверке доступа
+    settings.UNREAD_COUNTERS_ENABLED = False
+    settings.MEMBERSHIP_REDIS_ENABLED = False
+    engine = create_engine()
+    await reset_schema(engine)
+    async with session_factory(engine)() as db:
+        await seed_chats(db, chats=chats, messages_per_chat=messages)
+    chat_ids = list(range(1, chats + 1))
+
+    results = [
+        await run_variant(variant, engine, clients, chat_ids)
+        for variant in ("per_chat_legacy", "per_chat", "per_user")
+    ]
+    await engine.dispose()
+    print(json.dumps({"benchmark": "ws_connect", "database": engine.url.get_backend_name(),
+                      "chats": chats, "messages_per_chat": messages, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=50, help="чатов у пользователя")
+    parser.add_argument("--messages", type=int, default=200, help="сообщений в чате")
+    parser.add_argument("--clients", type=int, default=20, help="подключений на вариант")
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.messages, args.clients))
@@ -0,0 +1,223 @@
+"""
+Общая обвязка бенчмарков: окружение, отдельная БД, сидирование, статистика.
+
+Бенчмарки пересоздают таблицы, поэтому БД задаётся отдельной переменной
+BENCH_DATABASE_URL (по умолчанию — временный SQLite-файл).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+# Настройки приложения обязательны при импорте; для бенчмарков хватит заглушек
+for key, value in {
+    "POCKETBASE_URL": "http://fake-pocketbase",
+    "POCKETBASE_ADMIN_EMAIL": "bench@example.com",
+    "POCKETBASE_ADMIN_PASSWORD": "bench",
+    "POCKETBASE_COLLECTION": "documents",
+    "POCKETBASE_FIELD_NAME": "field",
+    "S3_ENDPOINT": "http://fake-s3",
+    "S3_ACCESS_KEY": "bench",
+    "S3_SECRET_KEY": "bench",
+    "S3_BUCKET": "bench",
+    "GROK_API_URL": "http://fake-grok/v1/chat/completions",
+}.items():
+    os.environ.setdefault(key, value)
+
+BENCH_DATABASE_URL = os.getenv(
+    "BENCH_DATABASE_URL",
+    f"sqlite+aiosqlite:///{Path(tempfile.gettempdir()) / 'messenger_bench.db'}",
+)
+os.environ.setdefault("DATABASE_URL", BENCH_DATABASE_URL)
+
+from sqlalchemy import BigInteger, Column, String, event, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from core.database import Base  # noqa: E402
+import models.user  # noqa: E402,F401
+import models.announcement  # noqa: E402,F401
+import models.chat  # noqa: E402,F401
+import models.messages  # noqa: E402,F401
+import models.attachment  # noqa: E402,F401
+import models.support  # noqa: E402,F401
+
+
+class Translation(Base):
+    """Заглушка таблицы mytrade.translations для внешних ключей users."""
+    __tablename__ = "translations"
+    __table_args__ = {"schema": "mytrade", "extend_existing": True}
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    key = Column(String)
+
+
+def is_sqlite(url: str = BENCH_DATABASE_URL) -> bool:
+    return url.startswith("sqlite")
+
+
+def create_engine(url: str = BENCH_DATABASE_URL):
+    """Движок бенчмарка; для SQLite схема mytrade отображается в основную."""
+    if is_sqlite(url):
+        return create_async_engine(url, execution_options={"schema_translate_map": {"mytrade": None}})
+    return create_async_engine(url)
+
+
+async def reset_schema(engine):
+    """Пересоздаёт все таблицы приложения."""
+    async with engine.begin() as conn:
+        if not is_sqlite(str(engine.url)):
+            await conn.execute(text("CREATE SCHEMA IF NOT EXISTS mytrade"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def session_factory(engine) -> async_sessionmaker:
+    return async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class RoundTripCounter:
+    """Считает обращения к БД: SQL-запросы, BEGIN и COMMIT/ROLLBACK."""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.transactions = 0
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(sync_engine, "commit", self._on_tx)
+        event.listen(sync_engine, "rollback", self._on_tx)
+        event.listen(sync_engine, "begin", self._on_tx)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_tx(self, *args):
+        self.transactions += 1
+
+    @property
+    def total(self) -> int:
+        return self.statements + self.transactions
+
+    def reset(self):
+        self.statements = 0
+        self.transactions = 0
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    """p50/p95/p99/max по списку задержек в миллисекундах."""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0}
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+class Timer:
+    """Контекстный менеджер, добавляющий длительность блока в список (мс)."""
+
+    def __init__(self, samples: list[float]):
+        self.samples = samples
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append((time.perf_counter() - self._start) * 1000)
+
+
+async def start_fake_upstream(body: bytes = b"{}", delay_ms: float = 0.0):
+    """
+    Локальный HTTP/1.1 upstream с keep-alive (PocketBase, Grok).
+
+    Читает тело запроса порциями и отбрасывает, отвечает 200 с JSON body
+    через delay_ms. Возвращает (server, base_url).
+    """
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                while length:
+                    length -= len(await reader.read(min(length, 1024 * 1024)))
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+async def monitor_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.005):
+    """Записывает опоздание пробуждения event loop относительно interval (мс)."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - start - interval, 0) * 1000)
+
+
+async def seed_chats(session, chats: int, messages_per_chat: int = 0, seller_id: int = 1, first_buyer_id: int = 2):
+    """Один продавец, chats покупателей, по чату на покупателя и объявление."""
+    from datetime import datetime, timedelta
+    from models.user import User
+    from models.announcement import Announcement
+    from models.chat import Chat
+    from models.chat_participant import ChatParticipant
+    from models.messages import Message
+
+    buyer_ids = list(range(first_buyer_id, first_buyer_id + chats))
+    session.add(User(id=seller_id, name="Seller", email=f"seller{seller_id}@bench", password="x", user_role_id=2))
+    session.add_all([User(id=b, name=f"Buyer {b}", email=f"buyer{b}@bench", password="x") for b in buyer_ids])
+    await session.flush()
+    session.add_all([Announcement(id=i + 1, user_id=seller_id) for i in range(chats)])
+    await session.flush()
+    session.add_all([
+        Chat(id=i + 1, announcement_id=i + 1, seller_id=seller_id, buyer_id=b)
+        for i, b in enumerate(buyer_ids)
+    ])
+    await session.flush()
+    session.add_all([
+        ChatParticipant(chat_id=i + 1, user_id=member_id)
+        for i, b in enumerate(buyer_ids) for member_id in (seller_id, b)
+    ])
+    await session.flush()
+
+    base = datetime(2025, 1, 1)
+    for i in range(chats):
+        batch = [
+            {
+                "chat_id": i + 1,
+                "sender_id": seller_id if j % 2 else buyer_ids[i],
+                "message_text": f"message {j}",
+                "message_type": "text",
+                "created_at": base + timedelta(seconds=j),
+            }
+            for j in range(messages_per_chat)
+        ]
+        if batch:
+            await session.execute(Message.__table__.insert(), batch)
+    await session.commit()
+    return buyer_ids
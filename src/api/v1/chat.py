@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.database import get_db
+from core.config import settings
+from core.database import get_db, get_read_db
 from crud.chat_service import (
-    get_or_create_chat, send_message, get_user_chats, get_chat_with_messages
+    get_or_create_chat, send_message, get_user_chats, get_chat_with_messages,
+    get_message_page, ensure_chat_member
 )
+from schemas.chat import (
+    MessagePage, ChatListItem, UnreadCounters, SyncResponse,
+    DirectUploadRequest, DirectUploadTicket, CompleteUploadRequest,
+)
+from crud.sync import get_changes
+from crud.attachments import store_attachment, register_attachment, release_attachment
+from services import unread as unread_counters
+from services.thumbnails import get_thumbnail_worker
+from services.outbox import get_outbox_relay
 
-from core.s3 import upload_to_s3
-from core.pocketbase_client import PocketBaseClient
-from api.v1.websocket import get_manager
+from core.storage import get_storage, make_key
+from core.uploads import upload_size, check_upload_size, message_type_for, upload_prefix, is_upload_key_of
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
-pb_client = PocketBaseClient()
 
 
 @router.post("/start/{announcement_id}")
@@ -18,17 +28,18 @@ async def start_chat(announcement_id: int, user_id: int, db: AsyncSession = Depe
 ):
     """Создаёт или возвращает существующий чат по объявлению."""
     chat = await get_or_create_chat(announcement_id, user_id, db)
+    get_outbox_relay().wake()
     return {"chat_id": chat.id}
 
 
-@router.get("/my")
+@router.get("/my", response_model=list[ChatListItem])
 async def my_chats(
     user_id: int,
     role: str = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Возвращает список чатов пользователя.
+    Возвращает список чатов пользователя с партнёром и числом непрочитанных.
     
     Args:
         user_id: ID пользователя
@@ -38,51 +49,172 @@ async def my_chats(
     return chats
 
 
+@router.get("/unread", response_model=UnreadCounters)
+async def unread(user_id: int):
+    """Возвращает счётчики непрочитанных из кэша Redis, без обращения к БД."""
+    try:
+        return await unread_counters.get_counters(user_id)
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Счётчики временно недоступны")
+
+
+@router.get("/sync", response_model=SyncResponse)
+async def sync(
+    user_id: int,
+    cursor: int = None,
+    limit: int = Query(None, ge=1, le=settings.SYNC_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Дельта по всем чатам пользователя после cursor: новые сообщения,
+    отметки о прочтении и превью изменившихся чатов.
+
+    Вызывается после переподключения WebSocket вместо повторной загрузки
+    истории. Основная БД: на реплике события могут запаздывать.
+    """
+    return await get_changes(db=db, user_id=user_id, cursor=cursor, limit=limit)
+
+
 @router.get("/{chat_id}")
-async def open_chat(chat_id: int, user_id: int, db: AsyncSession = Depends(get_db),):
-    """Открывает чат и возвращает историю сообщений с данными партнёра."""
+async def open_chat(
+    chat_id: int,
+    user_id: int,
+    before_id: int = None,
+    after_id: int = None,
+    limit: int = Query(None, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Открывает чат и возвращает последнюю страницу истории с данными партнёра.
 
-    chat = await get_chat_with_messages(db=db, chat_id=chat_id, user_id=user_id)
+    Более старые сообщения подгружаются через before_id=next_cursor.
+    """
+
+    chat = await get_chat_with_messages(
+        db=db, chat_id=chat_id, user_id=user_id, before_id=before_id, after_id=after_id, limit=limit
+    )
+    get_outbox_relay().wake()
     return chat
 
 
+@router.get("/{chat_id}/messages", response_model=MessagePage)
+async def chat_history(
+    chat_id: int,
+    user_id: int,
+    before_id: int = None,
+    after_id: int = None,
+    limit: int = Query(None, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Возвращает страницу истории сообщений без отметки о прочтении."""
+    await ensure_chat_member(chat_id=chat_id, user_id=user_id, db=db)
+    return await get_message_page(chat_id=chat_id, db=db, before_id=before_id, after_id=after_id, limit=limit)
+
+
 @router.post("/{chat_id}/send")
 async def send(user_id: int, chat_id: int, text: str = None, file: UploadFile = File(None),
                db: AsyncSession = Depends(get_db)):
     """Отправляет сообщение (текст или файл) в чат и рассылает через WebSocket."""
 
-    file_url = None
+    attachment = None
     message_type = "text"
 
     if file:
-        file_bytes = await file.read()
-        file_url = await pb_client.upload_file(file_bytes, file.filename)
-        # file_url = await upload_to_s3(file_bytes, file.filename)
-        content_type = file.content_type or ""
-        if content_type.startswith("image/"):
-            message_type = "image"
-        elif content_type.startswith("video/"):
-            message_type = "video"
-        else:
-            message_type = "document"
-
-    message = await send_message(db=db, chat_id=chat_id, sender_id=user_id, text=text, file_url=file_url,
-                                 message_type=message_type)
-    
-    # Broadcast через WebSocket
-    manager = get_manager()
-    await manager.broadcast(chat_id, {
-        "type": "message",
-        "data": {
-            "id": message.id,
-            "chat_id": message.chat_id,
-            "sender_id": message.sender_id,
-            "message_text": message.message_text,
-            "message_type": message.message_type,
-            "file_url": message.file_url,
-            "is_read": message.is_read,
-            "created_at": message.created_at.isoformat() if message.created_at else None
-        }
-    })
+        # Доступ — до загрузки: чужой чат не должен стоить записи в хранилище
+        await ensure_chat_member(chat_id=chat_id, user_id=user_id, db=db)
+        # Файл уже в спуле Starlette; одинаковые файлы хранятся один раз
+        upload_size(file)
+        attachment = await store_attachment(db, file.file, file.filename, file.content_type)
+        message_type = message_type_for(file.content_type)
+
+    message = await _send_with_attachment(db, chat_id, user_id, text, attachment, message_type)
+
+    # Событие уже в outbox (та же транзакция) — рассылку сделает relay
+    get_outbox_relay().wake()
+
+    if attachment is not None and message.thumbnail_url is None:
+        # Превью строится в фоне и приходит событием message_update
+        await get_thumbnail_worker().schedule(message.attachment_id, message_type, file.file)
     
+    return message
+
+
+async def _send_with_attachment(db: AsyncSession, chat_id: int, user_id: int, text: str | None,
+                                attachment, message_type: str):
+    """send_message со ссылкой на вложение; при отказе вложение освобождается."""
+    if attachment is None:
+        return await send_message(db=db, chat_id=chat_id, sender_id=user_id, text=text, message_type=message_type)
+    # rollback внутри send_message экспирирует объект — значения берём заранее
+    attachment_id, file_url = attachment.id, attachment.url
+    try:
+        return await send_message(db=db, chat_id=chat_id, sender_id=user_id, text=text, file_url=file_url,
+                                  message_type=message_type, attachment_id=attachment_id,
+                                  thumbnail_url=attachment.thumbnail_url, blurhash=attachment.blurhash)
+    except HTTPException:
+        await release_attachment(db, attachment_id)
+        raise
+
+
+def _direct_storage():
+    storage = get_storage()
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=501, detail="Хранилище не поддерживает прямую загрузку, используйте /send")
+    return storage
+
+
+@router.post("/{chat_id}/uploads", response_model=DirectUploadTicket)
+async def create_upload(chat_id: int, user_id: int, body: DirectUploadRequest,
+                        db: AsyncSession = Depends(get_db)):
+    """
+    Выдаёт подписанные URL для загрузки файла напрямую в S3/MinIO.
+
+    Байты файла не проходят через сервер приложения; после загрузки
+    клиент вызывает /uploads/complete.
+    """
+    storage = _direct_storage()
+    check_upload_size(body.size)
+    await ensure_chat_member(chat_id=chat_id, user_id=user_id, db=db)
+
+    key = make_key(body.filename, prefix=upload_prefix(chat_id, user_id))
+    ticket = await storage.presign_upload(key, body.content_type, body.size)
+    return {"key": key, **ticket}
+
+
+@router.post("/{chat_id}/uploads/complete")
+async def complete_upload(chat_id: int, user_id: int, body: CompleteUploadRequest,
+                          db: AsyncSession = Depends(get_db)):
+    """
+    Проверяет загруженный объект (HEAD: размер, тип) и отправляет сообщение с файлом.
+
+    Объект больше MAX_UPLOAD_SIZE удаляется из хранилища. Тип объекта должен
+    совпасть с типом, под который выдан подписанный URL.
+    """
+    storage = _direct_storage()
+    if not is_upload_key_of(body.key, chat_id, user_id):
+        raise HTTPException(status_code=403, detail="Ключ загрузки не принадлежит чату")
+
+    if body.upload_id:
+        if not body.parts:
+            raise HTTPException(status_code=400, detail="Не переданы части загрузки")
+        try:
+            await storage.complete_upload(body.key, body.upload_id, [(p.part_number, p.etag) for p in body.parts])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Не удалось собрать файл из частей")
+
+    info = await storage.head(body.key)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Файл не загружен")
+    try:
+        check_upload_size(info.size)
+    except HTTPException:
+        await storage.delete(body.key)
+        raise
+    if info.content_type != body.content_type:
+        raise HTTPException(status_code=400, detail="Тип файла не совпадает с заявленным при загрузке")
+
+    attachment = await register_attachment(db, body.key, storage.url_for(body.key), info.size, info.content_type)
+    message = await _send_with_attachment(db, chat_id, user_id, body.text, attachment,
+                                          message_type_for(info.content_type))
+    get_outbox_relay().wake()
+
     return message
\ No newline at end of file
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Response
+
+from core import metrics
+from core.http import http_clients
+from core.logger import log_stats
+from api.v1.websocket import get_manager
+from services.membership import membership_cache
+from services.outbox import get_outbox_relay
+from services.receipts import get_read_receipts
+from services.thumbnails import get_thumbnail_worker
+
+router = APIRouter(tags=["Metrics"])
+
+
+class RuntimeCollector:
+    """
+    Метрики из счётчиков компонентов, снимаемые в момент запроса /metrics.
+
+    WebSocket-менеджер, HTTP-клиенты, очередь логов и генератор миниатюр
+    и так ведут счётчики в памяти; на горячем пути ничего не добавляется.
+    """
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+        ws = get_manager().stats()
+        yield GaugeMetricFamily("ws_connections", "Открытые WebSocket этого воркера", value=ws["connections"])
+        yield GaugeMetricFamily("ws_chats", "Чаты с подключёнными сокетами", value=ws["chats"])
+        yield GaugeMetricFamily("ws_send_queue_depth", "Сообщения в очередях отправки сокетов",
+                                value=ws["queue_depth_total"])
+        yield GaugeMetricFamily("ws_send_queue_depth_max", "Самая длинная очередь отправки",
+                                value=ws["queue_depth_max"])
+        yield CounterMetricFamily("ws_messages_delivered", "Сообщения, поставленные в очереди сокетов",
+                                  value=ws["delivered_messages"])
+        yield CounterMetricFamily("ws_messages_dropped", "Сообщения, отброшенные при переполнении",
+                                  value=ws["dropped_messages"])
+        yield CounterMetricFamily("ws_slow_disconnects", "Отключения медленных клиентов",
+                                  value=ws["slow_disconnects"])
+        yield CounterMetricFamily("ws_send_failures", "Ошибки отправки в сокет", value=ws["send_failures"])
+
+        requests = CounterMetricFamily("upstream_requests", "Запросы к внешним сервисам", labels=["upstream"])
+        opened = CounterMetricFamily("upstream_connections_opened", "Новые TCP-соединения к внешним сервисам",
+                                     labels=["upstream"])
+        for name, stats in http_clients.stats().items():
+            requests.add_metric([name], stats["requests"])
+            opened.add_metric([name], stats["connections_opened"])
+        yield requests
+        yield opened
+
+        logs = log_stats()
+        yield GaugeMetricFamily("log_queue_depth", "Записи лога в очереди на запись", value=logs["queued"])
+        yield CounterMetricFamily("log_records_dropped", "Записи лога, потерянные при переполнении",
+                                  value=logs["dropped"])
+
+        worker = get_thumbnail_worker()
+        jobs = CounterMetricFamily("thumbnail_jobs", "Задачи генерации миниатюр", labels=["result"])
+        jobs.add_metric(["processed"], worker.processed)
+        jobs.add_metric(["failed"], worker.failed)
+        jobs.add_metric(["dropped"], worker.dropped)
+        yield jobs
+
+        cache = membership_cache.stats()
+        lookups = CounterMetricFamily("membership_lookups", "Проверки участников чатов по источнику",
+                                      labels=["source"])
+        lookups.add_metric(["memory"], cache["hits"])
+        lookups.add_metric(["redis"], cache["redis_hits"])
+        lookups.add_metric(["db"], cache["misses"])
+        yield lookups
+        yield GaugeMetricFamily("membership_cache_size", "Чатов в кэше участников воркера", value=cache["size"])
+
+        relay = get_outbox_relay().stats()
+        yield CounterMetricFamily("outbox_events_published", "События outbox, опубликованные этим воркером",
+                                  value=relay["published"])
+        yield CounterMetricFamily("outbox_relay_failures", "Ошибки прохода relay outbox", value=relay["failed"])
+
+        receipts = get_read_receipts().stats()
+        yield CounterMetricFamily("read_receipts_received", "Отметки о прочтении, принятые в буфер",
+                                  value=receipts["received"])
+        yield CounterMetricFamily("read_receipts_written", "Пары чат/читатель, записанные пачками",
+                                  value=receipts["written"])
+        yield GaugeMetricFamily("read_receipts_pending", "Отметки о прочтении, ждущие записи",
+                                value=receipts["pending"])
+
+
+if metrics.PROMETHEUS_AVAILABLE:
+    metrics.registry.register(RuntimeCollector())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики воркера в формате Prometheus."""
+    if not metrics.metrics_enabled():
+        raise HTTPException(status_code=404, detail="Метрики выключены")
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,7 +1,11 @@
+import asyncio
+import json
 import logging
 from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends
+from fastapi.responses import StreamingResponse
 from schemas.support import ChatRequest, ChatResponse, UpdatePromptRequest, SupportMessageOut
 from services.grok import call_grok_model
+from services.support import stream_support_reply
 from services.prompts import read_prompt, write_prompt, upload_prompt
 from pathlib import Path
 from core.config import settings
@@ -58,12 +62,51 @@ async def support_chat(req: ChatRequest, db: AsyncSession = Depends(get_db)):
     return ChatResponse(reply=reply, raw=model_resp)
 
 
+def _sse(data: dict, event: str | None = None) -> str:
+    """Форматирует событие Server-Sent Events."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def support_chat_stream(req: ChatRequest):
+    """
+    Отправляет сообщение в поддержку и стримит ответ как Server-Sent Events.
+
+    События: data {"delta"} — фрагмент ответа, event done {"reply"} — полный
+    ответ, event error {"detail"} — ошибка модели. При отключении клиента
+    запрос к Grok прерывается.
+    """
+    logger.info(f"Запрос POST /chat/stream user_id={req.user_id}")
+    if not req.user_id:
+        logger.warning("Отсутствует user_id в запросе")
+        raise HTTPException(400, "user_id is required")
+
+    async def events():
+        parts = []
+        try:
+            async for delta in stream_support_reply(req.user_id, req.message):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            logger.exception(f"Ошибка модели Grok для user_id={req.user_id}: {e}")
+            yield _sse({"detail": f"Grok model error: {e}"}, event="error")
+            return
+        yield _sse({"reply": "".join(parts)}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.put("/prompt", status_code=status.HTTP_204_NO_CONTENT)
 async def update_prompt(req: UpdatePromptRequest):
     """Обновляет системный промпт."""
     logger.info("Запрос PUT /prompt на обновление")
     try:
-        write_prompt(req.content)
+        await write_prompt(req.content)
         logger.info("Prompt успешно обновлён")
     except Exception as e:
         logger.exception(f"Ошибка при записи prompt: {e}")
@@ -75,7 +118,7 @@ async def get_prompt():
     """Возвращает текущий системный промпт."""
     logger.info("Запрос GET /prompt")
     try:
-        content = read_prompt()
+        content = await read_prompt()
         logger.debug(f"Прочитан prompt длиной {len(content)} символов")
         return {"content": content}
     except Exception as e:
@@ -90,8 +133,8 @@ async def upload_file_prompt(file: UploadFile = File(...)):
     try:
         temp_path = Path(settings.SUPPORT_PROMPT_PATH).parent / file.filename
         content_bytes = await file.read()
-        temp_path.write_bytes(content_bytes)
-        content = upload_prompt(temp_path)
+        await asyncio.to_thread(temp_path.write_bytes, content_bytes)
+        content = await upload_prompt(temp_path)
         logger.info(f"Файл {file.filename} загружен, длина контента: {len(content)}")
     except Exception as e:
         logger.exception(f"Ошибка при загрузке prompt: {e}")
@@ -1,24 +1,132 @@
+import asyncio
+import json
+import time
 from typing import Dict, Set
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 
-from core.database import get_db
-from crud.chat_service import get_chat_with_messages
+from core.broadcast import BroadcastBackend, InMemoryBroadcast, create_broadcast_backend
+from core import metrics
+from core.config import settings
+from core.database import AsyncSessionLocal
+from crud.chat_service import get_member_chat_ids, is_chat_member, mark_read, user_channel
+from services import unread as unread_counters
+from services.outbox import get_outbox_relay
+from services.receipts import get_read_receipts
+from services.support import stream_support_reply
 
 router = APIRouter(tags=["WebSocket"])
 
+OVERFLOW_POLICIES = ("disconnect", "drop_oldest", "drop_new")
+
+
+class ClientConnection:
+    """
+    Исходящая очередь одного сокета с отдельной задачей-писателем.
+
+    Медленный клиент копит сообщения в своей ограниченной очереди
+    и не задерживает доставку остальным.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", max_queue: int):
+        self.websocket = websocket
+        self.manager = manager
+        self.chats: Set[int] = set()
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, payload: str) -> bool:
+        """Ставит готовый JSON в очередь. False — очередь переполнена."""
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop_oldest(self, payload: str):
+        """Вытесняет самое старое сообщение из очереди новым."""
+        try:
+            self.queue.get_nowait()
+            self.queue.task_done()
+        except asyncio.QueueEmpty:
+            pass
+        self.queue.put_nowait(payload)
+
+    async def _write_loop(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                await self.websocket.send_text(payload)
+            except Exception:
+                self.manager.send_failures += 1
+                self.manager.remove(self.websocket)
+                return
+            finally:
+                self.queue.task_done()
+
+    async def flush(self):
+        """Ждёт отправки всего, что уже стоит в очереди."""
+        if not self._writer.done():
+            await self.queue.join()
+
+    def close(self):
+        """Останавливает писателя (сокет закрывает вызывающий код)."""
+        self._writer.cancel()
+
 
 class ConnectionManager:
-    """Управляет WebSocket соединениями по chat_id."""
+    """
+    Управляет WebSocket соединениями по chat_id.
 
-    def __init__(self):
+    Рассылка идёт через BroadcastBackend, поэтому сообщение, отправленное
+    на одном воркере, доходит до сокетов, подключенных к другим. JSON
+    сериализуется один раз и раскладывается по очередям сокетов.
+    """
+
+    def __init__(
+        self,
+        backend: BroadcastBackend | None = None,
+        max_queue: int = None,
+        overflow_policy: str = None,
+    ):
         self.active_connections: Dict[int, Set[WebSocket]] = {}
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.backend = backend or InMemoryBroadcast()
+        self.backend.bind(self.deliver_local)
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or settings.WS_OVERFLOW_POLICY
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {self.overflow_policy}")
+        self.delivered_messages = 0
+        self.dropped_messages = 0
+        self.slow_disconnects = 0
+        self.send_failures = 0
+
+    async def start(self):
+        """Запускает транспорт рассылки."""
+        await self.backend.start()
+
+    async def stop(self):
+        """Останавливает транспорт рассылки и писателей сокетов."""
+        await self.backend.stop()
+        for connection in list(self.connections.values()):
+            connection.close()
+        self.connections.clear()
+        self.active_connections.clear()
 
     async def connect(self, websocket: WebSocket, chat_id: int):
-        """Подключает WebSocket к чату."""
+        """Принимает WebSocket и подключает его к чату."""
         await websocket.accept()
+        await self.subscribe(websocket, chat_id)
+
+    async def subscribe(self, websocket: WebSocket, chat_id: int):
+        """Подписывает уже принятый WebSocket на чат (или личный канал)."""
+        if websocket not in self.connections:
+            self.connections[websocket] = ClientConnection(websocket, self, self.max_queue)
+        self.connections[websocket].chats.add(chat_id)
         if chat_id not in self.active_connections:
             self.active_connections[chat_id] = set()
+            await self.backend.subscribe(chat_id)
         self.active_connections[chat_id].add(websocket)
 
     def disconnect(self, websocket: WebSocket, chat_id: int):
@@ -27,22 +135,228 @@ class ConnectionManager:
             self.active_connections[chat_id].discard(websocket)
             if not self.active_connections[chat_id]:
                 del self.active_connections[chat_id]
+                self.backend.unsubscribe(chat_id)
+
+        connection = self.connections.get(websocket)
+        if connection:
+            connection.chats.discard(chat_id)
+            if not connection.chats:
+                connection.close()
+                del self.connections[websocket]
+
+    def remove(self, websocket: WebSocket):
+        """Отключает WebSocket от всех чатов."""
+        connection = self.connections.get(websocket)
+        for chat_id in list(connection.chats if connection else ()):
+            self.disconnect(websocket, chat_id)
 
     async def broadcast(self, chat_id: int, message: dict):
-        """Отправляет сообщение всем подключенным к чату."""
-        if chat_id in self.active_connections:
-            dead_connections = set()
-            for connection in self.active_connections[chat_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    dead_connections.add(connection)
-            # Удаляем мёртвые соединения
-            for dead in dead_connections:
-                self.disconnect(dead, chat_id)
+        """Отправляет сообщение всем подключенным к чату на всех воркерах."""
+        started = time.perf_counter()
+        payload = json.dumps(message, ensure_ascii=False, default=str)
+        await self.backend.publish(chat_id, payload)
+        if metrics.metrics_enabled():
+            metrics.BROADCAST_DURATION.observe(time.perf_counter() - started)
+
+    async def deliver_local(self, chat_id: int, payload: str):
+        """Раскладывает готовый JSON по очередям сокетов чата в этом процессе."""
+        for websocket in list(self.active_connections.get(chat_id, ())):
+            connection = self.connections.get(websocket)
+            if connection and not connection.enqueue(payload):
+                self._overflow(connection, payload)
+            elif connection:
+                self.delivered_messages += 1
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Отправляет сообщение одному сокету через его очередь."""
+        connection = self.connections.get(websocket)
+        if connection:
+            payload = json.dumps(message, ensure_ascii=False, default=str)
+            if not connection.enqueue(payload):
+                self._overflow(connection, payload)
+
+    def _overflow(self, connection: ClientConnection, payload: str):
+        """Применяет политику к клиенту, который не успевает читать."""
+        if self.overflow_policy == "drop_oldest":
+            connection.drop_oldest(payload)
+        elif self.overflow_policy == "disconnect":
+            self.slow_disconnects += 1
+            websocket = connection.websocket
+            self.remove(websocket)
+            asyncio.get_running_loop().create_task(self._close_slow(websocket))
+            return
+        # drop_new: новое сообщение просто не попадает в очередь
+        connection.dropped += 1
+        self.dropped_messages += 1
+
+    async def _close_slow(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013, reason="Client is too slow")
+        except Exception:
+            pass
 
+    async def flush(self):
+        """Ждёт, пока все очереди будут отправлены (для тестов и остановки)."""
+        await asyncio.gather(*(c.flush() for c in list(self.connections.values())))
 
-manager = ConnectionManager()
+    def stats(self) -> dict:
+        """Метрики очередей отправки этого процесса."""
+        depths = [c.queue.qsize() for c in self.connections.values()]
+        return {
+            "connections": len(self.connections),
+            "chats": len(self.active_connections),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "delivered_messages": self.delivered_messages,
+            "dropped_messages": self.dropped_messages,
+            "slow_disconnects": self.slow_disconnects,
+            "send_failures": self.send_failures,
+        }
+
+
+manager = ConnectionManager(create_broadcast_backend())
+
+
+async def stream_support_to_socket(websocket: WebSocket, user_id: int, message: str):
+    """Стримит ответ поддержки в сокет фреймами support_delta/support_done."""
+    parts = []
+    try:
+        async for delta in stream_support_reply(user_id, message):
+            parts.append(delta)
+            await manager.send_personal(websocket, {"type": "support_delta", "data": {"delta": delta}})
+    except Exception as e:
+        await manager.send_personal(websocket, {"type": "error", "data": {"detail": f"Grok model error: {e}"}})
+        return
+    await manager.send_personal(websocket, {"type": "support_done", "data": {"reply": "".join(parts)}})
+
+
+async def _chat_member(chat_id, user_id: int) -> bool:
+    """Дешёвая проверка доступа: без истории и отметки о прочтении."""
+    if not isinstance(chat_id, int) or chat_id <= 0:
+        return False
+    async with AsyncSessionLocal() as db:
+        return await is_chat_member(chat_id=chat_id, user_id=user_id, db=db)
+
+
+async def _mark_read(websocket: WebSocket, user_id: int, chat_id, message_id):
+    """
+    Фрейм read: сообщения чата до message_id включительно прочитаны.
+
+    Отметка уходит в буфер и пишется пачкой; без запущенного буфера — сразу.
+    Ответа нет: собеседник получит событие read через outbox.
+    """
+    if not isinstance(message_id, int) or message_id <= 0:
+        return
+    if not await _chat_member(chat_id, user_id):
+        await manager.send_personal(websocket, {
+            "type": "error", "data": {"detail": "Чат не найден или доступ запрещён", "chat_id": chat_id},
+        })
+        return
+    if get_read_receipts().mark(chat_id, user_id, message_id):
+        return
+    async with AsyncSessionLocal() as db:
+        read = await mark_read(db, {(chat_id, user_id): message_id})
+        await db.commit()
+    for receipt in read:
+        await unread_counters.decrement(user_id, chat_id, receipt["count"])
+    if read:
+        get_outbox_relay().wake()
+
+
+async def _serve(websocket: WebSocket, user_id: int, handle=None, chat_id: int | None = None):
+    """
+    Цикл входящих фреймов: ping, support и read для всех сокетов,
+    остальные типы — в handle(data). По выходу сокет снимается со всех каналов.
+    chat_id — чат сокета /ws/{chat_id}, по умолчанию для фреймов read.
+    """
+    support_task: asyncio.Task | None = None
+    try:
+        while True:
+            data = await websocket.receive_json()
+
+            if data.get("type") == "ping":
+                await manager.send_personal(websocket, {"type": "pong"})
+            elif data.get("type") == "support" and data.get("message"):
+                # Новый вопрос прерывает недописанный ответ
+                if support_task and not support_task.done():
+                    support_task.cancel()
+                support_task = asyncio.create_task(
+                    stream_support_to_socket(websocket, user_id, data["message"])
+                )
+            elif data.get("type") == "read":
+                await _mark_read(websocket, user_id, data.get("chat_id", chat_id), data.get("message_id"))
+            elif handle is not None:
+                await handle(data)
+
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        pass
+    finally:
+        manager.remove(websocket)
+        # Клиент ушёл — прерываем запрос к Grok
+        if support_task and not support_task.done():
+            support_task.cancel()
+
+
+@router.websocket("/ws")
+async def user_websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int = Query(...),
+):
+    """
+    Один WebSocket на пользователя: события всех его чатов.
+
+    Подключение: ws://host/ws?user_id={user_id}
+
+    Сразу после подключения сокет подписан на личный канал и на
+    WS_USER_CHATS_LIMIT чатов с самыми свежими сообщениями; их список
+    приходит в первом фрейме subscribed. Превью и счётчики непрочитанных
+    идут через личный канал по всем чатам, лимит касается только
+    потока сообщений.
+
+    Входящие сообщения (от клиента):
+    - {"type": "subscribe", "chat_id": N} - подписаться на чат (новый или за лимитом)
+    - {"type": "unsubscribe", "chat_id": N} - отписаться от чата
+    - {"type": "read", "chat_id": N, "message_id": M} - прочитано до M включительно
+    - {"type": "ping"}, {"type": "support", "message": "..."} - как в /ws/{chat_id}
+
+    Исходящие сообщения (от сервера):
+    - {"type": "subscribed", "data": {"chats": [...]}} / {"type": "unsubscribed", ...}
+    - {"type": "message" | "read", "event_id": ..., "data": {...}} - события чатов
+    - {"type": "chat_created", "event_id": ..., "data": {"chat_id", ...}} - новый чат
+      в списке; чтобы получать его сообщения, клиент шлёт subscribe
+    - {"type": "chat_updated", "event_id": ..., "data": {"chat_id", "sender_id",
+      "last_message_text", "last_message_type", "last_message_at"}} - новое превью;
+      непрочитанных +1, если sender_id не свой
+    - {"type": "chat_read", "event_id": ..., "data": {"chat_id", "up_to_id", "count"}} -
+      прочитано на любом устройстве, непрочитанных −count
+    - {"type": "error", "data": {"detail": ...}}
+    """
+    async with AsyncSessionLocal() as db:
+        chat_ids = await get_member_chat_ids(user_id=user_id, db=db, limit=settings.WS_USER_CHATS_LIMIT)
+
+    await websocket.accept()
+    await manager.subscribe(websocket, user_channel(user_id))
+    for chat_id in chat_ids:
+        await manager.subscribe(websocket, chat_id)
+    await manager.send_personal(websocket, {"type": "subscribed", "data": {"chats": chat_ids}})
+
+    async def handle(data: dict):
+        chat_id = data.get("chat_id")
+        if data.get("type") == "subscribe":
+            if not await _chat_member(chat_id, user_id):
+                await manager.send_personal(websocket, {
+                    "type": "error", "data": {"detail": "Чат не найден или доступ запрещён", "chat_id": chat_id},
+                })
+                return
+            await manager.subscribe(websocket, chat_id)
+            await manager.send_personal(websocket, {"type": "subscribed", "data": {"chats": [chat_id]}})
+        elif data.get("type") == "unsubscribe" and isinstance(chat_id, int) and chat_id > 0:
+            manager.disconnect(websocket, chat_id)
+            await manager.send_personal(websocket, {"type": "unsubscribed", "data": {"chats": [chat_id]}})
+
+    await _serve(websocket, user_id, handle)
 
 
 @router.websocket("/ws/{chat_id}")
@@ -52,38 +366,28 @@ async def websocket_endpoint(
     user_id: int = Query(...),
 ):
     """
-    WebSocket endpoint для real-time сообщений в чате.
+    WebSocket endpoint для real-time сообщений в одном чате.
+    Новым клиентам — /ws: один сокет на все чаты пользователя.
     
     Подключение: ws://host/ws/{chat_id}?user_id={user_id}
     
     Входящие сообщения (от клиента):
     - {"type": "ping"} - проверка соединения
+    - {"type": "support", "message": "..."} - вопрос в поддержку
+    - {"type": "read", "message_id": M} - прочитано до M включительно
     
     Исходящие сообщения (от сервера):
-    - {"type": "message", "data": {...}} - новое сообщение
+    - {"type": "message", "event_id": ..., "data": {...}} - новое сообщение
     - {"type": "pong"} - ответ на ping
+    - {"type": "support_delta", "data": {"delta": ...}} - фрагмент ответа поддержки
+    - {"type": "support_done", "data": {"reply": ...}} - ответ поддержки целиком
     """
-    # Проверяем доступ пользователя к чату
-    async with get_db().__anext__() as db:
-        try:
-            await get_chat_with_messages(chat_id=chat_id, user_id=user_id, db=db)
-        except Exception:
-            await websocket.close(code=4003, reason="Access denied")
-            return
+    if not await _chat_member(chat_id, user_id):
+        await websocket.close(code=4003, reason="Access denied")
+        return
 
     await manager.connect(websocket, chat_id)
-    
-    try:
-        while True:
-            data = await websocket.receive_json()
-            
-            if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
-                
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, chat_id)
-    except Exception:
-        manager.disconnect(websocket, chat_id)
+    await _serve(websocket, user_id, chat_id=chat_id)
 
 
 def get_manager() -> ConnectionManager:
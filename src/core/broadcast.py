@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from core.config import settings
+
+logger = logging.getLogger("core.broadcast")
+
+DeliverHandler = Callable[[int, str], Awaitable[None]]
+
+
+class BroadcastBackend:
+    """
+    Транспорт рассылки сообщений чатов между воркерами.
+
+    publish() отправляет уже сериализованное событие всем процессам,
+    подписанным на чат; каждый процесс доставляет его своим сокетам
+    через handler.
+    """
+
+    def __init__(self):
+        self._handler: DeliverHandler | None = None
+
+    def bind(self, handler: DeliverHandler):
+        """Задаёт обработчик локальной доставки."""
+        self._handler = handler
+
+    async def start(self):
+        """Запуск при старте приложения."""
+
+    async def stop(self):
+        """Остановка при завершении приложения."""
+
+    async def subscribe(self, chat_id: int):
+        """Подписывает процесс на чат (первый локальный сокет)."""
+
+    def unsubscribe(self, chat_id: int):
+        """Снимает подписку (последний локальный сокет закрыт). Не блокирует."""
+
+    async def publish(self, chat_id: int, payload: str):
+        raise NotImplementedError
+
+
+class InMemoryBroadcast(BroadcastBackend):
+    """Рассылка в пределах одного процесса (по умолчанию)."""
+
+    async def publish(self, chat_id: int, payload: str):
+        await self._handler(chat_id, payload)
+
+
+class RedisBroadcast(BroadcastBackend):
+    """
+    Рассылка через Redis pub/sub: отдельный канал на каждый чат.
+
+    Процесс держит подписку на канал только пока у него есть
+    хотя бы один сокет этого чата.
+    """
+
+    def __init__(self, client, prefix: str = "chat:"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self._pubsub = None
+        self._listener: asyncio.Task | None = None
+        self._channels: set[int] = set()
+
+    def _channel(self, chat_id: int) -> str:
+        return f"{self.prefix}{chat_id}"
+
+    async def start(self):
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._channels.clear()
+
+    async def subscribe(self, chat_id: int):
+        await self.start()
+        self._channels.add(chat_id)
+        await self._pubsub.subscribe(self._channel(chat_id))
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    def unsubscribe(self, chat_id: int):
+        self._channels.discard(chat_id)
+        if self._pubsub is not None:
+            asyncio.get_running_loop().create_task(self._unsubscribe(chat_id))
+
+    async def _unsubscribe(self, chat_id: int):
+        # Пока задача ждала, в чат мог снова подключиться сокет
+        if chat_id in self._channels or self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(self._channel(chat_id))
+        except Exception as e:
+            logger.warning(f"Не удалось отписаться от канала чата {chat_id}: {e}")
+
+    async def publish(self, chat_id: int, payload: str):
+        await self.client.publish(self._channel(chat_id), payload)
+
+    async def _listen(self):
+        """Читает события из Redis и доставляет их локальным сокетам."""
+        while True:
+            try:
+                event = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Ошибка чтения Redis pub/sub: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not event or event.get("type") != "message":
+                continue
+
+            channel = event["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            try:
+                chat_id = int(channel[len(self.prefix):])
+                data = event["data"]
+                await self._handler(chat_id, data.decode() if isinstance(data, bytes) else data)
+            except Exception as e:
+                logger.exception(f"Ошибка доставки события из канала {channel}: {e}")
+
+
+def create_broadcast_backend() -> BroadcastBackend:
+    """Создаёт транспорт рассылки по настройке BROADCAST_BACKEND."""
+    if settings.BROADCAST_BACKEND == "redis":
+        from core.redis import get_async_redis
+        return RedisBroadcast(get_async_redis(), prefix=settings.BROADCAST_CHANNEL_PREFIX)
+    return InMemoryBroadcast()
@@ -5,12 +5,91 @@ class Settings(BaseSettings):
     GROK_API_URL: str = ""
     GROK_API_KEY: str | None = None
     SUPPORT_PROMPT_PATH: str = "./prompts.docx"
+    PROMPT_CACHE_TTL: float = 60.0  # секунды, 0 — без кэша в памяти
+
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict[str, str] = {}  # {"logger": "LEVEL"}, в .env — JSON
+    LOG_FORMAT: str = "text"  # text | json
+    LOG_DIR: str = "logs"
+    LOG_FILE_MAX_BYTES: int = 5_000_000
+    LOG_FILE_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10_000
+
+    METRICS_ENABLED: bool = True
+    METRICS_DB_QUERIES: bool = True
+
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    GROK_HTTP_TIMEOUT: float = 30.0
+    GROK_STREAM_READ_TIMEOUT: float = 120.0
+    GROK_HTTP_MAX_CONNECTIONS: int = 20
+    POCKETBASE_HTTP_TIMEOUT: float = 60.0
+    POCKETBASE_HTTP_MAX_CONNECTIONS: int = 20
 
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+
+    BROADCAST_BACKEND: str = "memory"  # memory | redis
+    BROADCAST_CHANNEL_PREFIX: str = "chat:"
+
+    # Участники чатов для проверки доступа: LRU в памяти поверх Redis
+    MEMBERSHIP_CACHE_SIZE: int = 50_000  # записей на воркер, 0 — без кэша в памяти
+    MEMBERSHIP_CACHE_TTL: float = 3600.0  # секунды, 0 — без кэша
+    MEMBERSHIP_NEGATIVE_TTL: float = 5.0  # отсутствующий чат
+    MEMBERSHIP_REDIS_ENABLED: bool = True  # общий кэш воркеров и рассылка сброса
+
+    READ_RECEIPT_FLUSH_INTERVAL: float = 1.0  # секунды между записями отметок о прочтении, 0 — сразу
+    UNREAD_COUNTERS_ENABLED: bool = True
+    UNREAD_RECONCILE_INTERVAL: int = 600  # секунды между сверками, 0 — только сборка при старте
+    UNREAD_REBUILD_LOCK_TTL: int = 300  # секунды; дольше самой сборки
+    UNREAD_REBUILD_BATCH: int = 500  # пользователей на транзакцию Redis
+
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_OVERFLOW_POLICY: str = "disconnect"  # disconnect | drop_oldest | drop_new
+    WS_USER_CHATS_LIMIT: int = 500  # /ws подписывает на столько самых свежих чатов
 
     DATABASE_URL: str = "sqlite:///tests.db"
+    DATABASE_READ_URL: str | None = None  # реплика для чтения; пусто — всё на основной БД
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800  # секунды; меньше idle-таймаутов сервера и балансировщика
+    DB_POOL_PRE_PING: bool = False  # SELECT 1 на каждую выдачу соединения из пула
+    DB_STATEMENT_CACHE_SIZE: int = 500  # prepared statements asyncpg на соединение; 0 — для PgBouncer
+
+    CHAT_HISTORY_PAGE_SIZE: int = 50
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 200
+    # /chat/sync: событий outbox за запрос; курсор не заходит в последние
+    # SYNC_CURSOR_LAG секунд — там могут быть ещё не закоммиченные id
+    SYNC_PAGE_SIZE: int = 200
+    SYNC_MAX_PAGE_SIZE: int = 1000
+    SYNC_CURSOR_LAG: float = 2.0
+
+    STORAGE_BACKEND: str = "pocketbase"  # pocketbase | s3 | local
+    LOCAL_STORAGE_PATH: str = "./storage"
+    LOCAL_STORAGE_URL: str = "/files"
+
+    MAX_UPLOAD_SIZE: int = 256 * 1024 * 1024
+
+    # Миниатюры image/video (Pillow, blurhash-python, ffmpeg — если установлены)
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_SIZE: int = 320
+    THUMBNAIL_QUALITY: int = 75
+    THUMBNAIL_WORKERS: int = 2
+    THUMBNAIL_QUEUE_SIZE: int = 100
+    THUMBNAIL_FFMPEG_TIMEOUT: float = 30.0
+    FFMPEG_PATH: str = "ffmpeg"
+    S3_MULTIPART_CHUNK_SIZE: int = 5 * 1024 * 1024  # минимум S3 — 5 МБ
+    S3_MULTIPART_CONCURRENCY: int = 2
+
+    # Transactional outbox: события сообщений публикует фоновый relay
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0  # секунды; send будит relay сразу
+    OUTBOX_RETENTION: int = 3 * 24 * 3600  # опубликованные события храним 3 дня
 
     POCKETBASE_URL: str
     POCKETBASE_ADMIN_EMAIL: str
@@ -23,6 +102,12 @@ class Settings(BaseSettings):
     S3_SECRET_KEY: str
     S3_BUCKET: str
     S3_REGION: str = "us-east-1"
+    S3_PUBLIC_URL: str | None = None  # по умолчанию {S3_ENDPOINT}/{S3_BUCKET}
+    S3_PRESIGN_ENDPOINT: str | None = None  # адрес S3, доступный клиентам, для подписанных URL
+
+    # Прямая загрузка клиентом по подписанным URL
+    PRESIGNED_URL_EXPIRES: int = 900
+    PRESIGNED_MULTIPART_THRESHOLD: int = 64 * 1024 * 1024
 
     @property
     def S3_URL(self) -> str:
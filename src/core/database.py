@@ -1,11 +1,15 @@
 import os
 import logging
 from typing import Any, AsyncGenerator
+from uuid import uuid4
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
 from dotenv import load_dotenv
 
+from core.config import settings
+
 load_dotenv()
 
 Base = declarative_base()
@@ -15,11 +19,32 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     logging.error("DATABASE_URL not found in .env")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    pool_pre_ping=True # Рекомендуется для обработки разрывов соединения
-)
+
+def engine_options(url: str) -> dict:
+    """Параметры create_async_engine из настроек: пул и кэш prepared statements."""
+    options = {"echo": False, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        # У SQLite свой пул (StaticPool для :memory:), размеры к нему неприменимы
+        return options
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if parsed.get_driver_name() == "asyncpg":
+        connect_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        if not settings.DB_STATEMENT_CACHE_SIZE:
+            # PgBouncer в режиме transaction: без кэшей и с уникальными именами
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        options["connect_args"] = connect_args
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -27,7 +52,34 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Реплика для чтения; без DATABASE_READ_URL чтение идёт в основную БД
+if settings.DATABASE_READ_URL:
+    read_engine = create_async_engine(settings.DATABASE_READ_URL, **engine_options(settings.DATABASE_READ_URL))
+    AsyncReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+else:
+    read_engine = engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
+
 async def get_db() -> AsyncGenerator[AsyncSession | Any, Any]:
     """Возвращает асинхронную сессию БД."""
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession | Any, Any]:
+    """
+    Сессия для обработчиков, которые только читают (список чатов, история).
+
+    С репликой данные могут отставать от основной БД на время репликации:
+    всё, что пишет или читает только что записанное, использует get_db.
+    """
+    async with AsyncReadSessionLocal() as session:
+        yield session
+
+
+async def dispose_engines():
+    """Закрывает соединения пулов (остановка приложения)."""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
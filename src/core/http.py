@@ -0,0 +1,164 @@
+import logging
+import time
+from typing import Dict
+
+import httpx
+from core.config import settings
+from core import metrics
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamStats:
+    """Счётчики одного upstream: запросы и реально открытые соединения."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "errors": self.errors,
+        }
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Обёртка транспорта, считающая запросы и новые TCP-соединения.
+
+    Новое соединение определяется по trace-событию httpcore
+    connection.connect_tcp.complete; запрос без него ушёл по keep-alive.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, stats: UpstreamStats, name: str = "upstream"):
+        self._transport = transport
+        self.stats = stats
+        self.name = name
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections_opened += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        request.extensions = {**request.extensions, "trace": self._trace}
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.stats.errors += 1
+            if metrics.metrics_enabled():
+                metrics.UPSTREAM_ERRORS.labels(self.name).inc()
+            raise
+        if metrics.metrics_enabled():
+            metrics.UPSTREAM_REQUEST_DURATION.labels(self.name, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HttpClientRegistry:
+    """
+    Общие httpx.AsyncClient по upstream с пулами keep-alive.
+
+    Клиент создаётся при первом обращении и живёт до остановки
+    приложения (aclose в lifespan), поэтому TCP/TLS-рукопожатие
+    не повторяется на каждый запрос.
+    """
+
+    def __init__(self):
+        self._configs: Dict[str, dict] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, UpstreamStats] = {}
+
+    def register(
+        self,
+        name: str,
+        timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int = None,
+        keepalive_expiry: float = None,
+        http2: bool = None,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        """Задаёт параметры пула upstream. Действует до создания клиента."""
+        self._configs[name] = {
+            "timeout": timeout,
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections or settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": keepalive_expiry or settings.HTTP_KEEPALIVE_EXPIRY,
+            "http2": settings.HTTP2_ENABLED if http2 is None else http2,
+            "transport": transport,
+        }
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Возвращает клиент upstream, создавая его при первом вызове."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        if name not in self._configs:
+            raise KeyError(f"Неизвестный upstream: {name}")
+        config = self._configs[name]
+        http2 = config["http2"] and HTTP2_AVAILABLE
+        if config["http2"] and not HTTP2_AVAILABLE:
+            logger.warning(f"h2 не установлен, {name} работает по HTTP/1.1")
+
+        limits = httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=min(config["max_keepalive_connections"], config["max_connections"]),
+            keepalive_expiry=config["keepalive_expiry"],
+        )
+        transport = config["transport"] or httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        stats = self._stats.setdefault(name, UpstreamStats())
+        logger.info(f"HTTP-клиент {name}: max_connections={limits.max_connections}, http2={http2}")
+        return httpx.AsyncClient(
+            transport=InstrumentedTransport(transport, stats, name),
+            timeout=httpx.Timeout(config["timeout"]),
+        )
+
+    def stats(self) -> dict:
+        """Метрики переиспользования соединений по upstream."""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    async def aclose(self):
+        """Закрывает все клиенты (остановка приложения)."""
+        for name, client in list(self._clients.items()):
+            await client.aclose()
+            logger.info(f"HTTP-клиент {name} закрыт: {self._stats[name].as_dict()}")
+        self._clients.clear()
+
+
+http_clients = HttpClientRegistry()
+http_clients.register(
+    "grok",
+    timeout=settings.GROK_HTTP_TIMEOUT,
+    max_connections=settings.GROK_HTTP_MAX_CONNECTIONS,
+)
+http_clients.register(
+    "pocketbase",
+    timeout=settings.POCKETBASE_HTTP_TIMEOUT,
+    max_connections=settings.POCKETBASE_HTTP_MAX_CONNECTIONS,
+)
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент upstream (grok, pocketbase)."""
+    return http_clients.get(name)
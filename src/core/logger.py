@@ -1,29 +1,145 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from core.config import settings
 
-LOG_DIR = Path("logs")
-LOG_DIR.mkdir(exist_ok=True)
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
 
-log_file = LOG_DIR / "app.log"
+_plain = logging.Formatter()
 
-file_handler = RotatingFileHandler(
-    log_file, maxBytes=5_000_000, backupCount=5, encoding="utf-8"
-)
+# Стандартные атрибуты LogRecord; всё остальное — поля из extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
 
-formatter = logging.Formatter(
-    "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
-)
-file_handler.setFormatter(formatter)
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-logger.addHandler(file_handler)
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка; поля из extra= попадают в объект."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладёт записи в ограниченную очередь, не блокируя вызывающий поток.
+
+    Запись на диск и в консоль делает поток QueueListener. Если он не
+    успевает и очередь полна, запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трейсбек вычисляем здесь: аргументы могут измениться,
+        # пока запись ждёт в очереди. Форматирует уже обработчик-получатель.
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: QueueListener | None = None
+_queue_handler: DroppingQueueHandler | None = None
+
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+def setup_logging(stream=None) -> DroppingQueueHandler:
+    """
+    Настраивает корневой логгер: очередь + поток-писатель.
+
+    stream — куда писать консольный вывод (по умолчанию stderr).
+    Повторный вызов ничего не меняет. Уровни модулей задаются LOG_LEVELS,
+    например {"sqlalchemy.engine": "WARNING", "services.grok": "DEBUG"}.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+
+    log_dir = Path(settings.LOG_DIR)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    formatter = _formatter()
+
+    file_handler = RotatingFileHandler(
+        log_dir / "app.log",
+        maxBytes=settings.LOG_FILE_MAX_BYTES,
+        backupCount=settings.LOG_FILE_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    console_handler = logging.StreamHandler(stream)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+    return _queue_handler
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток-писатель."""
+    global _listener, _queue_handler
+    listener, queue_handler = _listener, _queue_handler
+    if listener is None:
+        return
+    _listener = _queue_handler = None
+    logging.getLogger().removeHandler(queue_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    if queue_handler.dropped:
+        logging.getLogger(__name__).warning(f"Потеряно записей лога при переполнении очереди: {queue_handler.dropped}")
+
+
+def log_stats() -> dict:
+    """Заполнение очереди логов и число отброшенных записей."""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+
+logger = logging.getLogger()
+setup_logging()
 
 missing_env = []
 if not settings.DATABASE_URL:
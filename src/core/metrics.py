@@ -0,0 +1,138 @@
+import time
+
+from core.config import settings
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import ProcessCollector, PlatformCollector
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+def metrics_enabled() -> bool:
+    return settings.METRICS_ENABLED and PROMETHEUS_AVAILABLE
+
+
+# Границы гистограмм: от сотен микросекунд (запросы к БД) до минуты (Grok)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+if PROMETHEUS_AVAILABLE:
+    # Отдельный реестр: в /metrics попадает только то, что регистрирует сервис
+    registry = CollectorRegistry()
+    ProcessCollector(registry=registry)
+    PlatformCollector(registry=registry)
+
+    HTTP_REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds", "Время обработки HTTP-запроса",
+        ["method", "route", "status"], buckets=SLOW_BUCKETS, registry=registry,
+    )
+    DB_QUERY_DURATION = Histogram(
+        "db_query_duration_seconds", "Время SQL-запроса (round trip до БД)",
+        ["operation"], buckets=FAST_BUCKETS, registry=registry,
+    )
+    UPSTREAM_REQUEST_DURATION = Histogram(
+        "upstream_request_duration_seconds", "Время запроса к внешнему сервису до заголовков ответа",
+        ["upstream", "status"], buckets=SLOW_BUCKETS, registry=registry,
+    )
+    STORAGE_UPLOAD_DURATION = Histogram(
+        "storage_upload_duration_seconds", "Время загрузки файла в хранилище",
+        ["backend"], buckets=SLOW_BUCKETS, registry=registry,
+    )
+    BROADCAST_DURATION = Histogram(
+        "ws_broadcast_duration_seconds", "Сериализация и публикация сообщения чата",
+        buckets=FAST_BUCKETS, registry=registry,
+    )
+    UPSTREAM_ERRORS = Counter(
+        "upstream_errors_total", "Сетевые ошибки запросов к внешним сервисам",
+        ["upstream"], registry=registry,
+    )
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текст метрик в формате Prometheus и его Content-Type."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Гистограмма длительности HTTP-запросов по шаблону маршрута.
+
+    Метка route — шаблон пути (/chat/{chat_id}/send), а не сам путь,
+    чтобы число рядов не росло с числом чатов. Неизвестные пути
+    попадают в route="unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status),
+            ).observe(time.perf_counter() - started)
+
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _operation(statement: str) -> str:
+    keyword = (statement[:16].split(None, 1) or [""])[0].upper()
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        _db_query_histogram(_operation(statement)).observe(time.perf_counter() - started)
+
+
+_db_children: dict = {}
+
+
+def _db_query_histogram(operation: str):
+    # labels() берёт блокировку и собирает кортеж меток; дочерних рядов всего шесть
+    child = _db_children.get(operation)
+    if child is None:
+        child = _db_children[operation] = DB_QUERY_DURATION.labels(operation)
+    return child
+
+
+def instrument_engine(engine):
+    """
+    Считает SQL-запросы и их длительность через события движка SQLAlchemy.
+
+    Сам факт подписки на события движка включает диспетчеризацию всех его
+    событий (begin, commit, close...), что стоит десятки микросекунд на
+    запрос; METRICS_DB_QUERIES=false отключает эту часть метрик.
+    """
+    from sqlalchemy import event
+
+    if not settings.METRICS_DB_QUERIES:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -1,39 +1,72 @@
+import logging
+from typing import BinaryIO
+
 import httpx
 from core.config import settings
+from core.http import get_http_client
+
+logger = logging.getLogger(__name__)
 
 
 class PocketBaseClient:
-    """Клиент для загрузки файлов в PocketBase."""
+    """Клиент для загрузки файлов в PocketBase поверх общего пула соединений."""
 
-    def __init__(self):
+    def __init__(self, client: httpx.AsyncClient | None = None):
         self.token = None
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client("pocketbase")
 
     async def auth_admin(self):
         """Аутентификация администратора в PocketBase."""
-        async with httpx.AsyncClient() as client:
-            r = await client.post(
-                f"{settings.POCKETBASE_URL.rstrip('/')}/api/collections/_superusers/auth-with-password",
-                json={"identity": settings.POCKETBASE_ADMIN_EMAIL, "password": settings.POCKETBASE_ADMIN_PASSWORD}
-            )
-            r.raise_for_status()
-            self.token = r.json()["token"]
+        r = await self.client.post(
+            f"{settings.POCKETBASE_URL.rstrip('/')}/api/collections/_superusers/auth-with-password",
+            json={"identity": settings.POCKETBASE_ADMIN_EMAIL, "password": settings.POCKETBASE_ADMIN_PASSWORD}
+        )
+        r.raise_for_status()
+        self.token = r.json()["token"]
 
-    async def upload_file(self, file_bytes: bytes, filename: str):
-        """Загружает файл в PocketBase и возвращает URL."""
+    def _records_url(self) -> str:
+        return f"{settings.POCKETBASE_URL.rstrip('/')}/api/collections/{settings.POCKETBASE_COLLECTION}/records"
+
+    @staticmethod
+    def file_url(record: dict) -> str:
+        """Публичный URL файла записи."""
+        return f"{settings.POCKETBASE_URL.rstrip('/')}/api/files/{settings.POCKETBASE_COLLECTION}/{record['id']}/{record['field']}"
+
+    async def create_record(self, file: bytes | BinaryIO, filename: str, content_type: str | None = None) -> dict:
+        """
+        Создаёт запись с файлом и возвращает её.
 
+        Файловый объект уходит в multipart потоком порциями по 64 КБ,
+        целиком в память не читается.
+        """
         if not self.token:
             await self.auth_admin()
 
-        files = {"field": (filename, file_bytes)}
+        files = {"field": (filename, file, content_type)}
         headers = {"Authorization": f"Bearer {self.token}"}
 
-        async with httpx.AsyncClient() as client:
-            r = await client.post(
-                f"{settings.POCKETBASE_URL}/api/collections/{settings.POCKETBASE_COLLECTION}/records",
-                headers=headers,
-                files=files
-            )
+        r = await self.client.post(self._records_url(), headers=headers, files=files)
+        r.raise_for_status()
+        data = r.json()
+        logger.debug(f"Ответ PocketBase: {data}")
+        return data
+
+    async def upload_file(self, file: bytes | BinaryIO, filename: str, content_type: str | None = None):
+        """Загружает файл в PocketBase и возвращает URL."""
+        return self.file_url(await self.create_record(file, filename, content_type))
+
+    async def delete_record(self, record_id: str):
+        """Удаляет запись вместе с файлом."""
+        if not self.token:
+            await self.auth_admin()
+
+        r = await self.client.delete(
+            f"{self._records_url()}/{record_id}",
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        if r.status_code != 404:
             r.raise_for_status()
-            data = r.json()
-            print("POCKETBASE RESPONSE:", data)
-            return f"{settings.POCKETBASE_URL.rstrip('/')}/api/files/{settings.POCKETBASE_COLLECTION}/{data['id']}/{data['field']}"
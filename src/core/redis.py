@@ -1,6 +1,9 @@
 import redis
+import redis.asyncio as aioredis
 from core.config import settings
 
+# Синхронный клиент — только для скриптов и миграций, не для обработчиков:
+# каждый вызов блокирует event loop на время сетевого запроса.
 redis_client = redis.Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
@@ -8,7 +11,31 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# При исчерпании пула запрос ждёт свободное соединение, а не падает
+async_redis_pool = aioredis.BlockingConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30,
+    timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
+
+async_redis_client = aioredis.Redis(connection_pool=async_redis_pool)
+
 def get_redis() -> redis.Redis:
-    """Возвращает клиент Redis."""
+    """Возвращает синхронный клиент Redis (для скриптов)."""
     return redis_client
 
+
+def get_async_redis() -> aioredis.Redis:
+    """Возвращает асинхронный клиент Redis с общим пулом соединений."""
+    return async_redis_client
+
+
+async def close_async_redis():
+    """Закрывает соединения пула (остановка приложения)."""
+    await async_redis_pool.disconnect()
@@ -0,0 +1,326 @@
+import asyncio
+import io
+import logging
+import re
+import shutil
+import uuid
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+from core.config import settings
+
+logger = logging.getLogger("core.storage")
+
+FileSource = bytes | BinaryIO
+
+
+class StoredFile(NamedTuple):
+    """Результат загрузки: ключ в хранилище и публичный URL."""
+    key: str
+    url: str
+
+
+class ObjectInfo(NamedTuple):
+    """Метаданные объекта в хранилище (HEAD)."""
+    size: int
+    content_type: str | None
+
+
+def make_key(filename: str | None, prefix: str = "") -> str:
+    """Уникальный ключ объекта: {prefix}{uuid}/{безопасное имя файла}."""
+    name = Path(filename or "file").name
+    name = re.sub(r"[^\w.\-]+", "_", name).strip("._") or "file"
+    return f"{prefix}{uuid.uuid4().hex}/{name}"
+
+
+def _as_fileobj(file: FileSource) -> BinaryIO:
+    if isinstance(file, (bytes, bytearray)):
+        return io.BytesIO(file)
+    return file
+
+
+class StorageBackend:
+    """
+    Хранилище файлов сообщений.
+
+    upload() принимает байты или файловый объект (спул UploadFile) и
+    читает его порциями; start()/stop() вызываются в lifespan приложения.
+
+    Хранилища с supports_presigned = True умеют принимать файл напрямую
+    от клиента по подписанным URL, минуя сервер приложения.
+    """
+
+    supports_presigned = False
+
+    async def start(self):
+        """Запуск при старте приложения."""
+
+    async def stop(self):
+        """Остановка при завершении приложения."""
+
+    async def upload(self, file: FileSource, filename: str, content_type: str | None = None,
+                     key: str | None = None) -> StoredFile:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    def url_for(self, key: str) -> str:
+        """Публичный URL объекта по ключу."""
+        raise NotImplementedError
+
+    async def presign_upload(self, key: str, content_type: str, size: int) -> dict:
+        """
+        Подписанные URL для загрузки клиентом напрямую.
+
+        Возвращает method/url/headers для одиночного PUT либо upload_id,
+        part_size и parts (part_number, url) для multipart-загрузки.
+        """
+        raise NotImplementedError
+
+    async def complete_upload(self, key: str, upload_id: str, parts: list[tuple[int, str]]):
+        """Собирает multipart-загрузку из частей (part_number, etag); ValueError при ошибке."""
+        raise NotImplementedError
+
+    async def abort_upload(self, key: str, upload_id: str):
+        """Отменяет незавершённую multipart-загрузку."""
+        raise NotImplementedError
+
+    async def head(self, key: str) -> ObjectInfo | None:
+        """Метаданные объекта или None, если его нет."""
+        raise NotImplementedError
+
+
+class PocketBaseStorage(StorageBackend):
+    """Файлы как записи коллекции PocketBase; ключ — {record_id}/{имя файла}."""
+
+    def __init__(self, client=None):
+        from core.pocketbase_client import PocketBaseClient
+        self.client = client or PocketBaseClient()
+
+    async def upload(self, file, filename, content_type=None, key=None):
+        record = await self.client.create_record(_as_fileobj(file), filename, content_type)
+        return StoredFile(key=f"{record['id']}/{record['field']}", url=self.client.file_url(record))
+
+    def url_for(self, key):
+        record_id, field = key.split("/", 1)
+        return self.client.file_url({"id": record_id, "field": field})
+
+    async def delete(self, key):
+        await self.client.delete_record(key.split("/", 1)[0])
+
+
+class _ThreadedReader:
+    """Чтение спула в отдельном потоке, чтобы не блокировать event loop."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+
+    async def read(self, size: int = -1) -> bytes:
+        return await asyncio.to_thread(self.fileobj.read, size)
+
+
+class S3Storage(StorageBackend):
+    """
+    S3/MinIO через aioboto3 с одним клиентом на всё время жизни приложения.
+
+    Большие файлы уходят multipart-загрузкой: до S3_MULTIPART_CONCURRENCY
+    частей параллельно. В памяти на одну загрузку — читаемая часть, одна
+    часть в очереди и по части на загрузчик (upload_memory_bound): при 5 МБ
+    и двух загрузчиках до 20 МБ.
+
+    Подписанные URL строятся на S3_PRESIGN_ENDPOINT, если S3_ENDPOINT
+    недоступен клиентам (внутренний адрес MinIO).
+    """
+
+    supports_presigned = True
+
+    def __init__(self, bucket: str = None, endpoint_url: str = None, public_url: str = None,
+                 presign_endpoint_url: str = None, session=None):
+        self.bucket = bucket or settings.S3_BUCKET
+        self.endpoint_url = endpoint_url or str(settings.S3_ENDPOINT)
+        self.presign_endpoint_url = presign_endpoint_url or settings.S3_PRESIGN_ENDPOINT
+        self.public_url = (public_url or settings.S3_PUBLIC_URL or settings.S3_URL).rstrip("/")
+        self._session = session
+        self._client = None
+        self._presign_client = None
+        self._stack: AsyncExitStack | None = None
+        self._lock = asyncio.Lock()
+
+    def _open(self, endpoint_url: str):
+        from aiobotocore.config import AioConfig
+        return self._session.client(
+            service_name="s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=settings.S3_ACCESS_KEY,
+            aws_secret_access_key=settings.S3_SECRET_KEY,
+            region_name=settings.S3_REGION,
+            # MinIO: path-style адреса; подписанные URL — SigV4
+            config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    async def start(self):
+        async with self._lock:
+            if self._client is not None:
+                return
+            if self._session is None:
+                import aioboto3
+                self._session = aioboto3.Session()
+            self._stack = AsyncExitStack()
+            self._client = await self._stack.enter_async_context(self._open(self.endpoint_url))
+            self._presign_client = self._client
+            if self.presign_endpoint_url and self.presign_endpoint_url != self.endpoint_url:
+                # Подпись считается локально, соединений этот клиент не открывает
+                self._presign_client = await self._stack.enter_async_context(self._open(self.presign_endpoint_url))
+            logger.info(f"S3-клиент открыт: {self.endpoint_url}, bucket={self.bucket}")
+
+    async def stop(self):
+        async with self._lock:
+            if self._stack is not None:
+                await self._stack.aclose()
+            self._stack = None
+            self._client = None
+            self._presign_client = None
+
+    async def _get_client(self):
+        if self._client is None:
+            # Скрипты и тесты без lifespan: клиент открывается при первом вызове
+            await self.start()
+        return self._client
+
+    @staticmethod
+    def transfer_config():
+        from boto3.s3.transfer import TransferConfig
+        return TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+            # Очередь прочитанных частей: одна ждёт, пока загрузчики заняты
+            max_io_queue=1,
+        )
+
+    @staticmethod
+    def upload_memory_bound() -> int:
+        """Предел буферов одной multipart-загрузки в байтах."""
+        return settings.S3_MULTIPART_CHUNK_SIZE * (settings.S3_MULTIPART_CONCURRENCY + 2)
+
+    async def upload(self, file, filename, content_type=None, key=None):
+        client = await self._get_client()
+        key = key or make_key(filename)
+        extra = {"ContentType": content_type} if content_type else None
+        await client.upload_fileobj(
+            _ThreadedReader(_as_fileobj(file)), self.bucket, key,
+            ExtraArgs=extra, Config=self.transfer_config(),
+        )
+        return StoredFile(key=key, url=self.url_for(key))
+
+    async def delete(self, key):
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url_for(self, key):
+        return f"{self.public_url}/{key}"
+
+    async def presign_upload(self, key, content_type, size):
+        client = await self._get_client()
+        expires = settings.PRESIGNED_URL_EXPIRES
+        params = {"Bucket": self.bucket, "Key": key}
+
+        if size <= settings.PRESIGNED_MULTIPART_THRESHOLD:
+            # ContentType входит в подпись: PUT с другим типом S3 отклонит
+            url = await self._presign_client.generate_presigned_url(
+                "put_object", Params={**params, "ContentType": content_type}, ExpiresIn=expires,
+            )
+            return {"method": "PUT", "url": url, "headers": {"Content-Type": content_type}, "expires_in": expires}
+
+        part_size = settings.S3_MULTIPART_CHUNK_SIZE
+        upload = await client.create_multipart_upload(**params, ContentType=content_type)
+        upload_id = upload["UploadId"]
+        parts = []
+        for number in range(1, -(-size // part_size) + 1):
+            url = await self._presign_client.generate_presigned_url(
+                "upload_part", Params={**params, "UploadId": upload_id, "PartNumber": number}, ExpiresIn=expires,
+            )
+            parts.append({"part_number": number, "url": url})
+        return {"method": "PUT", "upload_id": upload_id, "part_size": part_size, "parts": parts,
+                "expires_in": expires}
+
+    async def complete_upload(self, key, upload_id, parts):
+        from botocore.exceptions import ClientError
+        client = await self._get_client()
+        try:
+            await client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": n, "ETag": etag} for n, etag in sorted(parts)]},
+            )
+        except ClientError as e:
+            raise ValueError(f"Не удалось собрать загрузку {key}: {e}") from e
+
+    async def abort_upload(self, key, upload_id):
+        client = await self._get_client()
+        await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+    async def head(self, key):
+        from botocore.exceptions import ClientError
+        client = await self._get_client()
+        try:
+            meta = await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectInfo(size=meta["ContentLength"], content_type=meta.get("ContentType"))
+
+
+class LocalStorage(StorageBackend):
+    """Файлы на локальном диске (тесты, бенчмарки, разработка)."""
+
+    def __init__(self, root: str | Path = None, base_url: str = None):
+        self.root = Path(root or settings.LOCAL_STORAGE_PATH).resolve()
+        self.base_url = (base_url or settings.LOCAL_STORAGE_URL).rstrip("/")
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"Недопустимый ключ: {key}")
+        return path
+
+    def _write(self, fileobj: BinaryIO, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, length=1024 * 1024)
+
+    async def upload(self, file, filename, content_type=None, key=None):
+        key = key or make_key(filename)
+        await asyncio.to_thread(self._write, _as_fileobj(file), self._path(key))
+        return StoredFile(key=key, url=self.url_for(key))
+
+    async def delete(self, key):
+        await asyncio.to_thread(self._path(key).unlink, True)
+
+    def url_for(self, key):
+        return f"{self.base_url}/{key}"
+
+
+STORAGE_BACKENDS = {
+    "pocketbase": PocketBaseStorage,
+    "s3": S3Storage,
+    "local": LocalStorage,
+}
+
+
+def create_storage_backend() -> StorageBackend:
+    """Создаёт хранилище по настройке STORAGE_BACKEND."""
+    backend = STORAGE_BACKENDS.get(settings.STORAGE_BACKEND)
+    if backend is None:
+        raise ValueError(f"Неизвестное хранилище: {settings.STORAGE_BACKEND}")
+    return backend()
+
+
+storage = create_storage_backend()
+
+
+def get_storage() -> StorageBackend:
+    """Возвращает хранилище приложения."""
+    return storage
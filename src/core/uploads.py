@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+from core.config import settings
+
+# Запас сверх MAX_UPLOAD_SIZE на заголовки multipart и текстовые поля
+MULTIPART_OVERHEAD = 1024 * 1024
+
+
+def _too_large_detail(limit: int) -> str:
+    return f"Файл больше допустимого размера {limit // (1024 * 1024)} МБ"
+
+
+class BodySizeLimitMiddleware:
+    """
+    Ограничивает размер тела запроса прямо во время приёма.
+
+    Запрос с большим Content-Length отклоняется сразу; для остальных байты
+    считаются по мере чтения, и при превышении лимита чтение обрывается,
+    а клиент получает 413 — файл не успевает целиком лечь в спул на диске.
+    """
+
+    def __init__(self, app, max_body_size: int = None):
+        self.app = app
+        self.max_body_size = max_body_size or settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    exceeded = True
+                    # Обрываем разбор тела: дальше приложение увидит отключение
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Ответ приложения на оборванный запрос подменяем на 413
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": _too_large_detail(settings.MAX_UPLOAD_SIZE)}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def upload_size(file: UploadFile) -> int:
+    """
+    Размер загруженного файла без чтения в память; 413 при превышении лимита.
+
+    Перематывает спул в начало, чтобы файл можно было отдать потоком.
+    """
+    size = file.size
+    if size is None:
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+    check_upload_size(size)
+    file.file.seek(0)
+    return size
+
+
+def check_upload_size(size: int):
+    """413, если файл больше MAX_UPLOAD_SIZE."""
+    if size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=_too_large_detail(settings.MAX_UPLOAD_SIZE))
+
+
+
+def message_type_for(content_type: str | None) -> str:
+    """Тип сообщения по MIME-типу файла."""
+    content_type = content_type or ""
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type.startswith("video/"):
+        return "video"
+    return "document"
+
+
+def upload_prefix(chat_id: int, user_id: int) -> str:
+    """Префикс ключей прямой загрузки: файл привязан к чату и отправителю."""
+    return f"chats/{chat_id}/{user_id}/"
+
+
+def is_upload_key_of(key: str, chat_id: int, user_id: int) -> bool:
+    """Ключ выдан этому отправителю в этом чате и не выходит за префикс."""
+    prefix = upload_prefix(chat_id, user_id)
+    parts = key[len(prefix):].split("/")
+    return key.startswith(prefix) and all(part not in ("", ".", "..") for part in parts)
+
+
+def file_digest(fileobj: BinaryIO, chunk_size: int = 1024 * 1024) -> tuple[str, int]:
+    """
+    SHA-256 и размер файла, прочитанного порциями; перематывает файл в начало.
+
+    Блокирующая — вызывать через asyncio.to_thread.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while chunk := fileobj.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import BinaryIO
+
+from sqlalchemy import update, delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import metrics
+from core.config import settings
+from core.storage import get_storage
+from core.uploads import file_digest
+from models.attachment import Attachment
+
+logger = logging.getLogger(__name__)
+
+
+async def _acquire(db: AsyncSession, condition) -> Attachment | None:
+    """Атомарно увеличивает refcount существующего вложения."""
+    result = await db.execute(
+        update(Attachment)
+        .where(condition)
+        .values(refcount=Attachment.refcount + 1)
+        .returning(Attachment)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    attachment = result.scalar_one_or_none()
+    if attachment is not None:
+        await db.commit()
+    return attachment
+
+
+async def _acquire_by_hash(db: AsyncSession, sha256: str) -> Attachment | None:
+    return await _acquire(db, Attachment.sha256 == sha256)
+
+
+async def _acquire_by_key(db: AsyncSession, storage_key: str) -> Attachment | None:
+    return await _acquire(db, Attachment.storage_key == storage_key)
+
+
+async def store_attachment(db: AsyncSession, fileobj: BinaryIO, filename: str,
+                           content_type: str = None) -> Attachment:
+    """
+    Сохраняет файл с дедупликацией по SHA-256 содержимого.
+
+    Хэш считается потоком по спулу в отдельном потоке. Если такой файл
+    уже есть, хранилище не трогаем — только refcount + 1. Иначе файл
+    загружается и создаётся вложение с refcount = 1; при гонке двух
+    одинаковых загрузок выигрывает первая вставка, лишний объект удаляется.
+    """
+    sha256, size = await asyncio.to_thread(file_digest, fileobj)
+
+    attachment = await _acquire_by_hash(db, sha256)
+    if attachment is not None:
+        return attachment
+
+    storage = get_storage()
+    started = time.perf_counter()
+    stored = await storage.upload(fileobj, filename, content_type)
+    if metrics.metrics_enabled():
+        metrics.STORAGE_UPLOAD_DURATION.labels(settings.STORAGE_BACKEND).observe(time.perf_counter() - started)
+    try:
+        attachment = (await db.execute(
+            insert(Attachment)
+            .values(sha256=sha256, size=size, content_type=content_type,
+                    storage_key=stored.key, url=stored.url, refcount=1)
+            .returning(Attachment)
+        )).scalar_one()
+        await db.commit()
+        return attachment
+    except IntegrityError:
+        await db.rollback()
+        await storage.delete(stored.key)
+        attachment = await _acquire_by_hash(db, sha256)
+        if attachment is None:
+            raise
+        return attachment
+
+
+async def register_attachment(db: AsyncSession, storage_key: str, url: str, size: int,
+                              content_type: str = None) -> Attachment:
+    """
+    Вложение для файла, загруженного клиентом напрямую (хэш неизвестен).
+
+    Дедупликация по ключу объекта: повторное завершение той же загрузки
+    поднимает refcount существующей записи, а не создаёт вторую.
+    """
+    attachment = await _acquire_by_key(db, storage_key)
+    if attachment is not None:
+        return attachment
+    try:
+        attachment = (await db.execute(
+            insert(Attachment)
+            .values(sha256=None, size=size, content_type=content_type,
+                    storage_key=storage_key, url=url, refcount=1)
+            .returning(Attachment)
+        )).scalar_one()
+        await db.commit()
+        return attachment
+    except IntegrityError:
+        await db.rollback()
+        attachment = await _acquire_by_key(db, storage_key)
+        if attachment is None:
+            raise
+        return attachment
+
+
+async def release_attachment(db: AsyncSession, attachment_id: int):
+    """
+    Уменьшает refcount; на нуле удаляет запись и объект в хранилище.
+
+    DELETE выполняется только при refcount = 0, поэтому параллельный
+    store_attachment, успевший поднять refcount, объект сохранит.
+    """
+    refcount = (await db.execute(
+        update(Attachment)
+        .where(Attachment.id == attachment_id, Attachment.refcount > 0)
+        .values(refcount=Attachment.refcount - 1)
+        .returning(Attachment.refcount)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    if refcount != 0:
+        await db.commit()
+        return
+
+    deleted = (await db.execute(
+        delete(Attachment)
+        .where(Attachment.id == attachment_id, Attachment.refcount == 0)
+        .returning(Attachment.storage_key, Attachment.thumbnail_key)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    await db.commit()
+    if deleted is None:
+        return
+    storage = get_storage()
+    for key in deleted:
+        if key:
+            await storage.delete(key)
+    logger.info(f"Вложение {attachment_id} удалено из хранилища: {deleted.storage_key}")
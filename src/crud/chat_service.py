@@ -1,13 +1,30 @@
 from datetime import datetime
-from sqlalchemy import select, update, or_
+from sqlalchemy import BigInteger, Text, cast, column, null, select, update, insert, literal, func, case, true, or_, and_, union_all, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, joinedload
 from fastapi import HTTPException, status
 
+from core.config import settings
 from models.chat import Chat
+from models.chat_participant import ChatParticipant
 from models.announcement import Announcement
 from models.messages import Message
+from models.outbox import OutboxEvent
 from models.user import User
+from crud.outbox import add_event, add_events, event_data
+from services import membership, receipts as read_receipts, unread as unread_counters
+
+
+def user_channel(user_id: int) -> int:
+    """
+    Ключ личного канала пользователя в транспорте рассылки.
+
+    Каналы чатов — их id (> 0), личные — отрицательные, поэтому оба
+    живут в одном пространстве ключей. В outbox получатель хранится
+    явно в outbox_events.user_id, см. services.outbox.event_channel.
+    """
+    return -user_id
 
 
 async def get_or_create_chat(announcement_id: int, buyer_id: int, db: AsyncSession):
@@ -33,171 +50,543 @@ async def get_or_create_chat(announcement_id: int, buyer_id: int, db: AsyncSessi
             buyer_id=buyer_id,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
+            # Отметки о прочтении — watermark участника, см. mark_read
+            participants=[
+                ChatParticipant(user_id=member_id) for member_id in {announcement.user_id, buyer_id}
+            ],
         )
         db.add(chat)
+        await db.flush()
+        # Новый чат появляется в списке у обоих участников (личный канал /ws)
+        for member_id in (chat.seller_id, chat.buyer_id):
+            await add_event(db, chat.id, "chat_created", user_id=member_id, data={
+                "chat_id": chat.id, "announcement_id": announcement_id,
+                "seller_id": chat.seller_id, "buyer_id": buyer_id,
+            })
         await db.commit()
         await db.refresh(chat)
+        # Другие воркеры могли запомнить, что такого чата нет
+        await membership.invalidate_chat(chat.id)
 
     return chat
 
 
-async def send_message(chat_id: int, sender_id: int, db: AsyncSession, text: str = None, file_url: str = None,
-                       message_type: str  = "text"):
-    """Отправить сообщение + обновить превью"""
-    result = await db.execute(select(Chat).where(Chat.id == chat_id))
-    chat = result.scalar_one_or_none()
-    if not chat:
-        raise HTTPException(status_code=404, detail="Чат не найден")
+def message_preview(text: str | None, message_type: str) -> str:
+    """Текст превью последнего сообщения для списка чатов."""
+    if message_type == "text" and text:
+        return text[:100] + ("..." if len(text) > 100 else "")
+    elif message_type == "image":
+        return "Фото"
+    elif message_type == "video":
+        return "Видео"
+    elif message_type == "document":
+        return "Документ"
+    return "Сообщение"
 
-    result = await db.execute(select(Announcement.user_id).where(Announcement.id == chat.announcement_id))
-    seller_id = result.scalar_one()
 
-    if sender_id not in (chat.buyer_id, seller_id):
-        raise HTTPException(status_code=403, detail="Доступ запрещён")
+def _is_postgres(db: AsyncSession) -> bool:
+    bind = getattr(db, "bind", None)
+    return getattr(getattr(bind, "dialect", None), "name", None) == "postgresql"
+
+
+async def send_message(chat_id: int, sender_id: int, db: AsyncSession, text: str = None, file_url: str = None,
+                       message_type: str  = "text", attachment_id: int = None, thumbnail_url: str = None,
+                       blurhash: str = None):
+    """
+    Отправить сообщение + обновить превью.
 
-    message = Message(
-        chat_id=chat_id,
-        sender_id=sender_id,
-        message_text=text,
-        file_url=file_url,
-        message_type=message_type,
-        is_read=False,
-        created_at=datetime.utcnow()
+    Доступ проверяется по Chat.buyer_id/seller_id прямо в UPDATE превью,
+    он же возвращает получателя для счётчика непрочитанных. В той же
+    транзакции пишутся события outbox — их публикует services.outbox:
+    message в канал чата и chat_updated (превью) в личные каналы обоих
+    участников, чтобы /ws получал превью и за WS_USER_CHATS_LIMIT.
+    На Postgres UPDATE и все INSERT идут одним запросом (CTE),
+    на других СУБД — четырьмя; затем один COMMIT.
+    """
+    now = datetime.utcnow()
+    preview = {
+        "chat_id": chat_id,
+        "sender_id": sender_id,
+        "last_message_text": message_preview(text, message_type),
+        "last_message_type": message_type,
+        "last_message_at": now,
+    }
+    chat_update = (
+        update(Chat)
+        .where(
+            Chat.id == chat_id,
+            or_(Chat.buyer_id == sender_id, Chat.seller_id == sender_id)
+        )
+        .values(
+            last_message_text=preview["last_message_text"],
+            last_message_type=message_type,
+            last_message_at=now,
+            updated_at=now,
+        )
     )
-    db.add(message)
+    messages = Message.__table__
+    message_values = {
+        "sender_id": sender_id,
+        "message_text": text,
+        "file_url": file_url,
+        "attachment_id": attachment_id,
+        "thumbnail_url": thumbnail_url,
+        "blurhash": blurhash,
+        "message_type": message_type,
+        "created_at": now,
+    }
 
-    # Обновляем превью чата
-    if message_type == "text" and text:
-        preview = text[:100] + ("..." if len(text) > 100 else "")
-    elif message_type == "image":
-        preview = "Фото"
-    elif message_type == "video":
-        preview = "Видео"
-    elif message_type == "document":
-        preview = "Документ"
+    recipient = case(
+        (Chat.buyer_id == sender_id, Chat.seller_id),
+        else_=Chat.buyer_id,
+    ).label("recipient_id")
+    chat_update = chat_update.returning(Chat.id, recipient)
+
+    if _is_postgres(db):
+        updated = chat_update.cte("updated_chat")
+        inserted = (
+            insert(messages)
+            .from_select(
+                ["chat_id", *message_values],
+                select(updated.c.id, *(literal(v, messages.c[k].type) for k, v in message_values.items()))
+            )
+            .returning(*messages.c)
+            .cte("inserted_message")
+        )
+        outbox = OutboxEvent.__table__
+        created_at = literal(now, outbox.c.created_at.type)
+        chat_updated = (literal("chat_updated"), cast(null(), BigInteger), literal(event_data(preview), Text), created_at)
+        events = (
+            insert(outbox)
+            .from_select(
+                ["chat_id", "user_id", "event_type", "message_id", "data", "created_at"],
+                union_all(
+                    select(inserted.c.chat_id, cast(null(), BigInteger), literal("message"), inserted.c.id,
+                           cast(null(), Text), created_at),
+                    select(inserted.c.chat_id, literal(sender_id, BigInteger), *chat_updated),
+                    select(updated.c.id, updated.c.recipient_id, *chat_updated)
+                    .where(updated.c.recipient_id != sender_id),
+                ),
+            )
+            .cte("outbox_events")
+        )
+        stmt = (
+            select(inserted, updated.c.recipient_id)
+            .select_from(inserted.join(updated, true()))
+            # Изменяющий CTE выполняется и без ссылок из основного запроса
+            .add_cte(events)
+        )
+        row = (await db.execute(stmt)).one_or_none()
     else:
-        preview = "Сообщение"
+        updated = (await db.execute(
+            chat_update.execution_options(synchronize_session=False)
+        )).one_or_none()
+        row = None
+        if updated is not None:
+            inserted = (await db.execute(
+                insert(messages).values(chat_id=chat_id, **message_values).returning(*messages.c)
+            )).one()
+            row = {**inserted._mapping, "recipient_id": updated.recipient_id}
+            await add_event(db, chat_id, "message", message_id=row["id"])
+            await add_events(db, [
+                (chat_id, "chat_updated", preview, member_id)
+                for member_id in dict.fromkeys((sender_id, updated.recipient_id))
+            ])
 
-    chat.last_message_text = preview
-    chat.last_message_type = message_type
-    chat.last_message_at = datetime.utcnow()
+    if row is None:
+        # Холодный путь: выясняем, нет чата или нет доступа
+        await db.rollback()
+        result = await db.execute(select(Chat.id).where(Chat.id == chat_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Чат не найден")
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
 
     await db.commit()
-    await db.refresh(message)
-    return message
 
+    data = dict(getattr(row, "_mapping", row))
+    recipient_id = data.pop("recipient_id")
+    if recipient_id is not None:
+        await unread_counters.increment(recipient_id, chat_id)
+    return Message(**data)
 
-async def get_user_chats(db: "AsyncSession", user_id: int, role: str = None):
+
+def partner_info(partner: User | None) -> dict | None:
+    """Информация о партнёре по чату (имя, телефон, роль)."""
+    if not partner:
+        return None
+    # Определяем роль по user_role_id (1-2 = Бизнес, 3+ = Частное лицо)
+    role = "Бизнес" if partner.user_role_id and partner.user_role_id <= 2 else "Частное лицо"
+    return {
+        "id": partner.id,
+        "name": partner.company_name or partner.name,
+        "phone": partner.representative_phone,
+        "company_name": partner.company_name,
+        "role": role
+    }
+
+
+async def get_user_chats(db: "AsyncSession", user_id: int, role: str = None, chat_ids: list[int] = None):
     """
-    Все чаты пользователя (покупатель или продавец).
+    Все чаты пользователя (покупатель или продавец) с числом непрочитанных.
     
+    Непрочитанные считаются одним сгруппированным подзапросом по watermark
+    участника, поэтому число запросов не зависит от количества чатов.
+
     Args:
         db: AsyncSession
         user_id: ID пользователя
         role: Фильтр - "buyer" (Покупаю) или "seller" (Продаю), None = все чаты
+        chat_ids: Только эти чаты (превью для /chat/sync)
     """
-    query = (
-        select(Chat)
-        .join(Announcement)
-        .options(
-            selectinload(Chat.ad),
-            selectinload(Chat.buyer),
-        )
-    )
-    
     if role == "buyer":
         # Показываем чаты, где пользователь — покупатель
-        query = query.where(Chat.buyer_id == user_id)
+        member_filter = Chat.buyer_id == user_id
     elif role == "seller":
         # Показываем чаты, где пользователь — продавец (владелец объявления)
-        query = query.where(Announcement.user_id == user_id)
+        member_filter = Chat.seller_id == user_id
     else:
         # Все чаты пользователя
-        query = query.where(
-            or_(
-                Chat.buyer_id == user_id,
-                Announcement.user_id == user_id
+        member_filter = or_(Chat.buyer_id == user_id, Chat.seller_id == user_id)
+    if chat_ids is not None:
+        member_filter = and_(member_filter, Chat.id.in_(chat_ids))
+
+    # Непрочитанные — входящие после watermark: диапазон по (chat_id, id) на чат
+    unread = (
+        select(Chat.id.label("chat_id"), func.count(Message.id).label("unread_count"))
+        .outerjoin(
+            ChatParticipant,
+            and_(ChatParticipant.chat_id == Chat.id, ChatParticipant.user_id == user_id)
+        )
+        .join(
+            Message,
+            and_(
+                Message.chat_id == Chat.id,
+                Message.id > func.coalesce(ChatParticipant.last_read_message_id, 0),
+                Message.sender_id != user_id,
             )
         )
-    
-    query = query.order_by(Chat.last_message_at.desc().nulls_last())
+        .where(member_filter)
+        .group_by(Chat.id)
+        .subquery()
+    )
+    query = (
+        select(Chat, func.coalesce(unread.c.unread_count, 0))
+        .outerjoin(unread, unread.c.chat_id == Chat.id)
+        .options(
+            selectinload(Chat.seller),
+            selectinload(Chat.buyer),
+        )
+        .where(member_filter)
+        .order_by(Chat.last_message_at.desc().nulls_last())
+    )
     result = await db.execute(query)
-    return result.scalars().all()
+
+    return [
+        {
+            "id": chat.id,
+            "announcement_id": chat.announcement_id,
+            "partner": partner_info(chat.seller if chat.buyer_id == user_id else chat.buyer),
+            "last_message_text": chat.last_message_text,
+            "last_message_type": chat.last_message_type or "text",
+            "last_message_at": chat.last_message_at,
+            "unread_count": unread_count,
+        }
+        for chat, unread_count in result.all()
+    ]
 
 
-async def get_chat_with_messages(chat_id: int, user_id: int, db: AsyncSession):
+def message_is_read():
     """
-    Открыть чат + историю + отметить прочитанными.
-    
-    Возвращает чат с информацией о партнёре (имя, телефон, роль).
+    is_read сообщения в SELECT: id не больше watermark получателя.
+
+    Получатель — участник чата, не являющийся отправителем; подзапрос
+    по первичному ключу chat_participants.
     """
-    result = await db.execute(
-        select(Chat)
-        .options(
-            selectinload(Chat.ad).selectinload(Announcement.seller),
-            selectinload(Chat.buyer),
-            selectinload(Chat.messages).selectinload(Message.sender)
+    watermark = (
+        select(func.max(ChatParticipant.last_read_message_id))
+        .where(ChatParticipant.chat_id == Message.chat_id, ChatParticipant.user_id != Message.sender_id)
+        .scalar_subquery()
+    )
+    return (Message.id <= func.coalesce(watermark, 0)).label("is_read")
+
+
+def serialize_message(msg: Message, is_read: bool = False) -> dict:
+    """Сериализует сообщение для ответа API и WebSocket; is_read — из message_is_read()."""
+    return {
+        "id": msg.id,
+        "chat_id": msg.chat_id,
+        "sender_id": msg.sender_id,
+        "message_text": msg.message_text,
+        "message_type": msg.message_type,
+        "file_url": msg.file_url,
+        "thumbnail_url": msg.thumbnail_url,
+        "blurhash": msg.blurhash,
+        "is_read": bool(is_read),
+        "created_at": msg.created_at.isoformat() if msg.created_at else None
+    }
+
+
+async def ensure_chat_member(chat_id: int, user_id: int, db: AsyncSession):
+    """Проверяет, что пользователь — участник чата, иначе 404."""
+    if not await is_chat_member(chat_id=chat_id, user_id=user_id, db=db):
+        raise HTTPException(status_code=404, detail="Чат не найден или доступ запрещён")
+
+
+async def is_chat_member(chat_id: int, user_id: int, db: AsyncSession) -> bool:
+    """Участник ли пользователь чата — из кэша участников, при промахе один запрос по PK."""
+    return await membership.is_member(chat_id=chat_id, user_id=user_id, db=db)
+
+
+async def get_member_chat_ids(user_id: int, db: AsyncSession, limit: int = None) -> list[int]:
+    """id чатов пользователя, сначала с самыми свежими сообщениями."""
+    query = (
+        select(Chat.id)
+        .where(or_(Chat.buyer_id == user_id, Chat.seller_id == user_id))
+        .order_by(Chat.last_message_at.desc().nulls_last(), Chat.id.desc())
+    )
+    if limit:
+        query = query.limit(limit)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def get_message_page(
+    chat_id: int,
+    db: AsyncSession,
+    before_id: int = None,
+    after_id: int = None,
+    limit: int = None,
+):
+    """
+    Страница истории сообщений (keyset-пагинация по (created_at, id)).
+
+    Без курсора возвращает самые новые сообщения. before_id листает историю
+    назад, after_id — вперёд. Сообщения в странице отсортированы по времени,
+    next_cursor — id для следующего запроса в том же направлении.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Укажите только before_id или after_id")
+
+    limit = min(limit or settings.CHAT_HISTORY_PAGE_SIZE, settings.CHAT_HISTORY_MAX_PAGE_SIZE)
+    query = select(Message, message_is_read()).where(Message.chat_id == chat_id)
+
+    cursor_id = after_id if after_id is not None else before_id
+    if cursor_id is not None:
+        cursor_at = (
+            select(Message.created_at)
+            .where(Message.id == cursor_id, Message.chat_id == chat_id)
+            .scalar_subquery()
         )
-        .where(
-            Chat.id == chat_id,
+
+    if after_id is not None:
+        query = query.where(
             or_(
-                Chat.buyer_id == user_id,
-                Chat.ad.has(Announcement.user_id == user_id)
+                Message.created_at > cursor_at,
+                and_(Message.created_at == cursor_at, Message.id > after_id)
             )
+        ).order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        if before_id is not None:
+            query = query.where(
+                or_(
+                    Message.created_at < cursor_at,
+                    and_(Message.created_at == cursor_at, Message.id < before_id)
+                )
+            )
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.all())
+    if not rows and cursor_id is not None:
+        # Курсор из другого чата или несуществующий даёт ту же пустую страницу,
+        # что и конец истории — различаем отдельным запросом только здесь
+        cursor_chat = (await db.execute(select(Message.chat_id).where(Message.id == cursor_id))).scalar()
+        if cursor_chat != chat_id:
+            raise HTTPException(status_code=400, detail="Курсор не найден в этом чате")
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if after_id is None:
+        rows.reverse()
+        next_cursor = rows[0][0].id if has_more else None
+    else:
+        next_cursor = rows[-1][0].id if has_more else None
+
+    return {
+        "messages": [serialize_message(msg, is_read) for msg, is_read in rows],
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }
+
+
+async def mark_read(db: AsyncSession, receipts: dict[tuple[int, int], int]) -> list[dict]:
+    """
+    Сдвигает watermark прочтения участников до up_to_id (без COMMIT).
+
+    receipts — {(chat_id, reader_id): up_to_id}. Watermark только растёт и
+    не уходит дальше последнего сообщения чата (up_to_id из будущего не
+    сделает прочитанными ещё не отправленные сообщения). Сами сообщения
+    не меняются: на пару пишется одна строка chat_participants.
+    На Postgres все пары идут одним INSERT ... ON CONFLICT из VALUES,
+    на других СУБД — по нескольку запросов на пару.
+    Для каждой сдвинутой пары в outbox пишется событие read.
+    Возвращает [{"chat_id", "reader_id", "up_to_id", "count"}], count —
+    сколько входящих стало прочитанными.
+    """
+    if not receipts:
+        return []
+
+    if _is_postgres(db):
+        pairs = (
+            values(
+                column("chat_id", BigInteger), column("reader_id", BigInteger), column("up_to_id", BigInteger),
+                name="receipts",
+            )
+            .data([(chat_id, reader_id, up_to_id) for (chat_id, reader_id), up_to_id in receipts.items()])
         )
-    )
-    chat = result.scalar_one_or_none()
+        last_message_id = (
+            select(func.max(Message.id))
+            .where(Message.chat_id == pairs.c.chat_id, Message.id <= pairs.c.up_to_id)
+            .scalar_subquery()
+        )
+        targets = select(pairs.c.chat_id, pairs.c.reader_id, last_message_id.label("up_to_id")).cte("targets")
+        participants = ChatParticipant.__table__
+        upsert = pg_insert(participants).from_select(
+            ["chat_id", "user_id", "last_read_message_id"],
+            select(targets).where(targets.c.up_to_id.is_not(None)),
+        )
+        advanced = (
+            upsert.on_conflict_do_update(
+                index_elements=["chat_id", "user_id"],
+                set_={"last_read_message_id": upsert.excluded.last_read_message_id},
+                where=participants.c.last_read_message_id < upsert.excluded.last_read_message_id,
+            )
+            .returning(participants.c.chat_id, participants.c.user_id, participants.c.last_read_message_id)
+            .cte("advanced")
+        )
+        # Все части запроса видят один снимок: здесь watermark ещё прежний
+        previous = (
+            select(participants.c.last_read_message_id)
+            .where(participants.c.chat_id == advanced.c.chat_id, participants.c.user_id == advanced.c.user_id)
+            .correlate(advanced)
+            .scalar_subquery()
+        )
+        newly_read = (
+            select(func.count(Message.id))
+            .where(
+                Message.chat_id == advanced.c.chat_id,
+                Message.id > func.coalesce(previous, 0),
+                Message.id <= advanced.c.last_read_message_id,
+                Message.sender_id != advanced.c.user_id,
+            )
+            .scalar_subquery()
+        )
+        rows = (await db.execute(
+            select(advanced.c.chat_id, advanced.c.user_id, advanced.c.last_read_message_id, newly_read)
+        )).all()
+    else:
+        rows = []
+        for (chat_id, reader_id), up_to_id in receipts.items():
+            participant = and_(ChatParticipant.chat_id == chat_id, ChatParticipant.user_id == reader_id)
+            up_to_id, previous = (await db.execute(select(
+                select(func.max(Message.id))
+                .where(Message.chat_id == chat_id, Message.id <= up_to_id)
+                .scalar_subquery(),
+                select(ChatParticipant.last_read_message_id).where(participant).scalar_subquery(),
+            ))).one()
+            if up_to_id is None or (previous is not None and previous >= up_to_id):
+                continue
+            if previous is None:
+                await db.execute(insert(ChatParticipant).values(
+                    chat_id=chat_id, user_id=reader_id, last_read_message_id=up_to_id
+                ))
+            else:
+                await db.execute(
+                    update(ChatParticipant)
+                    .where(participant)
+                    .values(last_read_message_id=up_to_id)
+                    .execution_options(synchronize_session=False)
+                )
+            count = (await db.execute(
+                select(func.count(Message.id)).where(
+                    Message.chat_id == chat_id,
+                    Message.id > (previous or 0),
+                    Message.id <= up_to_id,
+                    Message.sender_id != reader_id,
+                )
+            )).scalar()
+            rows.append((chat_id, reader_id, up_to_id, count))
+
+    read = [
+        {"chat_id": chat_id, "reader_id": reader_id, "up_to_id": up_to_id, "count": count}
+        for chat_id, reader_id, up_to_id, count in rows
+    ]
+    # Отметки о прочтении уходят партнёру и в /chat/sync через outbox,
+    # а читателю — в личный канал: счётчик непрочитанных на других устройствах
+    events = []
+    for r in read:
+        events.append((r["chat_id"], "read",
+                       {"chat_id": r["chat_id"], "reader_id": r["reader_id"], "up_to_id": r["up_to_id"]}, None))
+        if r["count"]:
+            events.append((r["chat_id"], "chat_read",
+                           {"chat_id": r["chat_id"], "up_to_id": r["up_to_id"], "count": r["count"]}, r["reader_id"]))
+    await add_events(db, events)
+    return read
+
+
+async def get_chat_with_messages(
+    chat_id: int,
+    user_id: int,
+    db: AsyncSession,
+    before_id: int = None,
+    after_id: int = None,
+    limit: int = None,
+):
+    """
+    Открыть чат + страницу истории + отметить прочитанными.
 
+    Отметка — до самого нового сообщения страницы — ставится в буфер
+    services.receipts и пишется пачкой; в ответе входящие сообщения
+    страницы уже помечены прочитанными.
+    
+    Возвращает чат с информацией о партнёре (имя, телефон, роль).
+    По умолчанию в истории — самая новая страница сообщений.
+    """
+    # Доступ — по участникам чата (buyer_id/seller_id) из кэша, как в /ws и /send
+    members = await membership.get_chat_members(chat_id, db)
+    if members is None or not members.includes(user_id):
+        raise HTTPException(status_code=404, detail="Чат не найден или доступ запрещён")
+
+    # Я покупатель — партнёр продавец, и наоборот
+    partner_relation = Chat.seller if members.buyer_id == user_id else Chat.buyer
+    chat = (await db.execute(
+        select(Chat).options(joinedload(partner_relation)).where(Chat.id == chat_id)
+    )).scalar_one_or_none()
     if not chat:
         raise HTTPException(status_code=404, detail="Чат не найден или доступ запрещён")
 
-    # Отмечаем входящие сообщения прочитанными
-    await db.execute(
-        update(Message)
-        .where(
-            Message.chat_id == chat_id,
-            Message.sender_id != user_id,
-            Message.is_read == False
-        )
-        .values(is_read=True)
+    page = await get_message_page(
+        chat_id=chat_id, db=db, before_id=before_id, after_id=after_id, limit=limit
     )
-    await db.commit()
-    
-    # Определяем партнёра (если я покупатель - партнёр продавец, и наоборот)
-    if chat.buyer_id == user_id:
-        # Я покупатель, партнёр - продавец
-        partner = chat.ad.seller if chat.ad else None
-    else:
-        # Я продавец, партнёр - покупатель
-        partner = chat.buyer
-    
-    # Формируем ответ с информацией о партнёре
-    partner_info = None
-    if partner:
-        # Определяем роль по user_role_id (1-2 = Бизнес, 3+ = Частное лицо)
-        role = "Бизнес" if partner.user_role_id and partner.user_role_id <= 2 else "Частное лицо"
-        partner_info = {
-            "id": partner.id,
-            "name": partner.company_name or partner.name,
-            "phone": partner.representative_phone,
-            "company_name": partner.company_name,
-            "role": role
-        }
-    
+
+    # Прочитано то, что пользователь получил: до самого нового id страницы
+    up_to_id = max((m["id"] for m in page["messages"]), default=None)
+    if up_to_id is not None:
+        if not read_receipts.get_read_receipts().mark(chat_id, user_id, up_to_id):
+            # Буфер не запущен (скрипты, тесты) — пишем сразу
+            read = await mark_read(db, {(chat_id, user_id): up_to_id})
+            await db.commit()
+            for receipt in read:
+                await unread_counters.decrement(user_id, chat_id, receipt["count"])
+        for message in page["messages"]:
+            if message["sender_id"] != user_id and message["id"] <= up_to_id:
+                message["is_read"] = True
+
+    partner = chat.seller if members.buyer_id == user_id else chat.buyer
+
     return {
         "id": chat.id,
         "announcement_id": chat.announcement_id,
-        "partner": partner_info,
-        "messages": [
-            {
-                "id": msg.id,
-                "sender_id": msg.sender_id,
-                "message_text": msg.message_text,
-                "message_type": msg.message_type,
-                "file_url": msg.file_url,
-                "is_read": msg.is_read,
-                "created_at": msg.created_at.isoformat() if msg.created_at else None
-            }
-            for msg in sorted(chat.messages, key=lambda m: m.created_at or datetime.min)
-        ]
-    }
\ No newline at end of file
+        "partner": partner_info(partner),
+        **page,
+    }
@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.outbox import OutboxEvent
+
+
+def event_data(data: dict) -> str:
+    """Сериализует data события для колонки outbox_events.data."""
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+async def add_event(db: AsyncSession, chat_id: int, event_type: str, data: dict = None,
+                    message_id: int = None, user_id: int = None) -> int:
+    """
+    Добавляет событие в outbox в текущей транзакции (без COMMIT).
+
+    Событие уйдёт в чат только вместе с изменением, которое его породило;
+    с user_id — только в личный канал этого пользователя.
+    """
+    result = await db.execute(
+        insert(OutboxEvent.__table__)
+        .values(
+            chat_id=chat_id,
+            user_id=user_id,
+            event_type=event_type,
+            message_id=message_id,
+            data=event_data(data) if data is not None else None,
+            created_at=datetime.utcnow(),
+        )
+        .returning(OutboxEvent.id)
+    )
+    return result.scalar_one()
+
+
+async def add_events(db: AsyncSession, events: list[tuple[int, str, dict, int | None]]):
+    """
+    Добавляет пачку событий (chat_id, event_type, data, user_id) одним executemany, без COMMIT.
+
+    user_id — получатель события личного канала, None — все участники чата.
+    """
+    if not events:
+        return
+    now = datetime.utcnow()
+    await db.execute(insert(OutboxEvent.__table__), [
+        {
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "event_type": event_type,
+            "message_id": None,
+            "data": event_data(data),
+            "created_at": now,
+        }
+        for chat_id, event_type, data, user_id in events
+    ])
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from crud.chat_service import get_user_chats, message_is_read, serialize_message
+from models.chat import Chat
+from models.messages import Message
+from models.outbox import OutboxEvent
+
+
+async def get_changes(db: AsyncSession, user_id: int, cursor: int = None, limit: int = None) -> dict:
+    """
+    Изменения по чатам пользователя после курсора — для догонки после переподключения.
+
+    Курсор — id события outbox (тот же event_id, что приходит в WebSocket).
+    События выбираются по индексу (chat_id, id), поэтому стоимость запроса
+    пропорциональна числу изменений, а не размеру истории. Курсор не
+    продвигается за события последних SYNC_CURSOR_LAG секунд: id выдаются
+    до COMMIT, и более ранний id может появиться позже более позднего.
+    Такие события вернутся повторно — клиент отбрасывает их по id.
+    """
+    limit = min(limit or settings.SYNC_PAGE_SIZE, settings.SYNC_MAX_PAGE_SIZE)
+
+    head, known = (await db.execute(select(
+        select(func.max(OutboxEvent.id)).scalar_subquery(),
+        exists().where(OutboxEvent.id == cursor),
+    ))).one()
+    head = head or 0
+    if cursor is None or not (known or cursor == head):
+        # Нет курсора или его событие уже удалено — точной дельты не построить
+        return {"cursor": head, "reset": True}
+
+    my_chats = select(Chat.id).where(or_(Chat.buyer_id == user_id, Chat.seller_id == user_id))
+    # События чатов пользователя и его личного канала, но не чужого личного канала
+    channels = or_(
+        and_(OutboxEvent.chat_id.in_(my_chats), OutboxEvent.user_id.is_(None)),
+        OutboxEvent.user_id == user_id,
+    )
+    events = (await db.execute(
+        select(OutboxEvent)
+        .where(channels, OutboxEvent.id > cursor)
+        .order_by(OutboxEvent.id)
+        .limit(limit + 1)
+    )).scalars().all()
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    settled = datetime.utcnow() - timedelta(seconds=settings.SYNC_CURSOR_LAG)
+    next_cursor = cursor
+    for event in events:
+        if event.created_at > settled:
+            # Дальше курсор не идёт и на полной странице: пропущенный id
+            # ещё не закоммиченной транзакции остался бы позади навсегда
+            has_more = False
+            break
+        next_cursor = event.id
+
+    message_ids = {e.message_id for e in events if e.event_type == "message" and e.message_id}
+    # Обновлённые сообщения (готовое превью) приходят целиком, клиент заменяет их по id
+    message_ids |= {json.loads(e.data)["id"] for e in events if e.event_type == "message_update" and e.data}
+    messages = []
+    if message_ids:
+        messages = (await db.execute(
+            select(Message, message_is_read()).where(Message.id.in_(message_ids)).order_by(Message.id)
+        )).all()
+
+    reads = [json.loads(e.data) for e in events if e.event_type == "read" and e.data]
+    chat_ids = sorted({e.chat_id for e in events})
+    chats = await get_user_chats(db=db, user_id=user_id, chat_ids=chat_ids) if chat_ids else []
+
+    return {
+        "cursor": next_cursor,
+        "has_more": has_more,
+        "messages": [serialize_message(m, is_read) for m, is_read in messages],
+        "reads": reads,
+        "chats": chats,
+    }
@@ -1,16 +1,90 @@
+import asyncio
+from pathlib import Path
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from api.v1.chat import router as chat_router
 from api.v1.support import router as support_router
-from api.v1.websocket import router as ws_router
+from api.v1.websocket import router as ws_router, get_manager
+from api.v1.metrics import router as metrics_router
+from core.config import settings
+from core.database import AsyncSessionLocal, dispose_engines, engine, read_engine
+from core.metrics import MetricsMiddleware, instrument_engine, metrics_enabled
+from core.http import http_clients
+from core.redis import close_async_redis
+from core.storage import get_storage, LocalStorage
+from core.uploads import BodySizeLimitMiddleware
+from services.unread import reconcile_periodically
+from services.prompts import listen_prompt_invalidations
+from services.membership import listen_membership_invalidations
+from services.thumbnails import get_thumbnail_worker
+from services.outbox import get_outbox_relay
+from services.receipts import get_read_receipts
 import core.logger
 import logging
 
 
-app = FastAPI(title="Messenger service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновых компонентов приложения."""
+    manager = get_manager()
+    await manager.start()
+    storage = get_storage()
+    await storage.start()
+    outbox = get_outbox_relay()
+    await outbox.start(publish=manager.broadcast)
+    thumbnails = get_thumbnail_worker()
+    await thumbnails.start(wake=outbox.wake)
+    receipts = get_read_receipts()
+    await receipts.start(on_flush=outbox.wake)
+    reconcile_task = None
+    if settings.UNREAD_COUNTERS_ENABLED:
+        # Счётчики собираются из БД при старте и сверяются периодически
+        reconcile_task = asyncio.create_task(
+            reconcile_periodically(AsyncSessionLocal, settings.UNREAD_RECONCILE_INTERVAL)
+        )
+    prompt_listener = None
+    if settings.PROMPT_CACHE_TTL > 0:
+        prompt_listener = asyncio.create_task(listen_prompt_invalidations())
+    membership_listener = None
+    if settings.MEMBERSHIP_REDIS_ENABLED and settings.MEMBERSHIP_CACHE_SIZE > 0:
+        membership_listener = asyncio.create_task(listen_membership_invalidations())
+    yield
+    if membership_listener:
+        membership_listener.cancel()
+    if prompt_listener:
+        prompt_listener.cancel()
+    if reconcile_task:
+        reconcile_task.cancel()
+    # Сначала источники событий: их последние события ещё уйдут через relay
+    await thumbnails.stop()
+    await receipts.stop()
+    await outbox.stop()
+    await manager.stop()
+    await storage.stop()
+    await http_clients.aclose()
+    await close_async_redis()
+    await dispose_engines()
+
+
+app = FastAPI(title="Messenger service", lifespan=lifespan)
+app.add_middleware(BodySizeLimitMiddleware)
+
+if metrics_enabled():
+    # Снаружи BodySizeLimitMiddleware: в гистограмму попадают и ответы 413
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(read_engine)
 
 app.include_router(chat_router)
 app.include_router(support_router)
 app.include_router(ws_router)
+app.include_router(metrics_router)
+
+if isinstance(get_storage(), LocalStorage):
+    # Локальное хранилище раздаётся самим приложением
+    from fastapi.staticfiles import StaticFiles
+    Path(settings.LOCAL_STORAGE_PATH).mkdir(parents=True, exist_ok=True)
+    app.mount(settings.LOCAL_STORAGE_URL, StaticFiles(directory=settings.LOCAL_STORAGE_PATH), name="files")
 
 logger = logging.getLogger(__name__)
 logger.info("FastAPI app initialized")
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+
+from core.database import Base
+
+
+class Attachment(Base):
+    """
+    Файл в хранилище, общий для всех сообщений с одинаковым содержимым.
+
+    Ключ дедупликации — SHA-256 содержимого; refcount — число сообщений,
+    ссылающихся на файл. Объект удаляется из хранилища, когда refcount
+    доходит до нуля. Для прямых загрузок (presigned) хэш неизвестен — NULL,
+    ключом служит storage_key.
+    """
+    __tablename__ = 'attachments'
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    storage_key = Column(String(500), unique=True, nullable=False)
+    url = Column(String(500), nullable=False)
+    refcount = Column(Integer, nullable=False, default=1)
+    thumbnail_key = Column(String(500), nullable=True)
+    thumbnail_url = Column(String(500), nullable=True)
+    blurhash = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
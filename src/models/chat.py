@@ -1,15 +1,16 @@
 from datetime import datetime
 
-from sqlalchemy import Column, BigInteger, DateTime, ForeignKey, String, Index
+from sqlalchemy import Column, BigInteger, DateTime, ForeignKey, Integer, String, Index
 from sqlalchemy.orm import relationship
 
 from core.database import Base
+from models.chat_participant import ChatParticipant  # noqa: F401  (таблица для relationship)
 
 
 class Chat(Base):
     __tablename__ = 'chats'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     announcement_id = Column(BigInteger, ForeignKey('announcements.id'), nullable=False)
     seller_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
     buyer_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
@@ -23,7 +24,11 @@ class Chat(Base):
     seller = relationship("User", foreign_keys=[seller_id])
     buyer = relationship("User", foreign_keys=[buyer_id], back_populates="buyer_chats")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
+    participants = relationship("ChatParticipant", cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         Index('ix_unique_chat', 'announcement_id', 'buyer_id', unique=True),
+        # Чаты пользователя (/ws, /chat/my): buyer_id = ? OR seller_id = ?
+        Index('ix_chats_buyer_id', 'buyer_id'),
+        Index('ix_chats_seller_id', 'seller_id'),
     )
\ No newline at end of file
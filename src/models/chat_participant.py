@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Index
+
+from core.database import Base
+
+
+class ChatParticipant(Base):
+    """
+    Участник чата и его отметка о прочтении.
+
+    last_read_message_id — watermark: все сообщения чата с id не больше
+    него этот участник прочитал. is_read сообщения вычисляется при чтении
+    по watermark получателя, поэтому отметка чата прочитанным — обновление
+    одной строки, сколько бы сообщений ни накопилось.
+    """
+    __tablename__ = 'chat_participants'
+
+    chat_id = Column(BigInteger, ForeignKey('chats.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    last_read_message_id = Column(BigInteger, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_chat_participants_user_id', 'user_id'),
+    )
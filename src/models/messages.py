@@ -1,9 +1,10 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Column, ForeignKey, String, Text, Boolean, DateTime, Integer
+from sqlalchemy import BigInteger, Column, ForeignKey, String, Text, DateTime, Integer, Index
 from sqlalchemy.orm import relationship
 
 from core.database import Base
+from models.attachment import Attachment  # noqa: F401  (таблица для ForeignKey)
 
 
 class Message(Base):
@@ -15,8 +16,17 @@ class Message(Base):
     message_text = Column(Text, nullable=True)
     message_type = Column(String(20), default='text')        # text, image, video, document
     file_url = Column(String(500), nullable=True)            # S3 url
-    is_read = Column(Boolean, default=False)
+    attachment_id = Column(BigInteger, ForeignKey('attachments.id'), nullable=True)
+    thumbnail_url = Column(String(500), nullable=True)       # WebP-превью image/video
+    blurhash = Column(String(100), nullable=True)            # заглушка до загрузки превью
     created_at = Column(DateTime, default=datetime.now)
 
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("User", back_populates="sent_messages")
+
+    __table_args__ = (
+        # Keyset-пагинация истории: WHERE chat_id = ? ORDER BY created_at, id
+        Index('ix_messages_chat_created_id', 'chat_id', 'created_at', 'id'),
+        # Непрочитанные — хвост чата за watermark участника: chat_id = ? AND id > ?
+        Index('ix_messages_chat_id_id', 'chat_id', 'id'),
+    )
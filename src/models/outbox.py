@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text
+
+from core.database import Base
+
+
+class OutboxEvent(Base):
+    """
+    Событие для рассылки в чат, записанное в одной транзакции с изменением.
+
+    Фоновый relay публикует неопубликованные события пачками и ставит
+    published_at. id — идентификатор события для дедупликации на клиенте:
+    при сбое между публикацией и отметкой событие уйдёт повторно с тем же id.
+    Для событий о новом сообщении хранится message_id, данные собираются
+    из messages при публикации; для остальных — JSON в data.
+    Событие с user_id уходит в личный канал этого пользователя, а не всем
+    участникам чата chat_id (превью, счётчики непрочитанных, новый чат).
+    """
+    __tablename__ = 'outbox_events'
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=True)
+    event_type = Column(String(50), nullable=False)
+    message_id = Column(BigInteger, nullable=True)
+    data = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    published_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Очередь relay: только неопубликованные строки
+        Index(
+            'ix_outbox_events_pending', 'id',
+            postgresql_where=published_at.is_(None), sqlite_where=published_at.is_(None)
+        ),
+        Index('ix_outbox_events_chat_id', 'chat_id', 'id'),
+        Index(
+            'ix_outbox_events_user_id', 'user_id', 'id',
+            postgresql_where=user_id.is_not(None), sqlite_where=user_id.is_not(None)
+        ),
+    )
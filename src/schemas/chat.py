@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 
 
@@ -18,10 +18,13 @@ class PartnerInfo(BaseModel):
 class MessageItem(BaseModel):
     """Сообщение в чате."""
     id: int
+    chat_id: Optional[int] = None
     sender_id: int
     message_text: Optional[str] = None
     message_type: str = "text"
     file_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    blurhash: Optional[str] = None
     is_read: bool = False
     created_at: Optional[datetime] = None
     
@@ -32,7 +35,8 @@ class MessageItem(BaseModel):
 class ChatListItem(BaseModel):
     """Элемент списка чатов."""
     id: int
-    partner: PartnerInfo
+    partner: Optional[PartnerInfo] = None
+    announcement_id: Optional[int] = None
     announcement_title: Optional[str] = None
     last_message_text: Optional[str] = None
     last_message_type: str = "text"
@@ -43,6 +47,43 @@ class ChatListItem(BaseModel):
         from_attributes = True
 
 
+class UnreadCounters(BaseModel):
+    """Счётчики непрочитанных пользователя."""
+    total: int = 0
+    chats: Dict[int, int] = Field(default_factory=dict, description="chat_id -> число непрочитанных")
+
+
+class MessagePage(BaseModel):
+    """Страница истории сообщений (keyset-пагинация)."""
+    messages: List[MessageItem] = []
+    has_more: bool = False
+    next_cursor: Optional[int] = Field(None, description="id для следующего запроса before_id/after_id")
+
+
+class ReadReceipt(BaseModel):
+    """Партнёр прочитал входящие сообщения чата до up_to_id включительно."""
+    chat_id: int
+    reader_id: int
+    up_to_id: int
+
+
+class SyncResponse(BaseModel):
+    """
+    Изменения по всем чатам пользователя после курсора.
+
+    cursor передаётся в следующий запрос; при has_more — сразу, иначе
+    после переподключения. reset=true — курсор устарел (события старше
+    OUTBOX_RETENTION удалены), состояние нужно загрузить заново через
+    /chat/my и историю чатов, дальше синхронизироваться с нового cursor.
+    """
+    cursor: int
+    has_more: bool = False
+    reset: bool = False
+    messages: List[MessageItem] = []
+    reads: List[ReadReceipt] = []
+    chats: List[ChatListItem] = Field(default_factory=list, description="Превью изменившихся чатов")
+
+
 class ChatDetail(BaseModel):
     """Детальная информация о чате с историей сообщений."""
     id: int
@@ -50,11 +91,58 @@ class ChatDetail(BaseModel):
     announcement_id: int
     announcement_title: Optional[str] = None
     messages: List[MessageItem] = []
+    has_more: bool = False
+    next_cursor: Optional[int] = None
     
     class Config:
         from_attributes = True
 
 
+class DirectUploadRequest(BaseModel):
+    """Запрос подписанного URL для загрузки файла напрямую в хранилище."""
+    filename: str = Field(max_length=255)
+    content_type: str = Field(max_length=100)
+    size: int = Field(gt=0, description="Размер файла в байтах")
+
+
+class UploadPartUrl(BaseModel):
+    """Подписанный URL части multipart-загрузки."""
+    part_number: int
+    url: str
+
+
+class DirectUploadTicket(BaseModel):
+    """
+    Куда и как загружать файл.
+
+    Без upload_id — один PUT на url с заголовками headers; иначе файл
+    режется на части по part_size и каждая уходит PUT на свой URL.
+    """
+    key: str
+    method: str = "PUT"
+    url: Optional[str] = None
+    headers: Dict[str, str] = Field(default_factory=dict)
+    upload_id: Optional[str] = None
+    part_size: Optional[int] = None
+    parts: List[UploadPartUrl] = []
+    expires_in: int
+
+
+class UploadedPart(BaseModel):
+    """Загруженная часть: номер и ETag из ответа хранилища."""
+    part_number: int = Field(ge=1)
+    etag: str
+
+
+class CompleteUploadRequest(BaseModel):
+    """Завершение прямой загрузки и отправка сообщения с файлом."""
+    key: str
+    content_type: str = Field(max_length=100, description="Тип из запроса подписанного URL")
+    text: Optional[str] = None
+    upload_id: Optional[str] = None
+    parts: List[UploadedPart] = []
+
+
 class SendMessageRequest(BaseModel):
     """Запрос на отправку сообщения."""
     text: Optional[str] = None
@@ -1,24 +1,31 @@
+import json
 import logging
+from typing import AsyncIterator
+
 import httpx
 from core.config import settings
+from core.http import get_http_client
 from services.prompts import read_prompt
 from models.support import SupportChat, SenderType
 
 logger = logging.getLogger("services.grok")
 
-async def call_grok_model(
-    message: str,
-    user_id: str | None = None,
-    history: list[SupportChat] | None = None
-) -> dict:
-    """Отправляет запрос к Grok API и возвращает ответ."""
+MODEL = "grok-4-fast-reasoning"
 
+
+async def _build_request(
+    message: str,
+    user_id: str | None,
+    history: list[SupportChat] | None,
+    stream: bool,
+) -> tuple[dict, dict]:
+    """Собирает payload и заголовки запроса к Grok API."""
     if not settings.GROK_API_URL:
         logger.error("Не задан GROK_API_URL в настройках")
         raise RuntimeError("GROK_API_URL is not set")
 
     try:
-        system_prompt = read_prompt().strip()
+        system_prompt = (await read_prompt()).strip()
     except Exception as e:
         logger.exception(f"Ошибка при чтении системного prompt: {e}")
         raise RuntimeError(f"Ошибка при чтении системного prompt: {e}")
@@ -31,22 +38,76 @@ async def call_grok_model(
         logger.debug(f"Добавлено {len(history)} сообщений из истории для user_id={user_id}")
     messages_payload.append({"role": "user", "content": message})
 
-    payload = {"model": "grok-4-fast-reasoning", "stream": False, "messages": messages_payload}
+    payload = {"model": MODEL, "stream": stream, "messages": messages_payload}
     headers = {"Content-Type": "application/json"}
     if settings.GROK_API_KEY:
         headers["Authorization"] = f"Bearer {settings.GROK_API_KEY}"
+    return payload, headers
+
+
+async def call_grok_model(
+    message: str,
+    user_id: str | None = None,
+    history: list[SupportChat] | None = None
+) -> dict:
+    """Отправляет запрос к Grok API и возвращает ответ."""
+    payload, headers = await _build_request(message, user_id, history, stream=False)
+
+    logger.info(f"Отправка запроса к модели Grok для user_id={user_id} с {len(payload['messages'])} сообщениями")
+    client = get_http_client("grok")
+    try:
+        resp = await client.post(settings.GROK_API_URL, json=payload, headers=headers)
+        resp.raise_for_status()
+        result = resp.json()
+        logger.debug(f"Ответ от Grok для user_id={user_id}: {result}")
+        return result
+    except httpx.HTTPStatusError as e:
+        logger.exception(f"HTTP ошибка при вызове Grok для user_id={user_id}: {e}")
+        raise
+    except httpx.RequestError as e:
+        logger.exception(f"Ошибка запроса к Grok для user_id={user_id}: {e}")
+        raise
+
 
-    logger.info(f"Отправка запроса к модели Grok для user_id={user_id} с {len(messages_payload)} сообщениями")
-    async with httpx.AsyncClient(timeout=30) as client:
+async def stream_grok_model(
+    message: str,
+    user_id: str | None = None,
+    history: list[SupportChat] | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[str]:
+    """
+    Потоковый запрос к Grok API: отдаёт фрагменты ответа по мере генерации.
+
+    Если генератор закрыт раньше времени (клиент отключился), соединение
+    с Grok закрывается и генерация на стороне API прерывается.
+    """
+    payload, headers = await _build_request(message, user_id, history, stream=True)
+
+    logger.info(f"Потоковый запрос к модели Grok для user_id={user_id} с {len(payload['messages'])} сообщениями")
+    client = client or get_http_client("grok")
+    # Между токенами reasoning-модель может долго молчать
+    timeout = httpx.Timeout(settings.GROK_HTTP_TIMEOUT, read=settings.GROK_STREAM_READ_TIMEOUT)
+    async with client.stream(
+        "POST", settings.GROK_API_URL, json=payload, headers=headers, timeout=timeout
+    ) as resp:
         try:
-            resp = await client.post(settings.GROK_API_URL, json=payload, headers=headers)
             resp.raise_for_status()
-            result = await resp.json()
-            logger.debug(f"Ответ от Grok для user_id={user_id}: {result}")
-            return result
         except httpx.HTTPStatusError as e:
             logger.exception(f"HTTP ошибка при вызове Grok для user_id={user_id}: {e}")
             raise
-        except httpx.RequestError as e:
-            logger.exception(f"Ошибка запроса к Grok для user_id={user_id}: {e}")
-            raise
+
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                logger.warning(f"Некорректный фрагмент потока Grok: {data[:200]}")
+                continue
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
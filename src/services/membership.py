@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.redis import get_async_redis
+from models.chat import Chat
+
+logger = logging.getLogger(__name__)
+
+# Строка chat_members:{chat_id} = "buyer_id:seller_id"
+KEY_PREFIX = "chat_members:"
+INVALIDATE_CHANNEL = "chat_members:invalidate"
+
+
+class ChatMembers(NamedTuple):
+    buyer_id: int
+    seller_id: int
+
+    def includes(self, user_id: int) -> bool:
+        return user_id == self.buyer_id or user_id == self.seller_id
+
+
+def _key(chat_id: int) -> str:
+    return f"{KEY_PREFIX}{chat_id}"
+
+
+class MembershipCache:
+    """
+    LRU участников чатов в памяти процесса: chat_id -> (buyer_id, seller_id).
+
+    Участники чата не меняются, поэтому записи живут MEMBERSHIP_CACHE_TTL.
+    Отсутствующий чат тоже запоминается, но на MEMBERSHIP_NEGATIVE_TTL и
+    сбрасывается при создании чата (invalidate_chat на всех воркерах).
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = settings.MEMBERSHIP_CACHE_SIZE if max_size is None else max_size
+        self._entries: OrderedDict[int, tuple[ChatMembers | None, float]] = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int) -> tuple[bool, ChatMembers | None]:
+        """(найдено, участники); участники None — чата нет."""
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return False, None
+        members, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[chat_id]
+            return False, None
+        self._entries.move_to_end(chat_id)
+        return True, members
+
+    def set(self, chat_id: int, members: ChatMembers | None):
+        if self.max_size <= 0:
+            return
+        ttl = settings.MEMBERSHIP_CACHE_TTL if members is not None else settings.MEMBERSHIP_NEGATIVE_TTL
+        if ttl <= 0:
+            return
+        self._entries[chat_id] = (members, time.monotonic() + ttl)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: int = None):
+        """Сбрасывает запись чата; без chat_id — весь кэш."""
+        if chat_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "redis_hits": self.redis_hits, "misses": self.misses}
+
+
+membership_cache = MembershipCache()
+
+
+async def _from_redis(chat_id: int) -> ChatMembers | None:
+    try:
+        raw = await get_async_redis().get(_key(chat_id))
+    except RedisError as e:
+        logger.warning(f"Кэш участников чата {chat_id} недоступен: {e}")
+        return None
+    if not raw:
+        return None
+    buyer_id, seller_id = raw.split(":")
+    return ChatMembers(int(buyer_id), int(seller_id))
+
+
+async def _to_redis(chat_id: int, members: ChatMembers):
+    try:
+        await get_async_redis().set(
+            _key(chat_id), f"{members.buyer_id}:{members.seller_id}", ex=int(settings.MEMBERSHIP_CACHE_TTL)
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось сохранить участников чата {chat_id}: {e}")
+
+
+async def get_chat_members(chat_id: int, db: AsyncSession) -> ChatMembers | None:
+    """
+    Участники чата: память процесса, затем Redis, затем один запрос по PK.
+
+    None — чата нет. Сессия используется только при промахе обоих кэшей.
+    """
+    found, members = membership_cache.get(chat_id)
+    if found:
+        membership_cache.hits += 1
+        return members
+
+    use_redis = settings.MEMBERSHIP_REDIS_ENABLED and settings.MEMBERSHIP_CACHE_TTL > 0
+    if use_redis:
+        members = await _from_redis(chat_id)
+        if members is not None:
+            membership_cache.redis_hits += 1
+            membership_cache.set(chat_id, members)
+            return members
+
+    membership_cache.misses += 1
+    row = (await db.execute(
+        select(Chat.buyer_id, Chat.seller_id).where(Chat.id == chat_id)
+    )).one_or_none()
+    members = ChatMembers(*row) if row is not None else None
+    membership_cache.set(chat_id, members)
+    if members is not None and use_redis:
+        await _to_redis(chat_id, members)
+    return members
+
+
+async def is_member(chat_id: int, user_id: int, db: AsyncSession) -> bool:
+    """Участник ли пользователь чата; обычно без обращения к БД."""
+    members = await get_chat_members(chat_id, db)
+    return members is not None and members.includes(user_id)
+
+
+async def invalidate_chat(chat_id: int):
+    """Сбрасывает участников чата во всех воркерах (создание и удаление чата)."""
+    membership_cache.invalidate(chat_id)
+    if not settings.MEMBERSHIP_REDIS_ENABLED:
+        return
+    try:
+        redis = get_async_redis()
+        await redis.delete(_key(chat_id))
+        await redis.publish(INVALIDATE_CHANNEL, chat_id)
+    except RedisError as e:
+        logger.warning(f"Не удалось разослать сброс участников чата {chat_id}: {e}")
+
+
+async def listen_membership_invalidations():
+    """Фоновая задача: сбрасывает записи локального кэша по сообщениям других воркеров."""
+    while True:
+        pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+            # Пока не были подписаны, могли пропустить сброс
+            membership_cache.invalidate()
+            while True:
+                event = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if event and event.get("type") == "message":
+                    try:
+                        membership_cache.invalidate(int(event["data"]))
+                    except (TypeError, ValueError):
+                        membership_cache.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Подписка на сброс кэша участников прервана: {e}")
+            await asyncio.sleep(5)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
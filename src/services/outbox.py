@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from crud.chat_service import serialize_message, user_channel
+from models.messages import Message
+from models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+Publish = Callable[[int, dict], Awaitable[None]]
+
+CLEANUP_INTERVAL = 600
+
+
+def event_channel(event: OutboxEvent) -> int:
+    """Канал рассылки события: личный канал получателя или канал чата."""
+    return user_channel(event.user_id) if event.user_id is not None else event.chat_id
+
+
+def event_frame(event: OutboxEvent, message: Message | None) -> dict:
+    """Кадр WebSocket для события; event_id — ключ дедупликации на клиенте."""
+    if event.data is not None:
+        data = json.loads(event.data)
+    elif message is not None:
+        data = serialize_message(message)
+    else:
+        data = {"id": event.message_id, "chat_id": event.chat_id}
+    return {"type": event.event_type, "event_id": event.id, "data": data}
+
+
+class OutboxRelay:
+    """
+    Публикует события из outbox_events в слой рассылки пачками.
+
+    send_message пишет событие в той же транзакции, что и сообщение, а
+    обработчик лишь будит relay — задержка ответа не зависит от рассылки.
+    Без пробуждения (другой воркер, рестарт) события подбираются опросом.
+    Строки блокируются FOR UPDATE SKIP LOCKED, так что relay на нескольких
+    воркерах не публикуют одно событие дважды; published_at ставится после
+    публикации, поэтому при падении между ними событие уйдёт повторно —
+    доставка at-least-once, клиенты отбрасывают дубли по event_id.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = None, publish: Publish = None,
+                 batch_size: int = None, poll_interval: float = None):
+        self.session_factory = session_factory
+        self.publish = publish
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._cleaned_at = 0.0
+        self.published = 0
+        self.batches = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, publish: Publish = None):
+        if publish is not None:
+            self.publish = publish
+        if self.session_factory is None:
+            from core.database import AsyncSessionLocal
+            self.session_factory = AsyncSessionLocal
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Outbox relay: пачка {self.batch_size}, опрос раз в {self.poll_interval} с")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def wake(self):
+        """Сообщает relay о новых событиях; вызывается после COMMIT."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                count = await self.publish_pending()
+                await self._cleanup_if_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                count = 0
+                logger.exception("Outbox relay: ошибка публикации")
+            if count >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def publish_pending(self) -> int:
+        """Публикует одну пачку неопубликованных событий; возвращает их число."""
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(OutboxEvent, Message)
+                .outerjoin(Message, Message.id == OutboxEvent.message_id)
+                .where(OutboxEvent.published_at.is_(None))
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(of=OutboxEvent, skip_locked=True)
+            )).all()
+            if not rows:
+                return 0
+
+            published = []
+            try:
+                for event, message in rows:
+                    await self.publish(event_channel(event), event_frame(event, message))
+                    published.append(event.id)
+            finally:
+                # Опубликованное до сбоя помечаем, остальное уйдёт следующей пачкой
+                if published:
+                    await db.execute(
+                        update(OutboxEvent)
+                        .where(OutboxEvent.id.in_(published))
+                        .values(published_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+
+        self.published += len(published)
+        self.batches += 1
+        return len(published)
+
+    async def _cleanup_if_due(self):
+        if time.monotonic() - self._cleaned_at < CLEANUP_INTERVAL:
+            return
+        self._cleaned_at = time.monotonic()
+        await self.cleanup()
+
+    async def cleanup(self) -> int:
+        """Удаляет опубликованные события старше OUTBOX_RETENTION."""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.OUTBOX_RETENTION)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                delete(OutboxEvent)
+                .where(OutboxEvent.published_at.is_not(None), OutboxEvent.published_at < cutoff)
+            )
+            await db.commit()
+        return result.rowcount
+
+    def stats(self) -> dict:
+        return {"published": self.published, "batches": self.batches, "failed": self.failed}
+
+
+outbox_relay = OutboxRelay()
+
+
+def get_outbox_relay() -> OutboxRelay:
+    """Возвращает relay outbox приложения."""
+    return outbox_relay
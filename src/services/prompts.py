@@ -1,6 +1,9 @@
+import asyncio
+import logging
+import time
 from pathlib import Path
 from core.config import settings
-from core.redis import get_redis
+from core.redis import get_async_redis
 
 try:
     from docx import Document
@@ -8,6 +11,12 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+PROMPT_KEY = "support_prompt"
+PROMPT_VERSION_KEY = "support_prompt:version"
+PROMPT_INVALIDATE_CHANNEL = "support_prompt:invalidate"
+
 
 def _read_docx(path: Path) -> str:
     """Читает текст из .docx файла."""
@@ -27,54 +36,155 @@ def _write_docx(path: Path, content: str):
     doc.save(path)
 
 
-def read_prompt() -> str:
-    """Читает системный промпт из кэша Redis или файла."""
-    redis = get_redis()
-    cached = redis.get("support_prompt")
-    if cached:
-        return cached
-
-    path = Path(settings.SUPPORT_PROMPT_PATH)
-
+def _load_prompt_file(path: Path) -> str:
+    """Читает файл промпта, создавая пустой при отсутствии."""
     if not path.exists():
         path.write_text("", encoding="utf-8")
-        redis.set("support_prompt", "")
         return ""
+    if path.suffix.lower() == ".docx":
+        return _read_docx(path)
+    return path.read_text(encoding="utf-8")
 
+
+def _save_prompt_file(path: Path, content: str):
+    """Записывает промпт в .docx или текстовый файл."""
     if path.suffix.lower() == ".docx":
-        content = _read_docx(path)
+        _write_docx(path, content)
     else:
-        content = path.read_text(encoding="utf-8")
+        path.write_text(content, encoding="utf-8")
+
+
+def _read_upload(file_path: Path) -> str:
+    if file_path.suffix.lower() in (".txt", ".md"):
+        return file_path.read_text(encoding="utf-8")
+    elif file_path.suffix.lower() == ".docx":
+        return _read_docx(file_path)
+    raise ValueError("Поддерживаются только .txt, .md, .docx")
+
+
+class PromptCache:
+    """
+    Копия промпта в памяти процесса поверх кэша Redis.
+
+    Запись живёт PROMPT_CACHE_TTL секунд; при изменении промпта любой
+    воркер публикует новую версию в PROMPT_INVALIDATE_CHANNEL, и
+    остальные сбрасывают копию сразу, не дожидаясь TTL. Версия не новее
+    уже учтённой (повтор, опоздавшее сообщение, эхо своей записи) копию
+    не сбрасывает.
+    """
+
+    def __init__(self):
+        self.content: str | None = None
+        self.version = 0
+        self.expires_at = 0.0
+        self.generation = 0
+        self.lock = asyncio.Lock()
+
+    def get(self) -> str | None:
+        if self.content is not None and time.monotonic() < self.expires_at:
+            return self.content
+        return None
+
+    def set(self, content: str, generation: int):
+        """Сохраняет значение, если за время загрузки не было инвалидации."""
+        if generation == self.generation and settings.PROMPT_CACHE_TTL > 0:
+            self.content = content
+            self.expires_at = time.monotonic() + settings.PROMPT_CACHE_TTL
+
+    def invalidate(self, version: int = None) -> bool:
+        """
+        Сбрасывает копию; version — номер изменения из Redis, если известен.
+
+        Без версии (переподписка на канал) сбрасывает безусловно и
+        забывает учтённую версию. Возвращает False, если версия уже учтена.
+        """
+        if version is None:
+            self.version = 0
+        elif version <= self.version:
+            return False
+        else:
+            self.version = version
+        self.generation += 1
+        self.content = None
+        return True
+
+
+prompt_cache = PromptCache()
+
+
+async def _load_prompt() -> str:
+    """Читает промпт из Redis, при промахе — из файла."""
+    redis = get_async_redis()
+    cached = await redis.get(PROMPT_KEY)
+    if cached:
+        return cached
 
-    redis.set("support_prompt", content)
+    # Файловый ввод-вывод и разбор .docx — в отдельном потоке
+    content = await asyncio.to_thread(_load_prompt_file, Path(settings.SUPPORT_PROMPT_PATH))
+    await redis.set(PROMPT_KEY, content)
     return content
 
 
-def write_prompt(content: str):
-    """Записывает промпт в файл и обновляет кэш Redis."""
-    path = Path(settings.SUPPORT_PROMPT_PATH)
+async def read_prompt() -> str:
+    """Читает системный промпт: память процесса, затем Redis, затем файл."""
+    content = prompt_cache.get()
+    if content is not None:
+        return content
 
-    if path.suffix.lower() == ".docx":
-        _write_docx(path, content)
-    else:
-        path.write_text(content, encoding="utf-8")
+    async with prompt_cache.lock:
+        content = prompt_cache.get()
+        if content is not None:
+            return content
+        generation = prompt_cache.generation
+        content = await _load_prompt()
+        prompt_cache.set(content, generation)
+        return content
 
-    redis = get_redis()
-    redis.set("support_prompt", content)
 
+async def write_prompt(content: str):
+    """Записывает промпт в файл, обновляет кэш Redis и оповещает воркеры."""
+    path = Path(settings.SUPPORT_PROMPT_PATH)
+    await asyncio.to_thread(_save_prompt_file, path, content)
 
-def upload_prompt(file_path: Path):
+    redis = get_async_redis()
+    await redis.set(PROMPT_KEY, content)
+    version = await redis.incr(PROMPT_VERSION_KEY)
+    await redis.publish(PROMPT_INVALIDATE_CHANNEL, version)
+    prompt_cache.invalidate(version)
+
+
+async def upload_prompt(file_path: Path):
     """Загружает промпт из файла и сохраняет его."""
     if not file_path.exists():
         raise FileNotFoundError(f"{file_path} не найден")
 
-    if file_path.suffix.lower() in (".txt", ".md"):
-        content = file_path.read_text(encoding="utf-8")
-    elif file_path.suffix.lower() == ".docx":
-        content = _read_docx(file_path)
-    else:
-        raise ValueError("Поддерживаются только .txt, .md, .docx")
-
-    write_prompt(content)
+    content = await asyncio.to_thread(_read_upload, file_path)
+    await write_prompt(content)
     return content
 
+
+async def listen_prompt_invalidations():
+    """Фоновая задача: сбрасывает локальную копию по сообщениям других воркеров."""
+    while True:
+        pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(PROMPT_INVALIDATE_CHANNEL)
+            # Пока не были подписаны, могли пропустить обновление
+            prompt_cache.invalidate()
+            while True:
+                event = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if event and event.get("type") == "message":
+                    try:
+                        prompt_cache.invalidate(int(event["data"]))
+                    except (TypeError, ValueError):
+                        prompt_cache.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Подписка на обновления промпта прервана: {e}")
+            await asyncio.sleep(5)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from crud import chat_service
+from services import unread as unread_counters
+
+logger = logging.getLogger(__name__)
+
+
+class ReadReceiptBuffer:
+    """
+    Отметки о прочтении, собранные в памяти и записанные пачкой.
+
+    Фреймы read из WebSocket и открытие чата только поднимают
+    watermark (chat_id, user_id) -> up_to_id в словаре; раз в
+    READ_RECEIPT_FLUSH_INTERVAL все накопленные пары уходят одной
+    транзакцией (mark_read), затем relay outbox рассылает события read.
+    Сто фреймов одного читателя за интервал — одна запись.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = None, flush_interval: float = None,
+                 on_flush=None):
+        self.session_factory = session_factory
+        self.flush_interval = settings.READ_RECEIPT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.on_flush = on_flush
+        self._pending: dict[tuple[int, int], int] = {}
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.received = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, on_flush=None):
+        if on_flush is not None:
+            self.on_flush = on_flush
+        if self.flush_interval <= 0:
+            return
+        if self.session_factory is None:
+            from core.database import AsyncSessionLocal
+            self.session_factory = AsyncSessionLocal
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Накопленное не теряем
+        await self.flush()
+
+    def mark(self, chat_id: int, user_id: int, up_to_id: int) -> bool:
+        """Поднимает watermark читателя. False — буфер не запущен, писать нужно сразу."""
+        if not self.running:
+            return False
+        key = (chat_id, user_id)
+        if up_to_id > self._pending.get(key, 0):
+            self._pending[key] = up_to_id
+        self.received += 1
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception("Не удалось записать отметки о прочтении")
+
+    async def flush(self) -> int:
+        """Записывает накопленные отметки; возвращает число пар с изменениями."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                async with self.session_factory() as db:
+                    read = await chat_service.mark_read(db, batch)
+                    await db.commit()
+            except Exception:
+                # Вернём пары в буфер, если новых отметок по ним не пришло
+                for key, up_to_id in batch.items():
+                    if up_to_id > self._pending.get(key, 0):
+                        self._pending[key] = up_to_id
+                raise
+
+        self.flushes += 1
+        self.written += len(read)
+        for receipt in read:
+            await unread_counters.decrement(receipt["reader_id"], receipt["chat_id"], receipt["count"])
+        if read and self.on_flush is not None:
+            self.on_flush()
+        return len(read)
+
+    def stats(self) -> dict:
+        return {"received": self.received, "written": self.written, "flushes": self.flushes,
+                "failed": self.failed, "pending": self.pending}
+
+
+read_receipts = ReadReceiptBuffer()
+
+
+def get_read_receipts() -> ReadReceiptBuffer:
+    """Возвращает буфер отметок о прочтении приложения."""
+    return read_receipts
@@ -0,0 +1,38 @@
+import logging
+from typing import AsyncIterator
+
+from core.database import AsyncSessionLocal
+from crud.support import get_or_create_room, get_last_messages, save_message
+from models.support import SenderType
+from services.grok import stream_grok_model
+
+logger = logging.getLogger("services.support")
+
+
+async def stream_support_reply(
+    user_id: int,
+    message: str,
+    session_factory=None,
+) -> AsyncIterator[str]:
+    """
+    Сохраняет вопрос пользователя и отдаёт ответ Grok по фрагментам.
+
+    Сессия БД открывается только на короткие операции и не держится,
+    пока модель генерирует ответ. Ответ сохраняется целиком после
+    завершения потока; при обрыве (отключение клиента) не сохраняется.
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    async with session_factory() as db:
+        room = await get_or_create_room(user_id, db)
+        await save_message(room_id=room.id, sender=SenderType.user, message=message, db=db)
+        history = await get_last_messages(room.id, db)
+
+    parts = []
+    async for delta in stream_grok_model(message=message, user_id=user_id, history=history):
+        parts.append(delta)
+        yield delta
+
+    reply = "".join(parts)
+    async with session_factory() as db:
+        await save_message(room_id=room.id, sender=SenderType.assistant, message=reply, db=db)
+    logger.info(f"Потоковый ответ сохранён для user_id={user_id}, room_id={room.id}, длина {len(reply)}")
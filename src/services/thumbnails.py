@@ -0,0 +1,293 @@
+import asyncio
+import io
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import BinaryIO, Callable, NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from core.storage import get_storage, make_key
+from crud.outbox import add_events
+from models.attachment import Attachment
+from models.messages import Message
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import blurhash
+    BLURHASH_AVAILABLE = True
+except ImportError:
+    BLURHASH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class Thumbnail(NamedTuple):
+    """Готовая миниатюра: WebP и blurhash-заглушка."""
+    data: bytes
+    blurhash: str | None
+
+
+def render_thumbnail(path: str, size: int, quality: int) -> Thumbnail:
+    """
+    Уменьшает изображение до size по большей стороне и кодирует в WebP.
+
+    Выполняется в пуле процессов: декодирование Pillow держит GIL.
+    """
+    with Image.open(path) as image:
+        # Декодируем сразу в уменьшенном виде (JPEG draft), учитываем EXIF-поворот
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=quality, method=4)
+
+        placeholder = None
+        if BLURHASH_AVAILABLE:
+            small = image.convert("RGB")
+            small.thumbnail((32, 32))
+            placeholder = blurhash.encode(small, x_components=4, y_components=3)
+        return Thumbnail(out.getvalue(), placeholder)
+
+
+def ffmpeg_path() -> str | None:
+    """Путь к ffmpeg или None, если его нет в системе."""
+    return shutil.which(settings.FFMPEG_PATH)
+
+
+async def extract_poster_frame(video_path: str, frame_path: str) -> bool:
+    """Сохраняет кадр видео (на 1-й секунде или первый) в frame_path через ffmpeg."""
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None:
+        return False
+    for offset in ("1", "0"):
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg, "-v", "error", "-y", "-ss", offset, "-i", video_path,
+            "-frames:v", "1", "-f", "image2", frame_path,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), settings.THUMBNAIL_FFMPEG_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False
+        if process.returncode == 0 and os.path.getsize(frame_path) > 0:
+            return True
+        logger.debug(f"ffmpeg -ss {offset}: {stderr.decode(errors='replace').strip()}")
+    return False
+
+
+class ThumbnailJob(NamedTuple):
+    attachment_id: int
+    message_type: str
+    path: str
+
+
+class ThumbnailWorker:
+    """
+    Фоновая генерация миниатюр для image/video сообщений.
+
+    Обработчик /send копирует файл во временный и ставит задачу в
+    ограниченную очередь; при переполнении задача отбрасывается — сообщение
+    просто остаётся без превью. Изображения декодируются в пуле процессов,
+    кадр видео достаёт ffmpeg. Готовая миниатюра кладётся в хранилище,
+    записывается во вложение и все его сообщения; в той же транзакции в
+    outbox пишется событие message_update — его рассылает relay, и оно
+    попадает в /chat/sync.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = None, executor: Executor = None,
+                 wake: Callable[[], None] = None, workers: int = None, queue_size: int = None):
+        self.session_factory = session_factory
+        self.wake = wake
+        self.workers = workers or settings.THUMBNAIL_WORKERS
+        self.queue_size = queue_size or settings.THUMBNAIL_QUEUE_SIZE
+        self._executor = executor
+        self._own_executor = executor is None
+        self._queue: asyncio.Queue[ThumbnailJob] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.THUMBNAILS_ENABLED and PIL_AVAILABLE
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def accepts(self, message_type: str) -> bool:
+        """Будет ли для сообщения такого типа построено превью."""
+        if not (self.enabled and self.running):
+            return False
+        return message_type == "image" or (message_type == "video" and ffmpeg_path() is not None)
+
+    async def start(self, wake: Callable[[], None] = None):
+        if wake is not None:
+            self.wake = wake
+        if not self.enabled:
+            if settings.THUMBNAILS_ENABLED:
+                logger.warning("Pillow не установлен, миниатюры не строятся")
+            return
+        if self.session_factory is None:
+            from core.database import AsyncSessionLocal
+            self.session_factory = AsyncSessionLocal
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Миниатюры: {self.workers} воркеров, ffmpeg={'есть' if ffmpeg_path() else 'нет'}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._discard(self._queue.get_nowait())
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def join(self):
+        """Ждёт обработки всех поставленных задач (тесты, бенчмарки)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def schedule(self, attachment_id: int, message_type: str, fileobj: BinaryIO) -> bool:
+        """Копирует файл во временный и ставит задачу; False — превью не будет."""
+        if not self.accepts(message_type):
+            return False
+        if self._queue.full():
+            self.dropped += 1
+            return False
+        path = await asyncio.to_thread(self._spill, fileobj)
+        try:
+            self._queue.put_nowait(ThumbnailJob(attachment_id, message_type, path))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            os.unlink(path)
+            return False
+        return True
+
+    @staticmethod
+    def _spill(fileobj: BinaryIO) -> str:
+        fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(prefix="thumb-src-", delete=False) as out:
+            shutil.copyfileobj(fileobj, out, length=1024 * 1024)
+        fileobj.seek(0)
+        return out.name
+
+    @staticmethod
+    def _discard(job: ThumbnailJob):
+        try:
+            os.unlink(job.path)
+        except FileNotFoundError:
+            pass
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Не удалось построить миниатюру вложения {job.attachment_id}")
+            finally:
+                self._discard(job)
+                self._queue.task_done()
+
+    async def _render(self, job: ThumbnailJob) -> Thumbnail | None:
+        loop = asyncio.get_running_loop()
+        source = job.path
+        frame = None
+        if job.message_type == "video":
+            frame = f"{job.path}.jpg"
+            if not await extract_poster_frame(job.path, frame):
+                return None
+            source = frame
+        try:
+            return await loop.run_in_executor(
+                self._executor, render_thumbnail, source, settings.THUMBNAIL_SIZE, settings.THUMBNAIL_QUALITY,
+            )
+        finally:
+            if frame and os.path.exists(frame):
+                os.unlink(frame)
+
+    async def _process(self, job: ThumbnailJob):
+        thumbnail = await self._render(job)
+        if thumbnail is None:
+            return
+
+        stored = await get_storage().upload(
+            thumbnail.data, f"{job.attachment_id}.webp", "image/webp",
+            key=make_key(f"{job.attachment_id}.webp", prefix="thumbnails/"),
+        )
+        async with self.session_factory() as db:
+            found = (await db.execute(
+                update(Attachment)
+                .where(Attachment.id == job.attachment_id, Attachment.thumbnail_key.is_(None))
+                .values(thumbnail_key=stored.key, thumbnail_url=stored.url, blurhash=thumbnail.blurhash)
+                .returning(Attachment.thumbnail_url, Attachment.blurhash)
+            )).one_or_none()
+            duplicate = found is None
+            if duplicate:
+                # Превью уже построено параллельно: им дозаполняем сообщения,
+                # успевшие взять вложение до его появления
+                found = (await db.execute(
+                    select(Attachment.thumbnail_url, Attachment.blurhash)
+                    .where(Attachment.id == job.attachment_id, Attachment.thumbnail_key.is_not(None))
+                )).one_or_none()
+            messages = []
+            if found is not None:
+                thumbnail_url, placeholder = found
+                messages = (await db.execute(
+                    update(Message)
+                    .where(Message.attachment_id == job.attachment_id, Message.thumbnail_url.is_(None))
+                    .values(thumbnail_url=thumbnail_url, blurhash=placeholder)
+                    .returning(Message.id, Message.chat_id)
+                    .execution_options(synchronize_session=False)
+                )).all()
+                await add_events(db, [
+                    (chat_id, "message_update", {
+                        "id": message_id,
+                        "chat_id": chat_id,
+                        "thumbnail_url": thumbnail_url,
+                        "blurhash": placeholder,
+                    }, None)
+                    for message_id, chat_id in messages
+                ])
+            await db.commit()
+
+        if duplicate:
+            # Вложение удалено или превью уже есть — своё лишнее
+            await get_storage().delete(stored.key)
+        if messages and self.wake is not None:
+            self.wake()
+
+
+thumbnail_worker = ThumbnailWorker()
+
+
+def get_thumbnail_worker() -> ThumbnailWorker:
+    """Возвращает фоновый генератор миниатюр приложения."""
+    return thumbnail_worker
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+
+from redis.exceptions import RedisError, WatchError
+from sqlalchemy import and_, func, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.redis import get_async_redis
+from models.chat import Chat
+from models.chat_participant import ChatParticipant
+from models.messages import Message
+
+logger = logging.getLogger(__name__)
+
+# Хэш unread:{user_id}: поле — chat_id, значение — число непрочитанных.
+# Общий счётчик — сумма значений, поэтому отдельный ключ не нужен.
+KEY_PREFIX = "unread:"
+# Сборка идёт во временные хэши и встаёт на место RENAME; пока она идёт
+# (флаг REBUILD_FLAG), изменения счётчиков копятся и во временных хэшах
+TMP_PREFIX = "unread_tmp:"
+REBUILD_FLAG = "unread_rebuild:active"
+REBUILD_LOCK = "unread_rebuild:leader"
+
+
+def _key(user_id: int) -> str:
+    return f"{KEY_PREFIX}{user_id}"
+
+
+def _tmp_key(user_id: int) -> str:
+    return f"{TMP_PREFIX}{user_id}"
+
+
+async def _add(redis, user_id: int, chat_id: int, amount: int) -> int:
+    """HINCRBY счётчика; во время сборки та же дельта идёт во временный хэш."""
+    if not await redis.exists(REBUILD_FLAG):
+        return await redis.hincrby(_key(user_id), chat_id, amount)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hincrby(_key(user_id), chat_id, amount)
+        pipe.hincrby(_tmp_key(user_id), chat_id, amount)
+        pipe.expire(_tmp_key(user_id), settings.UNREAD_REBUILD_LOCK_TTL)
+        value, *_ = await pipe.execute()
+    return value
+
+
+async def increment(user_id: int, chat_id: int, amount: int = 1):
+    """Увеличивает счётчик получателя. Ошибки Redis не прерывают отправку."""
+    if not settings.UNREAD_COUNTERS_ENABLED:
+        return
+    try:
+        await _add(get_async_redis(), user_id, chat_id, amount)
+    except RedisError as e:
+        logger.warning(f"Не удалось обновить счётчик непрочитанных user={user_id} chat={chat_id}: {e}")
+
+
+async def decrement(user_id: int, chat_id: int, amount: int):
+    """Уменьшает счётчик на число прочитанных; дошедший до нуля удаляется."""
+    if not settings.UNREAD_COUNTERS_ENABLED or amount <= 0:
+        return
+    try:
+        redis = get_async_redis()
+        if await _add(redis, user_id, chat_id, -amount) <= 0:
+            await redis.hdel(_key(user_id), chat_id)
+    except RedisError as e:
+        logger.warning(f"Не удалось обновить счётчик непрочитанных user={user_id} chat={chat_id}: {e}")
+
+
+async def get_counters(user_id: int) -> dict:
+    """Счётчики пользователя из кэша: {"total": N, "chats": {chat_id: n}}."""
+    raw = await get_async_redis().hgetall(_key(user_id))
+    chats = {int(chat_id): int(count) for chat_id, count in raw.items() if int(count) > 0}
+    return {"total": sum(chats.values()), "chats": chats}
+
+
+async def _count_unread(db: AsyncSession) -> dict[int, dict[int, int]]:
+    """Непрочитанные всех пользователей из БД: {user_id: {chat_id: n}}."""
+    # Участник и его входящие после watermark — диапазон по (chat_id, id)
+    members = union(
+        select(Chat.id.label("chat_id"), Chat.buyer_id.label("user_id")),
+        select(Chat.id, Chat.seller_id),
+    ).subquery()
+    result = await db.execute(
+        select(members.c.user_id, members.c.chat_id, func.count(Message.id))
+        .outerjoin(
+            ChatParticipant,
+            and_(ChatParticipant.chat_id == members.c.chat_id, ChatParticipant.user_id == members.c.user_id)
+        )
+        .join(
+            Message,
+            and_(
+                Message.chat_id == members.c.chat_id,
+                Message.id > func.coalesce(ChatParticipant.last_read_message_id, 0),
+                Message.sender_id != members.c.user_id,
+            )
+        )
+        .group_by(members.c.user_id, members.c.chat_id)
+    )
+    counters: dict[int, dict[int, int]] = {}
+    for user_id, chat_id, count in result.all():
+        if user_id is not None:
+            counters.setdefault(user_id, {})[chat_id] = count
+    return counters
+
+
+async def _user_ids(redis, prefix: str) -> set[int]:
+    return {int(key[len(prefix):]) async for key in redis.scan_iter(match=f"{prefix}*")}
+
+
+async def _swap_or_delete(redis, user_id: int):
+    """Без непрочитанных в БД: остаются только дельты времени сборки."""
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(_tmp_key(user_id), _key(user_id))
+                has_delta = await pipe.exists(_tmp_key(user_id))
+                pipe.multi()
+                if has_delta:
+                    pipe.rename(_tmp_key(user_id), _key(user_id))
+                else:
+                    pipe.delete(_key(user_id))
+                await pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+async def rebuild_unread_counters(db: AsyncSession) -> int:
+    """
+    Пересобирает все счётчики из БД одним агрегатом.
+
+    Исправляет расхождения после сбоев Redis и гонок отправки с прочтением.
+    Изменения, пришедшие во время агрегата, не теряются: они копятся во
+    временных хэшах, к ним прибавляется агрегат, и хэш встаёт на место
+    живого через RENAME — пачками по UNREAD_REBUILD_BATCH пользователей.
+    Возвращает число пользователей с непрочитанными.
+    """
+    redis = get_async_redis()
+    # Хвосты прошлой сборки — до флага, пока в них ничего не пишется
+    stale = [key async for key in redis.scan_iter(match=f"{TMP_PREFIX}*")]
+    for start in range(0, len(stale), settings.UNREAD_REBUILD_BATCH):
+        await redis.delete(*stale[start:start + settings.UNREAD_REBUILD_BATCH])
+    await redis.set(REBUILD_FLAG, 1, ex=settings.UNREAD_REBUILD_LOCK_TTL)
+    try:
+        counters = await _count_unread(db)
+        users = list(counters.items())
+        for start in range(0, len(users), settings.UNREAD_REBUILD_BATCH):
+            async with redis.pipeline(transaction=True) as pipe:
+                for user_id, chats in users[start:start + settings.UNREAD_REBUILD_BATCH]:
+                    for chat_id, count in chats.items():
+                        pipe.hincrby(_tmp_key(user_id), chat_id, count)
+                    pipe.rename(_tmp_key(user_id), _key(user_id))
+                await pipe.execute()
+
+        rest = (await _user_ids(redis, KEY_PREFIX) | await _user_ids(redis, TMP_PREFIX)) - counters.keys()
+        for user_id in rest:
+            await _swap_or_delete(redis, user_id)
+    finally:
+        await redis.delete(REBUILD_FLAG)
+
+    logger.info(f"Счётчики непрочитанных пересобраны: {len(counters)} пользователей")
+    return len(counters)
+
+
+async def reconcile_periodically(session_factory, interval: float):
+    """
+    Сверка счётчиков с БД: сразу при старте, затем раз в interval секунд.
+
+    Стартовая сборка заполняет Redis после первого деплоя или потери
+    данных; периодическая исправляет гонки отправки с прочтением.
+    interval <= 0 — только стартовая сборка. Собирает один воркер:
+    блокировка REBUILD_LOCK (SET NX EX) держится до следующей сверки.
+    """
+    lock_ttl = max(int(interval), settings.UNREAD_REBUILD_LOCK_TTL)
+    while True:
+        try:
+            if await get_async_redis().set(REBUILD_LOCK, 1, nx=True, ex=lock_ttl):
+                async with session_factory() as db:
+                    await rebuild_unread_counters(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка сверки счётчиков непрочитанных: {e}")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
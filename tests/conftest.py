@@ -6,7 +6,9 @@ from sqlalchemy.pool import StaticPool
 from httpx import AsyncClient, ASGITransport
 
 from main import app
-from core.database import Base, get_db
+from core.config import settings
+from core.database import Base, get_db, get_read_db
+from services.membership import membership_cache
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -33,6 +35,16 @@ async def override_get_db():
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+
+
+@pytest.fixture(autouse=True)
+def isolated_membership_cache(monkeypatch):
+    """БД пересоздаётся с теми же id чатов — кэш участников не должен переживать тест."""
+    monkeypatch.setattr(settings, "MEMBERSHIP_REDIS_ENABLED", False)
+    membership_cache.invalidate()
+    yield
+    membership_cache.invalidate()
 
 
 @pytest_asyncio.fixture(scope="function")
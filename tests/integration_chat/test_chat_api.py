@@ -23,7 +23,7 @@ from sqlalchemy import text
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
 
-from core.database import Base, get_db
+from core.database import Base, get_db, get_read_db
 from models.user import User
 from models.announcement import Announcement
 from models.chat import Chat
@@ -215,6 +215,7 @@ async def client(app, async_session_maker):
             yield session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -0,0 +1,143 @@
+import io
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import select
+
+from crud import attachments
+from crud.attachments import store_attachment, release_attachment, register_attachment
+from core.storage import StoredFile
+from models.attachment import Attachment
+from models.announcement import Announcement
+from models.chat import Chat
+from models.messages import Message
+from models.user import User
+
+
+class CountingStorage:
+    def __init__(self):
+        self.uploads = []
+        self.deleted = []
+
+    async def upload(self, fileobj, filename, content_type=None, key=None):
+        key = f"k{len(self.uploads)}/{filename}"
+        self.uploads.append((key, fileobj.read()))
+        return StoredFile(key=key, url=f"http://files/{key}")
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+
+@pytest.fixture
+def storage():
+    storage = CountingStorage()
+    with patch.object(attachments, "get_storage", return_value=storage):
+        yield storage
+
+
+@pytest.mark.asyncio
+async def test_same_content_is_stored_once(db_session, storage):
+    first = await store_attachment(db_session, io.BytesIO(b"price list"), "price.pdf", "application/pdf")
+    second = await store_attachment(db_session, io.BytesIO(b"price list"), "copy.pdf", "application/pdf")
+    other = await store_attachment(db_session, io.BytesIO(b"photo"), "a.jpg", "image/jpeg")
+
+    assert first.id == second.id != other.id
+    assert [body for _, body in storage.uploads] == [b"price list", b"photo"]
+    assert second.url == "http://files/k0/price.pdf"
+    row = (await db_session.execute(select(Attachment).where(Attachment.id == first.id))).scalar_one()
+    await db_session.refresh(row)
+    assert (row.refcount, row.size, len(row.sha256)) == (2, 10, 64)
+
+
+@pytest.mark.asyncio
+async def test_object_deleted_when_refcount_reaches_zero(db_session, storage):
+    attachment = await store_attachment(db_session, io.BytesIO(b"doc"), "a.pdf")
+    await store_attachment(db_session, io.BytesIO(b"doc"), "a.pdf")
+
+    await release_attachment(db_session, attachment.id)
+    assert storage.deleted == []
+
+    await release_attachment(db_session, attachment.id)
+    assert storage.deleted == ["k0/a.pdf"]
+    assert (await db_session.execute(select(Attachment))).scalars().all() == []
+
+    # Повторная загрузка после удаления снова кладёт файл в хранилище
+    await store_attachment(db_session, io.BytesIO(b"doc"), "a.pdf")
+    assert len(storage.uploads) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_upload_keeps_first(db_session, storage):
+    sha = "0" * 64
+    db_session.add(Attachment(sha256=sha, size=3, storage_key="won/a", url="http://files/won/a", refcount=1))
+    await db_session.commit()
+    # Хэш «не найден» в момент проверки, а вставка упирается в уникальность
+    original = attachments._acquire_by_hash
+    calls = []
+
+    async def racing_acquire(db, digest):
+        calls.append(digest)
+        return None if len(calls) == 1 else await original(db, digest)
+
+    with patch.object(attachments, "file_digest", return_value=(sha, 3)), \
+            patch.object(attachments, "_acquire_by_hash", racing_acquire):
+        attachment = await store_attachment(db_session, io.BytesIO(b"abc"), "a")
+
+    assert attachment.storage_key == "won/a"
+    assert storage.deleted == ["k0/a"]
+    await db_session.refresh(attachment)
+    assert attachment.refcount == 2
+
+
+@pytest.mark.asyncio
+async def test_send_to_foreign_chat_uploads_nothing(db_session, storage, client):
+    db_session.add_all([
+        User(id=1, name="Seller", email="s_att@example.com", password="p"),
+        User(id=2, name="Buyer", email="b_att@example.com", password="p"),
+        User(id=3, name="Other", email="o_att@example.com", password="p"),
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add(Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2))
+    await db_session.commit()
+
+    ok = await client.post("/chat/1/send", params={"user_id": 2},
+                           files={"file": ("a.pdf", b"%PDF", "application/pdf")})
+    # Доступ проверяется до загрузки: новый файл в хранилище не попадает
+    denied = await client.post("/chat/1/send", params={"user_id": 3},
+                               files={"file": ("b.pdf", b"%PDF-other", "application/pdf")})
+
+    assert ok.status_code == 200
+    assert denied.status_code == 404
+    message = (await db_session.execute(select(Message))).scalar_one()
+    attachment = (await db_session.execute(select(Attachment))).scalar_one()
+    await db_session.refresh(attachment)
+    assert message.attachment_id == attachment.id
+    assert attachment.refcount == 1
+    assert len(storage.uploads) == 1 and storage.deleted == []
+
+
+@pytest.mark.asyncio
+async def test_direct_upload_attachment_has_no_hash(db_session, storage):
+    attachment = await register_attachment(db_session, "chats/1/2/x/a.mp4", "http://cdn/a.mp4", 100, "video/mp4")
+    assert attachment.sha256 is None and attachment.refcount == 1
+
+    await release_attachment(db_session, attachment.id)
+    assert storage.deleted == ["chats/1/2/x/a.mp4"]
+
+
+@pytest.mark.asyncio
+async def test_direct_upload_completed_twice_shares_row(db_session, storage):
+    key = "chats/1/2/x/b.mp4"
+    first = await register_attachment(db_session, key, "http://cdn/b.mp4", 100, "video/mp4")
+    second = await register_attachment(db_session, key, "http://cdn/b.mp4", 100, "video/mp4")
+
+    assert second.id == first.id and second.refcount == 2
+    assert len((await db_session.execute(select(Attachment))).scalars().all()) == 1
+
+    # Объект живёт, пока на него ссылается второе сообщение
+    await release_attachment(db_session, first.id)
+    assert storage.deleted == []
+    await release_attachment(db_session, first.id)
+    assert storage.deleted == [key]
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from api.v1.websocket import ConnectionManager
+from core.broadcast import InMemoryBroadcast, RedisBroadcast
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    """Ждёт, пока listener Redis доставит событие."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Событие не доставлено")
+        await asyncio.sleep(0.01)
+
+
+async def _channels(client) -> set:
+    return set(await client.pubsub_channels())
+
+
+class TestInMemoryBroadcast:
+    """Рассылка по умолчанию внутри процесса."""
+
+    def test_default_backend(self):
+        manager = ConnectionManager()
+        assert isinstance(manager.backend, InMemoryBroadcast)
+
+    @pytest.mark.asyncio
+    async def test_publish_delivers_locally(self):
+        manager = ConnectionManager()
+        ws = AsyncMock()
+        await manager.connect(ws, chat_id=1)
+
+        await manager.broadcast(1, {"type": "message"})
+        await manager.flush()
+
+        ws.send_text.assert_awaited_once_with('{"type": "message"}')
+
+
+class TestRedisBroadcast:
+    """Рассылка между воркерами через Redis pub/sub."""
+
+    @pytest.fixture
+    def server(self):
+        return fakeredis.FakeServer()
+
+    def _manager(self, server) -> ConnectionManager:
+        client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        return ConnectionManager(RedisBroadcast(client, prefix="chat:"))
+
+    @pytest.mark.asyncio
+    async def test_broadcast_reaches_other_worker(self, server):
+        worker_a = self._manager(server)
+        worker_b = self._manager(server)
+        await worker_a.start()
+        await worker_b.start()
+
+        ws = AsyncMock()
+        await worker_b.connect(ws, chat_id=7)
+
+        await worker_a.broadcast(7, {"type": "message", "data": {"id": 1}})
+        await _wait_for(lambda: ws.send_text.await_count == 1)
+
+        ws.send_text.assert_awaited_once_with('{"type": "message", "data": {"id": 1}}')
+        await worker_a.stop()
+        await worker_b.stop()
+
+    @pytest.mark.asyncio
+    async def test_subscription_held_only_while_socket_connected(self, server):
+        worker = self._manager(server)
+        observer = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+        ws1, ws2 = AsyncMock(), AsyncMock()
+        await worker.connect(ws1, chat_id=3)
+        await worker.connect(ws2, chat_id=3)
+        assert await _channels(observer) == {"chat:3"}
+
+        worker.disconnect(ws1, chat_id=3)
+        await asyncio.sleep(0.05)
+        assert await _channels(observer) == {"chat:3"}
+
+        worker.disconnect(ws2, chat_id=3)
+        await asyncio.sleep(0.05)
+        assert await _channels(observer) == set()
+        await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_other_chats_not_delivered(self, server):
+        worker = self._manager(server)
+        ws = AsyncMock()
+        await worker.connect(ws, chat_id=1)
+
+        await worker.broadcast(2, {"type": "message"})
+        await worker.broadcast(1, {"type": "ping"})
+        await _wait_for(lambda: ws.send_text.await_count == 1)
+
+        ws.send_text.assert_awaited_once_with('{"type": "ping"}')
+        await worker.stop()
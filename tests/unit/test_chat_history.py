@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+
+from models.user import User
+from models.announcement import Announcement
+from models.chat import Chat
+from models.messages import Message
+from crud.chat_service import get_message_page, get_chat_with_messages, ensure_chat_member
+
+
+async def _seed_chat(db_session, count: int):
+    """Создаёт чат продавец/покупатель с count сообщениями."""
+    seller = User(id=1, name="Seller", email="seller_h@example.com", password="pass", user_role_id=2)
+    buyer = User(id=2, name="Buyer", email="buyer_h@example.com", password="pass")
+    db_session.add_all([seller, buyer])
+    await db_session.commit()
+
+    db_session.add(Announcement(id=1, user_id=seller.id))
+    await db_session.commit()
+
+    chat = Chat(id=1, announcement_id=1, seller_id=seller.id, buyer_id=buyer.id)
+    db_session.add(chat)
+    await db_session.commit()
+
+    base = datetime(2025, 1, 1)
+    db_session.add_all([
+        Message(
+            id=i,
+            chat_id=chat.id,
+            sender_id=seller.id if i % 2 else buyer.id,
+            message_text=f"msg {i}",
+            # Пары сообщений с одинаковым временем проверяют tie-break по id
+            created_at=base + timedelta(seconds=i // 2),
+        )
+        for i in range(1, count + 1)
+    ])
+    await db_session.commit()
+    return chat, seller, buyer
+
+
+@pytest.mark.asyncio
+async def test_first_page_is_newest(db_session):
+    chat, _, _ = await _seed_chat(db_session, 10)
+
+    page = await get_message_page(chat.id, db_session, limit=4)
+
+    assert [m["id"] for m in page["messages"]] == [7, 8, 9, 10]
+    assert page["has_more"] is True
+    assert page["next_cursor"] == 7
+
+
+@pytest.mark.asyncio
+async def test_before_id_walks_history_back(db_session):
+    chat, _, _ = await _seed_chat(db_session, 10)
+
+    seen = []
+    cursor = None
+    while True:
+        page = await get_message_page(chat.id, db_session, before_id=cursor, limit=3)
+        seen = [m["id"] for m in page["messages"]] + seen
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert seen == list(range(1, 11))
+
+
+@pytest.mark.asyncio
+async def test_after_id_returns_newer_messages(db_session):
+    chat, _, _ = await _seed_chat(db_session, 10)
+
+    page = await get_message_page(chat.id, db_session, after_id=6, limit=2)
+    assert [m["id"] for m in page["messages"]] == [7, 8]
+    assert page["next_cursor"] == 8
+
+    page = await get_message_page(chat.id, db_session, after_id=8, limit=5)
+    assert [m["id"] for m in page["messages"]] == [9, 10]
+    assert page["has_more"] is False
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_both_cursors_rejected(db_session):
+    chat, _, _ = await _seed_chat(db_session, 2)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_message_page(chat.id, db_session, before_id=2, after_id=1)
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_foreign_or_missing_cursor_rejected(db_session):
+    chat, seller, buyer = await _seed_chat(db_session, 3)
+    db_session.add(Chat(id=2, announcement_id=1, seller_id=seller.id, buyer_id=3))
+    db_session.add(Message(id=50, chat_id=2, sender_id=seller.id, message_text="чужой"))
+    await db_session.commit()
+
+    for cursor in ({"before_id": 50}, {"after_id": 50}, {"before_id": 999}):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_message_page(chat.id, db_session, **cursor)
+        assert exc_info.value.status_code == 400
+
+    # Конец истории — пустая страница без ошибки
+    page = await get_message_page(chat.id, db_session, before_id=1)
+    assert page == {"messages": [], "has_more": False, "next_cursor": None}
+
+
+@pytest.mark.asyncio
+async def test_older_page_marks_only_what_was_returned(db_session):
+    chat, seller, buyer = await _seed_chat(db_session, 6)
+
+    data = await get_chat_with_messages(chat.id, buyer.id, db_session, before_id=3, limit=2)
+    assert [m["id"] for m in data["messages"]] == [1, 2]
+
+    newest = await get_message_page(chat.id, db_session, limit=6)
+    read = {m["id"]: m["is_read"] for m in newest["messages"] if m["sender_id"] == seller.id}
+    assert read == {1: True, 3: False, 5: False}
+
+
+@pytest.mark.asyncio
+async def test_open_chat_returns_newest_page_and_marks_read(db_session):
+    chat, seller, buyer = await _seed_chat(db_session, 6)
+
+    data = await get_chat_with_messages(chat.id, buyer.id, db_session, limit=2)
+
+    assert data["partner"]["name"] == "Seller"
+    assert [m["id"] for m in data["messages"]] == [5, 6]
+    assert data["has_more"] is True
+    incoming = [m for m in data["messages"] if m["sender_id"] == seller.id]
+    assert all(m["is_read"] for m in incoming)
+
+
+@pytest.mark.asyncio
+async def test_ensure_chat_member_rejects_stranger(db_session):
+    chat, seller, buyer = await _seed_chat(db_session, 1)
+
+    await ensure_chat_member(chat.id, seller.id, db_session)
+    await ensure_chat_member(chat.id, buyer.id, db_session)
+    with pytest.raises(HTTPException) as exc_info:
+        await ensure_chat_member(chat.id, 999, db_session)
+
+    assert exc_info.value.status_code == 404
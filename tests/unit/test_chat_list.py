@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import event
+
+from models.user import User
+from models.announcement import Announcement
+from models.chat import Chat
+from models.chat_participant import ChatParticipant
+from models.messages import Message
+from crud.chat_service import get_user_chats
+
+
+async def _seed(db_session, chats: int):
+    """Продавец id=1 и chats покупателей; в чате i — i непрочитанных от покупателя."""
+    db_session.add(User(id=1, name="Seller", email="seller_l@example.com", password="pass", user_role_id=2))
+    db_session.add_all([
+        User(id=100 + i, name=f"Buyer {i}", email=f"buyer{i}_l@example.com", password="pass")
+        for i in range(chats)
+    ])
+    await db_session.commit()
+    db_session.add_all([Announcement(id=i + 1, user_id=1) for i in range(chats)])
+    await db_session.commit()
+    db_session.add_all([
+        Chat(id=i + 1, announcement_id=i + 1, seller_id=1, buyer_id=100 + i)
+        for i in range(chats)
+    ])
+    await db_session.commit()
+    # Свои и уже прочитанные (до watermark продавца) сообщения не считаются
+    old = [Message(chat_id=i + 1, sender_id=100 + i, message_text="old") for i in range(chats)]
+    db_session.add_all(old)
+    await db_session.commit()
+    db_session.add_all([
+        ChatParticipant(chat_id=i + 1, user_id=1, last_read_message_id=old[i].id) for i in range(chats)
+    ])
+    for i in range(chats):
+        db_session.add_all([
+            Message(chat_id=i + 1, sender_id=100 + i, message_text="hi")
+            for _ in range(i % 4)
+        ])
+        db_session.add(Message(chat_id=i + 1, sender_id=1, message_text="own"))
+    await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_unread_counts_per_chat(db_session):
+    await _seed(db_session, 6)
+
+    chats = await get_user_chats(db_session, user_id=1)
+    by_id = {c["id"]: c for c in chats}
+
+    assert len(chats) == 6
+    assert {cid: c["unread_count"] for cid, c in by_id.items()} == {i + 1: i % 4 for i in range(6)}
+    assert by_id[1]["partner"]["name"] == "Buyer 0"
+
+
+@pytest.mark.asyncio
+async def test_buyer_sees_own_unread(db_session):
+    await _seed(db_session, 2)
+
+    chats = await get_user_chats(db_session, user_id=100, role="buyer")
+
+    assert [c["id"] for c in chats] == [1]
+    assert chats[0]["unread_count"] == 1
+    assert chats[0]["partner"]["name"] == "Seller"
+    assert await get_user_chats(db_session, user_id=100, role="seller") == []
+
+
+@pytest.mark.asyncio
+async def test_query_count_is_constant(db_session):
+    await _seed(db_session, 40)
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        chats = await get_user_chats(db_session, user_id=1)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(chats) == 40
+    # Чаты с агрегатом + selectinload продавцов + selectinload покупателей
+    assert len(statements) == 3
@@ -1,3 +1,4 @@
+import json
 import pytest
 from datetime import datetime
 from unittest.mock import MagicMock, Mock, patch, AsyncMock
@@ -88,13 +89,16 @@ class TestConnectionManager:
         
         mock_ws1 = AsyncMock()
         mock_ws2 = AsyncMock()
-        manager.active_connections[1] = {mock_ws1, mock_ws2}
+        await manager.connect(mock_ws1, chat_id=1)
+        await manager.connect(mock_ws2, chat_id=1)
         
         message = {"type": "message", "data": {"text": "Hello"}}
         await manager.broadcast(chat_id=1, message=message)
+        await manager.flush()
         
-        mock_ws1.send_json.assert_awaited_once_with(message)
-        mock_ws2.send_json.assert_awaited_once_with(message)
+        payload = json.dumps(message, ensure_ascii=False)
+        mock_ws1.send_text.assert_awaited_once_with(payload)
+        mock_ws2.send_text.assert_awaited_once_with(payload)
 
     @pytest.mark.asyncio
     async def test_broadcast_empty_chat(self):
@@ -113,14 +117,85 @@ class TestConnectionManager:
         
         mock_ws_alive = AsyncMock()
         mock_ws_dead = AsyncMock()
-        mock_ws_dead.send_json.side_effect = Exception("Connection closed")
+        mock_ws_dead.send_text.side_effect = Exception("Connection closed")
         
-        manager.active_connections[1] = {mock_ws_alive, mock_ws_dead}
+        await manager.connect(mock_ws_alive, chat_id=1)
+        await manager.connect(mock_ws_dead, chat_id=1)
         
         await manager.broadcast(chat_id=1, message={"type": "test"})
+        await manager.flush()
         
         assert mock_ws_alive in manager.active_connections[1]
         assert mock_ws_dead not in manager.active_connections[1]
+        assert manager.stats()["send_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_block_others(self):
+        """Test a stalled socket does not delay delivery to other sockets."""
+        import asyncio
+        from api.v1.websocket import ConnectionManager
+        manager = ConnectionManager(max_queue=4, overflow_policy="drop_new")
+        
+        stalled = asyncio.Event()
+
+        async def stall(payload):
+            await stalled.wait()
+
+        mock_ws_slow = AsyncMock()
+        mock_ws_slow.send_text.side_effect = stall
+        mock_ws_fast = AsyncMock()
+        await manager.connect(mock_ws_slow, chat_id=1)
+        await manager.connect(mock_ws_fast, chat_id=1)
+        
+        for i in range(10):
+            await manager.broadcast(chat_id=1, message={"n": i})
+            await asyncio.sleep(0)
+        await manager.connections[mock_ws_fast].flush()
+        
+        assert mock_ws_fast.send_text.await_count == 10
+        assert manager.stats()["dropped_messages"] > 0
+        assert manager.stats()["queue_depth_max"] <= 4
+        stalled.set()
+
+    @pytest.mark.asyncio
+    async def test_overflow_disconnect_policy(self):
+        """Test overflowing client is disconnected under 'disconnect' policy."""
+        import asyncio
+        from api.v1.websocket import ConnectionManager
+        manager = ConnectionManager(max_queue=2, overflow_policy="disconnect")
+        
+        async def stall(payload):
+            await asyncio.Event().wait()
+
+        mock_ws = AsyncMock()
+        mock_ws.send_text.side_effect = stall
+        await manager.connect(mock_ws, chat_id=1)
+        
+        for i in range(5):
+            await manager.broadcast(chat_id=1, message={"n": i})
+        await asyncio.sleep(0)
+        
+        assert 1 not in manager.active_connections
+        assert manager.stats()["slow_disconnects"] == 1
+        mock_ws.close.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_overflow_drop_oldest_keeps_latest(self):
+        """Test 'drop_oldest' policy keeps the most recent messages queued."""
+        import asyncio
+        from api.v1.websocket import ConnectionManager
+        manager = ConnectionManager(max_queue=2, overflow_policy="drop_oldest")
+        
+        mock_ws = AsyncMock()
+        await manager.connect(mock_ws, chat_id=1)
+        connection = manager.connections[mock_ws]
+        connection.close()
+        
+        for i in range(4):
+            await manager.broadcast(chat_id=1, message={"n": i})
+        
+        queued = [json.loads(connection.queue.get_nowait()) for _ in range(2)]
+        assert queued == [{"n": 2}, {"n": 3}]
 
 
 # =============================================================================
@@ -163,8 +238,12 @@ class TestGetOrCreateChat:
         mock_ann_result = MagicMock()
         mock_ann_result.scalar_one_or_none.return_value = Announcement(id=10, user_id=99)
         
+        # Then chat_created events for seller and buyer go to the outbox
+        mock_event_result = MagicMock()
+        mock_event_result.scalar_one.return_value = 1
+
         db = AsyncMock()
-        db.execute = AsyncMock(side_effect=[mock_chat_result, mock_ann_result])
+        db.execute = AsyncMock(side_effect=[mock_chat_result, mock_ann_result, mock_event_result, mock_event_result])
         db.add = MagicMock()
         db.commit = AsyncMock()
         db.refresh = AsyncMock()
@@ -174,6 +253,8 @@ class TestGetOrCreateChat:
         assert result.announcement_id == 10
         assert result.buyer_id == 20
         db.add.assert_called_once()
+        db.flush.assert_awaited_once()
+        assert db.execute.await_count == 4
         db.commit.assert_awaited_once()
 
     @pytest.mark.asyncio
@@ -202,27 +283,54 @@ class TestGetOrCreateChat:
 class TestSendMessage:
     """Tests for send_message function."""
 
+    @staticmethod
+    def _db(chat_updated: bool, chat_exists: bool = True):
+        """Mock session: UPDATE chats ... RETURNING, INSERT message, INSERT outbox events."""
+        update_result = MagicMock()
+        update_result.one_or_none.return_value = MagicMock(id=1, recipient_id=10) if chat_updated else None
+
+        def insert_result(row):
+            result = MagicMock()
+            result.one.return_value = MagicMock(_mapping={"id": 5, "chat_id": 1, **row})
+            return result
+
+        exists_result = MagicMock()
+        exists_result.scalar_one_or_none.return_value = 1 if chat_exists else None
+
+        db = AsyncMock()
+        db.bind.dialect.name = "sqlite"
+        db.commit = AsyncMock()
+        db.rollback = AsyncMock()
+
+        async def execute(stmt, *args, **kwargs):
+            if stmt.is_insert and stmt.table.name == "outbox_events" and args:
+                db.outbox_batch = args[0]
+                return MagicMock()
+            if stmt.is_insert and stmt.table.name == "outbox_events":
+                db.outbox_params = stmt.compile().params
+                event_result = MagicMock()
+                event_result.scalar_one.return_value = 100
+                return event_result
+            if stmt.is_insert:
+                params = stmt.compile().params
+                return insert_result({
+                    k: params[k] for k in
+                    ("sender_id", "message_text", "file_url", "message_type", "created_at")
+                })
+            if stmt.is_update:
+                db.update_params = stmt.compile().params
+                return update_result
+            return exists_result
+
+        db.execute = AsyncMock(side_effect=execute)
+        return db
+
     @pytest.mark.asyncio
     async def test_sends_text_message(self):
         """Test sending a text message."""
         from crud.chat_service import send_message
-        from models.chat import Chat
-        
-        mock_chat = Chat(id=1, announcement_id=10, buyer_id=20)
-        
-        # First query returns chat
-        mock_chat_result = MagicMock()
-        mock_chat_result.scalar_one_or_none.return_value = mock_chat
         
-        # Second query returns seller_id
-        mock_seller_result = MagicMock()
-        mock_seller_result.scalar_one.return_value = 30  # seller_id
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(side_effect=[mock_chat_result, mock_seller_result])
-        db.add = MagicMock()
-        db.commit = AsyncMock()
-        db.refresh = AsyncMock()
+        db = self._db(chat_updated=True)
         
         result = await send_message(
             chat_id=1, 
@@ -233,27 +341,20 @@ class TestSendMessage:
         
         assert result.message_text == "Hello!"
         assert result.message_type == "text"
+        assert db.execute.await_count == 4
+        assert db.outbox_params["message_id"] == 5
+        # Превью — в личные каналы отправителя и получателя
+        assert [(e["chat_id"], e["user_id"], e["event_type"]) for e in db.outbox_batch] == [
+            (1, 20, "chat_updated"), (1, 10, "chat_updated"),
+        ]
         db.commit.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_sends_image_message(self):
         """Test sending an image message updates preview to 'Фото'."""
         from crud.chat_service import send_message
-        from models.chat import Chat
-        
-        mock_chat = Chat(id=1, announcement_id=10, buyer_id=20)
-        
-        mock_chat_result = MagicMock()
-        mock_chat_result.scalar_one_or_none.return_value = mock_chat
         
-        mock_seller_result = MagicMock()
-        mock_seller_result.scalar_one.return_value = 30
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(side_effect=[mock_chat_result, mock_seller_result])
-        db.add = MagicMock()
-        db.commit = AsyncMock()
-        db.refresh = AsyncMock()
+        db = self._db(chat_updated=True)
         
         result = await send_message(
             chat_id=1, 
@@ -264,7 +365,7 @@ class TestSendMessage:
         )
         
         assert result.message_type == "image"
-        assert mock_chat.last_message_text == "Фото"
+        assert db.update_params["last_message_text"] == "Фото"
 
     @pytest.mark.asyncio
     async def test_raises_404_if_chat_not_found(self):
@@ -272,80 +373,71 @@ class TestSendMessage:
         from crud.chat_service import send_message
         from fastapi import HTTPException
         
-        mock_result = MagicMock()
-        mock_result.scalar_one_or_none.return_value = None
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(return_value=mock_result)
+        db = self._db(chat_updated=False, chat_exists=False)
         
         with pytest.raises(HTTPException) as exc_info:
             await send_message(chat_id=999, sender_id=1, db=db, text="Hello")
         
         assert exc_info.value.status_code == 404
+        db.commit.assert_not_awaited()
 
     @pytest.mark.asyncio
     async def test_raises_403_if_user_not_in_chat(self):
         """Test raises HTTPException if user is not buyer or seller."""
         from crud.chat_service import send_message
-        from models.chat import Chat
         from fastapi import HTTPException
         
-        mock_chat = Chat(id=1, announcement_id=10, buyer_id=20)
-        
-        mock_chat_result = MagicMock()
-        mock_chat_result.scalar_one_or_none.return_value = mock_chat
-        
-        mock_seller_result = MagicMock()
-        mock_seller_result.scalar_one.return_value = 30  # seller_id
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(side_effect=[mock_chat_result, mock_seller_result])
+        db = self._db(chat_updated=False, chat_exists=True)
         
         with pytest.raises(HTTPException) as exc_info:
             await send_message(chat_id=1, sender_id=999, db=db, text="Hello")  # not buyer or seller
         
         assert exc_info.value.status_code == 403
+        db.commit.assert_not_awaited()
 
 
 class TestGetUserChats:
     """Tests for get_user_chats function."""
 
+    @staticmethod
+    def _db(rows):
+        mock_result = MagicMock()
+        mock_result.all.return_value = rows
+        db = AsyncMock()
+        db.execute = AsyncMock(return_value=mock_result)
+        return db
+
     @pytest.mark.asyncio
     async def test_returns_all_chats(self):
         """Test returns all chats when role is None."""
         from crud.chat_service import get_user_chats
         from models.chat import Chat
         
-        chats = [Chat(id=1), Chat(id=2)]
-        
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = chats
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(return_value=mock_result)
+        chats = [(Chat(id=1, buyer_id=1), 0), (Chat(id=2, seller_id=1), 3)]
+        db = self._db(chats)
         
         result = await get_user_chats(db=db, user_id=1, role=None)
         
-        assert result == chats
+        assert [c["id"] for c in result] == [1, 2]
+        assert [c["unread_count"] for c in result] == [0, 3]
 
     @pytest.mark.asyncio
     async def test_filters_buyer_chats(self):
         """Test filters to buyer-only chats when role='buyer'."""
         from crud.chat_service import get_user_chats
         from models.chat import Chat
+        from models.user import User
         
-        buyer_chats = [Chat(id=1, buyer_id=1)]
-        
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = buyer_chats
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(return_value=mock_result)
+        seller = User(id=30, name="Seller", user_role_id=2)
+        buyer_chats = [(Chat(id=1, buyer_id=1, seller=seller), 2)]
+        db = self._db(buyer_chats)
         
         result = await get_user_chats(db=db, user_id=1, role="buyer")
         
-        assert result == buyer_chats
-        # Verify execute was called (query was built correctly)
+        assert result[0]["partner"]["name"] == "Seller"
+        assert result[0]["partner"]["role"] == "Бизнес"
+        assert result[0]["unread_count"] == 2
+        # Chats and unread counters come from a single statement
         db.execute.assert_awaited_once()
 
     @pytest.mark.asyncio
@@ -353,18 +445,16 @@ class TestGetUserChats:
         """Test filters to seller-only chats when role='seller'."""
         from crud.chat_service import get_user_chats
         from models.chat import Chat
+        from models.user import User
         
-        seller_chats = [Chat(id=2)]
-        
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = seller_chats
-        
-        db = AsyncMock()
-        db.execute = AsyncMock(return_value=mock_result)
+        buyer = User(id=2, name="Buyer")
+        seller_chats = [(Chat(id=2, buyer_id=2, seller_id=1, buyer=buyer), 0)]
+        db = self._db(seller_chats)
         
         result = await get_user_chats(db=db, user_id=1, role="seller")
         
-        assert result == seller_chats
+        assert result[0]["id"] == 2
+        assert result[0]["partner"]["name"] == "Buyer"
 
 
 # =============================================================================
@@ -564,9 +654,9 @@ class TestChatAPIFunctions:
         from crud.chat_service import get_user_chats
         from models.chat import Chat
         
-        mock_chats = [Chat(id=1, buyer_id=1)]
+        mock_chats = [(Chat(id=1, buyer_id=1), 0)]
         mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = mock_chats
+        mock_result.all.return_value = mock_chats
         
         db = AsyncMock()
         db.execute = AsyncMock(return_value=mock_result)
@@ -580,9 +670,9 @@ class TestChatAPIFunctions:
         from crud.chat_service import get_user_chats
         from models.chat import Chat
         
-        mock_chats = [Chat(id=2)]
+        mock_chats = [(Chat(id=2), 0)]
         mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = mock_chats
+        mock_result.all.return_value = mock_chats
         
         db = AsyncMock()
         db.execute = AsyncMock(return_value=mock_result)
@@ -598,7 +688,7 @@ class TestChatAPIFunctions:
         
         manager = ConnectionManager()
         mock_ws = AsyncMock()
-        manager.active_connections[1] = {mock_ws}
+        await manager.connect(mock_ws, chat_id=1)
         
         # Simulate broadcast
         message_data = {
@@ -613,7 +703,8 @@ class TestChatAPIFunctions:
         }
         
         await manager.broadcast(chat_id=1, message=message_data)
-        mock_ws.send_json.assert_awaited_once_with(message_data)
+        await manager.flush()
+        mock_ws.send_text.assert_awaited_once_with(json.dumps(message_data, ensure_ascii=False))
 
     @pytest.mark.asyncio
     async def test_file_upload_sets_correct_message_type(self):
@@ -37,14 +37,14 @@ async def test_get_or_create_room_new():
 
     db.commit = AsyncMock()
     db.refresh = AsyncMock()
-    db.add = AsyncMock()
+    db.add = Mock()
 
     result = await crud_support.get_or_create_room(99, db)
 
     assert result.user_id == 99
     db.commit.assert_awaited()
     db.refresh.assert_awaited()
-    db.add.assert_awaited()
+    db.add.assert_called_once_with(result)
 
 
 
@@ -74,17 +74,18 @@ from unittest.mock import AsyncMock, patch
 
 @pytest.mark.asyncio
 @patch("src.services.grok.settings")
-@patch("src.services.grok.read_prompt", return_value="system prompt")
-@patch("httpx.AsyncClient")
-async def test_call_grok_model(mock_client, mock_read_prompt, mock_settings):
+@patch("src.services.grok.read_prompt", new_callable=AsyncMock, return_value="system prompt")
+@patch("src.services.grok.get_http_client")
+async def test_call_grok_model(mock_get_client, mock_read_prompt, mock_settings):
     mock_settings.GROK_API_URL = "http://fake.url"
     mock_settings. GROK_API_KEY = None  
 
-    mock_response = AsyncMock()
-    mock_response.json = AsyncMock(return_value={"reply": "Hi"})
+    mock_response = Mock()
+    mock_response.json = Mock(return_value={"reply": "Hi"})
     mock_response.raise_for_status = Mock()
 
-    mock_client.return_value.__aenter__.return_value.post.return_value = mock_response
+    mock_client = mock_get_client.return_value
+    mock_client.post = AsyncMock(return_value=mock_response)
 
     from src.services import grok as services_grok
 
@@ -93,8 +94,10 @@ async def test_call_grok_model(mock_client, mock_read_prompt, mock_settings):
     assert result == {"reply": "Hi"}
     assert result["reply"] == "Hi"
 
-    mock_read_prompt.assert_called_once()
-    mock_client.return_value.__aenter__.return_value.post.assert_called_once_with(
+    mock_read_prompt.assert_awaited_once()
+    # Используется общий клиент из пула, а не новый на каждый вызов
+    mock_get_client.assert_called_once_with("grok")
+    mock_client.post.assert_called_once_with(
         mock_settings.GROK_API_URL,
         json={
             "model": "grok-4-fast-reasoning",
@@ -108,45 +111,58 @@ async def test_call_grok_model(mock_client, mock_read_prompt, mock_settings):
 
 # Prompts unit tests
 
-def test_read_prompt_cached():
-    mock_redis = MagicMock()
+@pytest.fixture(autouse=True)
+def fresh_prompt_cache():
+    from services.prompts import prompt_cache
+    prompt_cache.invalidate()
+    yield
+    prompt_cache.invalidate()
+
+
+@pytest.mark.asyncio
+async def test_read_prompt_cached():
+    mock_redis = AsyncMock()
     mock_redis.get.return_value = "cached prompt"
 
-    with patch("src.prompts.get_redis", return_value=mock_redis):
-        result = read_prompt()
+    with patch("services.prompts.get_async_redis", return_value=mock_redis):
+        result = await read_prompt()
 
     assert result == "cached prompt"
-    mock_redis.get.assert_called_once_with("support_prompt")
+    mock_redis.get.assert_awaited_once_with("support_prompt")
 
-@patch("src.prompts.settings")
-@patch("src.prompts.get_redis")
+@pytest.mark.asyncio
+@patch("services.prompts.settings")
+@patch("services.prompts.get_async_redis")
 @patch("pathlib.Path.write_text")
-def test_write_prompt(mock_write, mock_get_redis, mock_settings):
+async def test_write_prompt(mock_write, mock_get_redis, mock_settings):
     mock_settings.SUPPORT_PROMPT_PATH = "test_prompt.txt"
 
-    mock_redis = MagicMock()
+    mock_redis = AsyncMock()
+    mock_redis.incr.return_value = 1
     mock_get_redis.return_value = mock_redis
 
-    write_prompt("hello")
+    await write_prompt("hello")
 
     mock_write.assert_called_once()
-    mock_redis.set.assert_called_once_with("support_prompt", "hello")
+    mock_redis.set.assert_awaited_once_with("support_prompt", "hello")
 
 
-def test_upload_prompt():
-    mock_redis = MagicMock()
+@pytest.mark.asyncio
+async def test_upload_prompt():
+    mock_redis = AsyncMock()
+    mock_redis.incr.return_value = 1
 
     temp = Path("temp.txt")
     temp.write_text("abc")
 
-    with patch("src.prompts.get_redis", return_value=mock_redis), \
-         patch("src.prompts.settings") as mock_settings, \
+    with patch("services.prompts.get_async_redis", return_value=mock_redis), \
+         patch("services.prompts.settings") as mock_settings, \
          patch("pathlib.Path.write_text") as mock_write:
         
         mock_settings.SUPPORT_PROMPT_PATH = "test_prompt.txt"
 
-        result = upload_prompt(temp)
+        result = await upload_prompt(temp)
 
         assert result == "abc"
         mock_write.assert_called_once()
-        mock_redis.set.assert_called_once_with("support_prompt", "abc")
\ No newline at end of file
+        mock_redis.set.assert_awaited_once_with("support_prompt", "abc")
@@ -0,0 +1,59 @@
+from fastapi.routing import APIRoute
+
+from core import database
+from core.config import settings
+from core.database import engine_options, get_db, get_read_db
+from main import app
+
+
+def test_sqlite_keeps_own_pool():
+    options = engine_options("sqlite+aiosqlite:///:memory:")
+    assert options == {"echo": False, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+
+
+def test_postgres_pool_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 3)
+    monkeypatch.setattr(settings, "DB_POOL_RECYCLE", 600)
+    monkeypatch.setattr(settings, "DB_STATEMENT_CACHE_SIZE", 250)
+
+    options = engine_options("postgresql+asyncpg://u:p@db/app")
+
+    assert options["pool_size"] == 7
+    assert options["max_overflow"] == 3
+    assert options["pool_recycle"] == 600
+    assert options["pool_timeout"] == settings.DB_POOL_TIMEOUT
+    assert options["connect_args"] == {"prepared_statement_cache_size": 250}
+
+
+def test_statement_cache_disabled_for_pgbouncer(monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_CACHE_SIZE", 0)
+
+    connect_args = engine_options("postgresql+asyncpg://u:p@pgbouncer/app")["connect_args"]
+
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["statement_cache_size"] == 0
+    name = connect_args["prepared_statement_name_func"]
+    assert name() != name()
+
+
+def test_read_engine_defaults_to_primary():
+    if settings.DATABASE_READ_URL:
+        assert database.read_engine is not database.engine
+    else:
+        assert database.read_engine is database.engine
+        assert database.AsyncReadSessionLocal is database.AsyncSessionLocal
+
+
+def _session_dependency(path: str, method: str):
+    route = next(r for r in app.routes if isinstance(r, APIRoute) and r.path == path and method in r.methods)
+    calls = {dep.call for dep in route.dependant.dependencies}
+    return get_read_db if get_read_db in calls else get_db if get_db in calls else None
+
+
+def test_read_only_routes_use_read_session():
+    assert _session_dependency("/chat/my", "GET") is get_read_db
+    assert _session_dependency("/chat/{chat_id}/messages", "GET") is get_read_db
+    # Открытие чата отмечает сообщения прочитанными — только основная БД
+    assert _session_dependency("/chat/{chat_id}", "GET") is get_db
+    assert _session_dependency("/chat/{chat_id}/send", "POST") is get_db
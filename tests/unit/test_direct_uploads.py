@@ -0,0 +1,129 @@
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from core.config import settings
+from core.storage import ObjectInfo, StorageBackend
+from models.attachment import Attachment
+from models.messages import Message
+
+
+class FakeDirectStorage(StorageBackend):
+    supports_presigned = True
+
+    def __init__(self, info=None):
+        self.info = info
+        self.deleted = []
+        self.completed = []
+
+    def url_for(self, key):
+        return f"http://cdn/{key}"
+
+    async def presign_upload(self, key, content_type, size):
+        return {"method": "PUT", "url": f"http://s3/{key}?sig", "headers": {"Content-Type": content_type},
+                "expires_in": 900}
+
+    async def complete_upload(self, key, upload_id, parts):
+        if upload_id == "bad":
+            raise ValueError("InvalidPart")
+        self.completed.append((key, upload_id, parts))
+
+    async def head(self, key):
+        return self.info
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+
+@pytest.fixture
+def chat_api():
+    from api.v1 import chat
+    return chat
+
+
+@pytest.mark.asyncio
+async def test_create_upload_scopes_key_to_chat(client, chat_api):
+    storage = FakeDirectStorage()
+    with patch.object(chat_api, "get_storage", return_value=storage), \
+            patch.object(chat_api, "ensure_chat_member", AsyncMock()) as member:
+        response = await client.post("/chat/7/uploads", params={"user_id": 3},
+                                     json={"filename": "фото 1.png", "content_type": "image/png", "size": 2048})
+
+    assert response.status_code == 200
+    ticket = response.json()
+    assert ticket["key"].startswith("chats/7/3/")
+    assert ticket["key"].endswith("/фото_1.png")
+    assert ticket["url"] == f"http://s3/{ticket['key']}?sig"
+    assert ticket["headers"] == {"Content-Type": "image/png"}
+    assert member.await_args.kwargs["chat_id"] == 7
+
+
+@pytest.mark.asyncio
+async def test_create_upload_rejects_oversized_and_unsupported(client, chat_api, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1000)
+    body = {"filename": "a.mp4", "content_type": "video/mp4", "size": 5000}
+    with patch.object(chat_api, "get_storage", return_value=FakeDirectStorage()):
+        assert (await client.post("/chat/1/uploads", params={"user_id": 2}, json=body)).status_code == 413
+
+    # PocketBase и локальный диск подписанные URL не выдают
+    with patch.object(chat_api, "get_storage", return_value=StorageBackend()):
+        body["size"] = 10
+        assert (await client.post("/chat/1/uploads", params={"user_id": 2}, json=body)).status_code == 501
+
+
+@pytest.mark.asyncio
+async def test_complete_upload_sends_message(client, chat_api):
+    storage = FakeDirectStorage(ObjectInfo(size=2048, content_type="video/mp4"))
+    key = "chats/1/2/abc/clip.mp4"
+    message = Message(id=5, chat_id=1, sender_id=2, message_type="video", file_url=f"http://cdn/{key}")
+    relay = Mock()
+    attachment = Attachment(id=9, url=f"http://cdn/{key}")
+
+    with patch.object(chat_api, "get_storage", return_value=storage), \
+            patch.object(chat_api, "register_attachment", AsyncMock(return_value=attachment)) as register, \
+            patch.object(chat_api, "send_message", AsyncMock(return_value=message)) as send, \
+            patch.object(chat_api, "get_outbox_relay", return_value=relay):
+        response = await client.post("/chat/1/uploads/complete", params={"user_id": 2}, json={
+            "key": key, "content_type": "video/mp4", "text": "смотри", "upload_id": "up1",
+            "parts": [{"part_number": 2, "etag": "b"}, {"part_number": 1, "etag": "a"}],
+        })
+
+    assert response.status_code == 200
+    assert storage.completed == [(key, "up1", [(2, "b"), (1, "a")])]
+    assert register.await_args.args[1:] == (key, f"http://cdn/{key}", 2048, "video/mp4")
+    kwargs = send.await_args.kwargs
+    assert (kwargs["file_url"], kwargs["message_type"], kwargs["text"]) == (f"http://cdn/{key}", "video", "смотри")
+    assert kwargs["attachment_id"] == 9
+    # Событие пишет send_message в outbox, обработчик только будит relay
+    relay.wake.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+async def test_complete_upload_validation(client, chat_api, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1000)
+    send = AsyncMock()
+
+    async def complete(storage, json, user_id=2):
+        with patch.object(chat_api, "get_storage", return_value=storage), \
+                patch.object(chat_api, "send_message", send):
+            return (await client.post("/chat/1/uploads/complete", params={"user_id": user_id}, json=json)).status_code
+
+    key = "chats/1/2/abc/a..b.bin"
+    pdf = {"key": key, "content_type": "application/pdf"}
+    # Чужой ключ: другой отправитель или другой чат
+    assert await complete(FakeDirectStorage(), pdf, user_id=3) == 403
+    assert await complete(FakeDirectStorage(), {**pdf, "key": "chats/1/2/../../9/2/x"}) == 403
+    # Объекта нет
+    assert await complete(FakeDirectStorage(None), pdf) == 404
+    # Части не собрались
+    assert await complete(FakeDirectStorage(), {**pdf, "upload_id": "bad",
+                                                "parts": [{"part_number": 1, "etag": "x"}]}) == 400
+    # Тип объекта не тот, под который выдан URL; объект не трогаем
+    storage = FakeDirectStorage(ObjectInfo(size=500, content_type="text/html"))
+    assert await complete(storage, pdf) == 400
+    assert storage.deleted == []
+    # Файл больше лимита удаляется из хранилища
+    storage = FakeDirectStorage(ObjectInfo(size=5000, content_type="application/pdf"))
+    assert await complete(storage, pdf) == 413
+    assert storage.deleted == [key]
+
+    send.assert_not_awaited()
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import pytest_asyncio
+import httpx
+
+from core.http import HttpClientRegistry
+from core.pocketbase_client import PocketBaseClient
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    """Локальный HTTP/1.1 сервер с keep-alive; считает принятые соединения."""
+    state = {"connections": 0}
+
+    async def handle(reader, writer):
+        state["connections"] += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                body = b'{"token": "t", "id": "rec1", "field": "file.txt"}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    state["url"] = f"http://127.0.0.1:{port}"
+    yield state
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_connections_reused(upstream):
+    registry = HttpClientRegistry()
+    registry.register("svc", timeout=5, max_connections=4, http2=False)
+    client = registry.get("svc")
+
+    for _ in range(10):
+        (await client.get(upstream["url"])).raise_for_status()
+    await registry.aclose()
+
+    assert upstream["connections"] == 1
+    assert registry.stats()["svc"] == {
+        "requests": 10,
+        "connections_opened": 1,
+        "connections_reused": 9,
+        "reuse_ratio": 0.9,
+        "errors": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_pool_limit_bounds_connections(upstream):
+    registry = HttpClientRegistry()
+    registry.register("svc", timeout=5, max_connections=2, http2=False)
+    client = registry.get("svc")
+
+    await asyncio.gather(*(client.get(upstream["url"]) for _ in range(20)))
+    await registry.aclose()
+
+    assert upstream["connections"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_client_shared_and_recreated_after_close():
+    registry = HttpClientRegistry()
+    registry.register("svc", timeout=5, max_connections=1)
+
+    client = registry.get("svc")
+    assert registry.get("svc") is client
+
+    await registry.aclose()
+    assert registry.get("svc") is not client
+
+    with pytest.raises(KeyError):
+        registry.get("unknown")
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pocketbase_uses_injected_client(upstream, monkeypatch):
+    from core import pocketbase_client
+
+    monkeypatch.setattr(pocketbase_client.settings, "POCKETBASE_URL", upstream["url"])
+    monkeypatch.setattr(pocketbase_client.settings, "POCKETBASE_COLLECTION", "files")
+    registry = HttpClientRegistry()
+    registry.register("pocketbase", timeout=5, max_connections=2, http2=False)
+    pb = PocketBaseClient(client=registry.get("pocketbase"))
+
+    url = await pb.upload_file(b"data", "file.txt")
+    await pb.upload_file(b"data", "file.txt")
+    await registry.aclose()
+
+    assert url == f"{upstream['url']}/api/files/files/rec1/file.txt"
+    # Авторизация и две загрузки — по одному соединению
+    assert registry.stats()["pocketbase"]["requests"] == 3
+    assert upstream["connections"] == 1
@@ -0,0 +1,85 @@
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+import core.logger as app_logging
+from core.config import settings
+from core.logger import DroppingQueueHandler, JsonFormatter
+
+
+def _record(msg="hello %s", args=("world",), exc_info=None, **extra):
+    record = logging.LogRecord("api.support", logging.INFO, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_queue_handler_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.handle(_record())
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_prepare_renders_message_and_traceback():
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = _record(exc_info=sys.exc_info())
+
+    prepared = handler.prepare(record)
+
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ("hello world", None, None)
+    assert "ZeroDivisionError" in prepared.exc_text
+    # Исходная запись не меняется — её видят другие обработчики
+    assert record.args == ("world",) and record.exc_info is not None
+
+
+def test_json_formatter_includes_extra_fields():
+    handler = DroppingQueueHandler(queue.Queue())
+    prepared = handler.prepare(_record(exc_info=None, chat_id=7, user_id=3))
+    prepared.exc_text = "Traceback: boom"
+
+    payload = json.loads(JsonFormatter().format(prepared))
+
+    assert payload["message"] == "hello world"
+    assert payload["logger"] == "api.support"
+    assert payload["level"] == "INFO"
+    assert (payload["chat_id"], payload["user_id"]) == (7, 3)
+    assert payload["exc_info"] == "Traceback: boom"
+
+
+@pytest.fixture
+def fresh_logging(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    monkeypatch.setattr(settings, "LOG_LEVELS", {"tests.noisy": "error"})
+    root_level = logging.getLogger().level
+    app_logging.stop_logging()
+    yield tmp_path
+    app_logging.stop_logging()
+    logging.getLogger("tests.noisy").setLevel(logging.NOTSET)
+    monkeypatch.undo()
+    app_logging.setup_logging()
+    logging.getLogger().setLevel(root_level)
+
+
+def test_setup_writes_through_listener(fresh_logging):
+    handler = app_logging.setup_logging()
+    assert app_logging.setup_logging() is handler
+    assert handler in logging.getLogger().handlers
+
+    logging.getLogger("tests.quiet").info("доставлено", extra={"chat_id": 1})
+    logging.getLogger("tests.noisy").warning("отфильтровано")
+    app_logging.stop_logging()
+
+    lines = [json.loads(line) for line in (fresh_logging / "app.log").read_text(encoding="utf-8").splitlines()]
+    assert [(line["logger"], line["message"]) for line in lines] == [("tests.quiet", "доставлено")]
+    assert lines[0]["chat_id"] == 1
+    assert handler not in logging.getLogger().handlers
+    assert app_logging.log_stats() == {"queued": 0, "dropped": 0}
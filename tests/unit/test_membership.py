@@ -0,0 +1,164 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from core.config import settings
+from crud.chat_service import ensure_chat_member, get_chat_with_messages, get_or_create_chat
+from models.announcement import Announcement
+from models.chat import Chat
+from models.user import User
+from services import membership
+from services.membership import (
+    ChatMembers, MembershipCache, get_chat_members, invalidate_chat, is_member,
+    listen_membership_invalidations, membership_cache,
+)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(settings, "MEMBERSHIP_REDIS_ENABLED", True)
+    with patch("services.membership.get_async_redis", return_value=client):
+        yield client
+
+
+@pytest_asyncio.fixture
+async def chat(db_session):
+    db_session.add_all([
+        User(id=1, name="Seller", email="s_mb@example.com", password="p"),
+        User(id=2, name="Buyer", email="b_mb@example.com", password="p"),
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add(Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2))
+    await db_session.commit()
+    return 1
+
+
+@pytest.fixture
+def queries(db_session):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(db_session.bind.sync_engine, "before_cursor_execute", count)
+
+
+def test_lru_evicts_least_recent(monkeypatch):
+    cache = MembershipCache(max_size=2)
+    cache.set(1, ChatMembers(2, 1))
+    cache.set(2, ChatMembers(3, 1))
+    assert cache.get(1) == (True, ChatMembers(2, 1))
+
+    cache.set(3, ChatMembers(4, 1))
+
+    assert cache.get(2) == (False, None)
+    assert cache.get(1)[0] and cache.get(3)[0]
+
+    monkeypatch.setattr(membership.time, "monotonic", lambda: float("inf"))
+    assert cache.get(1) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_second_check_skips_db(db_session, chat, queries):
+    assert await is_member(chat, 2, db_session) is True
+    assert len(queries) == 1
+
+    assert await is_member(chat, 1, db_session) is True
+    assert await is_member(chat, 3, db_session) is False
+    await ensure_chat_member(chat, 2, db_session)
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_shared_between_workers(db_session, chat, queries, redis):
+    assert await get_chat_members(chat, db_session) == ChatMembers(buyer_id=2, seller_id=1)
+    assert await redis.get("chat_members:1") == "2:1"
+
+    # Другой воркер: пустая память, общий Redis
+    membership_cache.invalidate()
+    assert await is_member(chat, 1, db_session) is True
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_chat_cached_until_created(db_session, chat, queries, redis):
+    db_session.add(Announcement(id=2, user_id=1))
+    await db_session.commit()
+    queries.clear()
+
+    assert await is_member(2, 2, db_session) is False
+    assert await is_member(2, 2, db_session) is False
+    assert len(queries) == 1
+
+    created = await get_or_create_chat(announcement_id=2, buyer_id=2, db=db_session)
+    assert created.id == 2
+    queries.clear()
+
+    assert await is_member(2, 2, db_session) is True
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(redis):
+    membership_cache.set(7, ChatMembers(2, 1))
+    listener = asyncio.create_task(listen_membership_invalidations())
+    try:
+        await asyncio.sleep(0.1)
+        membership_cache.set(7, ChatMembers(2, 1))
+        membership_cache.set(8, ChatMembers(3, 1))
+
+        await redis.publish(membership.INVALIDATE_CHANNEL, 7)
+        for _ in range(50):
+            if not membership_cache.get(7)[0]:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        listener.cancel()
+
+    assert membership_cache.get(7) == (False, None)
+    assert membership_cache.get(8)[0]
+
+
+@pytest.mark.asyncio
+async def test_redis_down_falls_back_to_db(db_session, chat, redis):
+    from redis.exceptions import ConnectionError
+
+    with patch.object(redis, "get", side_effect=ConnectionError("down")), \
+            patch.object(redis, "set", side_effect=ConnectionError("down")), \
+            patch.object(redis, "delete", side_effect=ConnectionError("down")):
+        assert await is_member(chat, 2, db_session) is True
+        await invalidate_chat(chat)
+
+    assert membership_cache.stats()["misses"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_open_chat_uses_cached_membership(db_session, chat, queries):
+    from fastapi import HTTPException
+
+    await is_member(chat, 1, db_session)
+    queries.clear()
+
+    data = await get_chat_with_messages(chat, 1, db_session)
+    assert data["partner"]["name"] == "Buyer"
+    # Доступ из кэша: ни EXISTS по announcements, ни загрузки объявления
+    assert not any("announcements" in q for q in queries)
+
+    queries.clear()
+    with pytest.raises(HTTPException) as exc_info:
+        await get_chat_with_messages(chat, 3, db_session)
+    assert exc_info.value.status_code == 404
+    assert queries == []
+
+    buyer_view = await get_chat_with_messages(chat, 2, db_session)
+    assert buyer_view["partner"]["name"] == "Seller"
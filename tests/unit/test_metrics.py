@@ -0,0 +1,125 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from unittest.mock import AsyncMock
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+pytest.importorskip("prometheus_client")
+
+from api.v1 import metrics as metrics_api
+from api.v1.websocket import ConnectionManager
+from core import metrics
+from core.http import HttpClientRegistry
+
+
+def _sample(name: str, **labels) -> float:
+    return metrics.registry.get_sample_value(name, labels) or 0.0
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics_api.router)
+
+    @app.get("/chat/{chat_id}/messages")
+    async def messages(chat_id: int):
+        return {"chat_id": chat_id}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_http_requests_labelled_by_route_template():
+    labels = {"method": "GET", "route": "/chat/{chat_id}/messages", "status": "200"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+    unmatched_before = _sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+
+    transport = httpx.ASGITransport(app=_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for chat_id in (1, 2, 3):
+            assert (await client.get(f"/chat/{chat_id}/messages")).status_code == 200
+        assert (await client.get("/no/such/path")).status_code == 404
+        resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'route="/chat/{chat_id}/messages"' in resp.text
+    assert 'route="/chat/1/messages"' not in resp.text
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 3
+    assert _sample("http_request_duration_seconds_count", method="GET", route="unmatched",
+                   status="404") == unmatched_before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_disabled(monkeypatch):
+    monkeypatch.setattr(metrics.settings, "METRICS_ENABLED", False)
+    transport = httpx.ASGITransport(app=_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/metrics")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_db_queries_observed_by_operation():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    metrics.instrument_engine(engine)
+    # Повторная инструментализация не удваивает наблюдения
+    metrics.instrument_engine(engine)
+    before = _sample("db_query_duration_seconds_count", operation="SELECT")
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        await conn.execute(text("select 2"))
+        with pytest.raises(Exception):
+            await conn.execute(text("SELECT * FROM missing_table"))
+        await conn.execute(text("SELECT 3"))
+    await engine.dispose()
+
+    assert _sample("db_query_duration_seconds_count", operation="SELECT") == before + 3
+
+
+@pytest.mark.asyncio
+async def test_upstream_requests_and_errors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201)
+
+    registry = HttpClientRegistry()
+    registry.register("metrics-test", timeout=5, max_connections=1, transport=httpx.MockTransport(handler))
+    client = registry.get("metrics-test")
+
+    await client.post("http://up/ok")
+    with pytest.raises(httpx.ConnectError):
+        await client.get("http://up/down")
+    await registry.aclose()
+
+    assert _sample("upstream_request_duration_seconds_count", upstream="metrics-test", status="201") == 1
+    assert _sample("upstream_errors_total", upstream="metrics-test") == 1
+
+
+@pytest.mark.asyncio
+async def test_runtime_collector_reads_manager(monkeypatch):
+    manager = ConnectionManager()
+    monkeypatch.setattr(metrics_api, "get_manager", lambda: manager)
+    ws = AsyncMock()
+    await manager.connect(ws, chat_id=7)
+    await manager.broadcast(7, {"type": "message"})
+    await manager.flush()
+
+    assert _sample("ws_connections") == 1
+    assert _sample("ws_chats") == 1
+    assert _sample("ws_messages_delivered_total") == 1
+    assert _sample("thumbnail_jobs_total", result="dropped") >= 0
+    assert _sample("ws_broadcast_duration_seconds_count") >= 1
+    assert _sample("outbox_events_published_total") >= 0
+
+    manager.disconnect(ws, chat_id=7)
+    assert _sample("ws_connections") == 0
+
+
+def test_operation_label():
+    assert metrics._operation("  select 1") == "SELECT"
+    assert metrics._operation("WITH x AS (SELECT 1) SELECT * FROM x") == "WITH"
+    assert metrics._operation("BEGIN") == "OTHER"
+    assert metrics._operation("") == "OTHER"
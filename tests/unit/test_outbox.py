@@ -0,0 +1,161 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from crud.chat_service import send_message, user_channel
+from crud.outbox import add_event
+from models.announcement import Announcement
+from models.chat import Chat
+from models.outbox import OutboxEvent
+from models.user import User
+from services.outbox import OutboxRelay
+
+
+@pytest_asyncio.fixture
+async def chat(db_session):
+    db_session.add_all([
+        User(id=1, name="Seller", email="s_ob@example.com", password="p"),
+        User(id=2, name="Buyer", email="b_ob@example.com", password="p"),
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add(Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2))
+    await db_session.commit()
+    return 1
+
+
+@pytest.fixture
+def published():
+    return []
+
+
+@pytest.fixture
+def relay(db_session, published):
+    async def publish(chat_id, event):
+        published.append((chat_id, event))
+
+    return OutboxRelay(
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+        publish=publish, batch_size=2, poll_interval=5,
+    )
+
+
+async def _events(db_session):
+    db_session.expire_all()
+    return (await db_session.execute(select(OutboxEvent).order_by(OutboxEvent.id))).scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_send_message_writes_event_in_same_transaction(db_session, chat):
+    message = await send_message(chat_id=chat, sender_id=2, db=db_session, text="привет")
+
+    event, *previews = await _events(db_session)
+    assert (event.chat_id, event.user_id, event.event_type, event.message_id) == (chat, None, "message", message.id)
+    assert event.published_at is None
+    # Превью — в личные каналы обоих участников, вне лимита подписок /ws
+    assert [(e.chat_id, e.user_id, e.event_type) for e in previews] == [
+        (chat, 2, "chat_updated"), (chat, 1, "chat_updated"),
+    ]
+    assert json.loads(previews[0].data)["last_message_text"] == "привет"
+
+
+@pytest.mark.asyncio
+async def test_send_endpoint_writes_message_and_previews(db_session, chat, client):
+    response = await client.post(f"/chat/{chat}/send", params={"user_id": 2, "text": "превью"})
+
+    assert response.status_code == 200
+    events = await _events(db_session)
+    assert [(e.chat_id, e.user_id, e.event_type) for e in events] == [
+        (chat, None, "message"), (chat, 2, "chat_updated"), (chat, 1, "chat_updated"),
+    ]
+    assert events[0].message_id == response.json()["id"]
+    assert json.loads(events[1].data)["last_message_text"] == "превью"
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_batches_once(db_session, chat, relay, published):
+    messages = [await send_message(chat_id=chat, sender_id=2, db=db_session, text=f"m{i}") for i in range(3)]
+    await add_event(db_session, chat, "chat_update", data={"title": "новое"})
+    await db_session.commit()
+
+    batches = []
+    while count := await relay.publish_pending():
+        batches.append(count)
+    # По событию message и два chat_updated на сообщение, плюс chat_update
+    assert batches == [2, 2, 2, 2, 2]
+
+    event_ids = [event["event_id"] for _, event in published]
+    assert event_ids == sorted(set(event_ids))
+    in_chat = [event for chat_id, event in published if chat_id == chat]
+    assert [event["data"]["id"] for event in in_chat[:3]] == [m.id for m in messages]
+    assert in_chat[0]["data"]["message_text"] == "m0"
+    assert in_chat[3] == {"type": "chat_update", "event_id": event_ids[-1], "data": {"title": "новое"}}
+    # Превью уходят по user_id в личные каналы, а не в канал чата
+    assert {channel for channel, _ in published} == {chat, user_channel(1), user_channel(2)}
+    assert all(event.published_at is not None for event in await _events(db_session))
+    assert relay.stats() == {"published": 10, "batches": 5, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_failed_publish_is_retried(db_session, chat, relay, published):
+    await send_message(chat_id=chat, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=chat, sender_id=2, db=db_session, text="b")
+    publish = relay.publish
+    calls = 0
+
+    async def flaky(chat_id, event):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise ConnectionError("broker down")
+        await publish(chat_id, event)
+
+    relay.publish = flaky
+    with pytest.raises(ConnectionError):
+        await relay.publish_pending()
+    # Первое событие помечено, остальные остались в очереди
+    assert [e.published_at is not None for e in await _events(db_session)] == [True] + [False] * 5
+
+    while await relay.publish_pending():
+        pass
+    assert [event["data"]["message_text"] for _, event in published if event["type"] == "message"] == ["a", "b"]
+    assert len(published) == 6
+
+
+@pytest.mark.asyncio
+async def test_wake_publishes_without_waiting_for_poll(db_session, chat, relay, published):
+    await relay.start()
+    try:
+        # Первый проход пустой, дальше relay ждёт пробуждения (poll_interval=5)
+        await asyncio.sleep(0.05)
+        await send_message(chat_id=chat, sender_id=2, db=db_session, text="сразу")
+        relay.wake()
+        for _ in range(100):
+            if published:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await relay.stop()
+
+    assert [event["data"]["message_text"] for _, event in published if event["type"] == "message"] == ["сразу"]
+    assert not relay.running
+
+
+@pytest.mark.asyncio
+async def test_cleanup_removes_old_published(db_session, chat, relay):
+    old = datetime.utcnow() - timedelta(days=30)
+    db_session.add_all([
+        OutboxEvent(chat_id=chat, event_type="message", created_at=old, published_at=old),
+        OutboxEvent(chat_id=chat, event_type="message", created_at=old, published_at=None),
+        OutboxEvent(chat_id=chat, event_type="message", created_at=old, published_at=datetime.utcnow()),
+    ])
+    await db_session.commit()
+
+    assert await relay.cleanup() == 1
+    assert [e.published_at is None for e in await _events(db_session)] == [True, False]
@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from core.config import settings
+from services import prompts
+from services.prompts import (
+    PROMPT_INVALIDATE_CHANNEL, PROMPT_KEY, listen_prompt_invalidations, prompt_cache, read_prompt, write_prompt,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    prompt_cache.invalidate()
+    yield
+    prompt_cache.invalidate()
+
+
+@pytest.fixture
+def redis(tmp_path, monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(settings, "SUPPORT_PROMPT_PATH", str(tmp_path / "prompt.txt"))
+    with patch("services.prompts.get_async_redis", return_value=client):
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_steady_state_read_skips_redis(redis):
+    await redis.set(PROMPT_KEY, "v1")
+
+    original_get = redis.get
+    calls = []
+
+    async def counting_get(key):
+        calls.append(key)
+        return await original_get(key)
+
+    with patch.object(redis, "get", side_effect=counting_get):
+        results = await asyncio.gather(*(read_prompt() for _ in range(20)))
+        results.append(await read_prompt())
+
+    assert set(results) == {"v1"}
+    # Параллельные промахи схлопываются в одно чтение Redis
+    assert calls == [PROMPT_KEY]
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry_reloads(redis, monkeypatch):
+    await redis.set(PROMPT_KEY, "v1")
+    assert await read_prompt() == "v1"
+
+    await redis.set(PROMPT_KEY, "v2")
+    assert await read_prompt() == "v1"
+
+    monkeypatch.setattr(prompts.time, "monotonic", lambda: prompt_cache.expires_at + 1)
+    assert await read_prompt() == "v2"
+
+
+@pytest.mark.asyncio
+async def test_write_refreshes_local_copy(redis):
+    await redis.set(PROMPT_KEY, "v1")
+    assert await read_prompt() == "v1"
+
+    await write_prompt("v2")
+
+    assert await read_prompt() == "v2"
+    assert await redis.get("support_prompt:version") == "1"
+
+
+@pytest.mark.asyncio
+async def test_other_worker_update_propagates(redis):
+    await redis.set(PROMPT_KEY, "v1")
+    listener = asyncio.create_task(listen_prompt_invalidations())
+    try:
+        await asyncio.sleep(0.05)
+        assert await read_prompt() == "v1"
+
+        # Другой воркер записал промпт и опубликовал версию
+        await redis.set(PROMPT_KEY, "v2")
+        await redis.publish(PROMPT_INVALIDATE_CHANNEL, 7)
+
+        deadline = asyncio.get_running_loop().time() + 1.0
+        while await read_prompt() != "v2":
+            assert asyncio.get_running_loop().time() < deadline, "обновление не дошло за секунду"
+            await asyncio.sleep(0.01)
+        assert prompt_cache.version == 7
+    finally:
+        listener.cancel()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_not_overwritten(redis):
+    await redis.set(PROMPT_KEY, "old")
+    original_get = redis.get
+
+    async def slow_get(key):
+        value = await original_get(key)
+        # Пока читали, промпт поменяли
+        prompt_cache.invalidate(1)
+        return value
+
+    with patch.object(redis, "get", side_effect=slow_get):
+        assert await read_prompt() == "old"
+
+    await redis.set(PROMPT_KEY, "new")
+    assert await read_prompt() == "new"
+
+
+@pytest.mark.asyncio
+async def test_stale_version_keeps_local_copy(redis):
+    await write_prompt("v1")
+    assert prompt_cache.version == 1
+    assert await read_prompt() == "v1"
+
+    # Эхо своей записи и опоздавшее сообщение копию не сбрасывают
+    assert prompt_cache.invalidate(1) is False
+    assert prompt_cache.invalidate(0) is False
+    assert prompt_cache.get() == "v1"
+
+    assert prompt_cache.invalidate(2) is True
+    assert prompt_cache.get() is None and prompt_cache.version == 2
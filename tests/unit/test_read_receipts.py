@@ -0,0 +1,219 @@
+import json
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from crud.chat_service import get_chat_with_messages, get_message_page, mark_read, message_is_read, send_message
+from models.announcement import Announcement
+from models.chat import Chat
+from models.chat_participant import ChatParticipant
+from models.messages import Message
+from models.outbox import OutboxEvent
+from models.user import User
+from services import receipts as receipts_module
+from services import unread as unread_counters
+from services.receipts import ReadReceiptBuffer
+
+
+@pytest.fixture
+def redis():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch("services.unread.get_async_redis", return_value=client):
+        yield client
+
+
+@pytest_asyncio.fixture
+async def chats(db_session):
+    """Продавец 1 в чатах 1 (с 2) и 2 (с 3)."""
+    db_session.add_all([
+        User(id=i, name=f"U{i}", email=f"u{i}_rr@example.com", password="p") for i in range(1, 4)
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add_all([
+        Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2),
+        Chat(id=2, announcement_id=1, seller_id=1, buyer_id=3),
+    ])
+    await db_session.commit()
+
+
+@pytest_asyncio.fixture
+async def buffer(db_session, monkeypatch):
+    """Запущенный буфер с интервалом, который в тесте не наступит."""
+    woken = []
+    buffer = ReadReceiptBuffer(
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+        flush_interval=3600, on_flush=lambda: woken.append(True),
+    )
+    buffer.woken = woken
+    await buffer.start()
+    monkeypatch.setattr(receipts_module, "read_receipts", buffer)
+    yield buffer
+    await buffer.stop()
+
+
+async def _read_flags(db_session) -> dict[int, bool]:
+    db_session.expire_all()
+    rows = (await db_session.execute(select(Message.id, message_is_read()))).all()
+    return {message_id: bool(is_read) for message_id, is_read in rows}
+
+
+async def _read_events(db_session) -> list[dict]:
+    rows = (await db_session.execute(
+        select(OutboxEvent.data).where(OutboxEvent.event_type == "read").order_by(OutboxEvent.id)
+    )).scalars().all()
+    return [json.loads(data) for data in rows]
+
+
+def test_mark_without_running_buffer():
+    assert ReadReceiptBuffer(flush_interval=1).mark(1, 1, 5) is False
+
+
+@pytest.mark.asyncio
+async def test_disabled_interval_never_starts():
+    buffer = ReadReceiptBuffer(flush_interval=0)
+    await buffer.start()
+    assert not buffer.running and buffer.mark(1, 1, 5) is False
+
+
+@pytest.mark.asyncio
+async def test_marks_coalesce_into_one_write(db_session, chats, buffer, redis):
+    for text in ("a", "b", "c"):
+        await send_message(chat_id=1, sender_id=2, db=db_session, text=text)
+    await send_message(chat_id=2, sender_id=3, db=db_session, text="d")
+    await send_message(chat_id=1, sender_id=1, db=db_session, text="свой")
+
+    for message_id in (1, 3, 2):
+        assert buffer.mark(1, 1, message_id)
+    buffer.mark(2, 1, 4)
+    assert buffer.pending == 2
+    # До записи база не тронута
+    assert not any((await _read_flags(db_session)).values())
+
+    assert await buffer.flush() == 2
+
+    assert await _read_flags(db_session) == {1: True, 2: True, 3: True, 4: True, 5: False}
+    assert await _read_events(db_session) == [
+        {"chat_id": 1, "reader_id": 1, "up_to_id": 3},
+        {"chat_id": 2, "reader_id": 1, "up_to_id": 4},
+    ]
+    assert await unread_counters.get_counters(1) == {"total": 0, "chats": {}}
+    assert await unread_counters.get_counters(2) == {"total": 1, "chats": {1: 1}}
+    assert buffer.woken == [True]
+    assert buffer.stats() == {"received": 4, "written": 2, "flushes": 1, "failed": 0, "pending": 0}
+
+    # Повторная отметка ничего не меняет и событий не пишет
+    buffer.mark(1, 1, 3)
+    assert await buffer.flush() == 0
+    assert len(await _read_events(db_session)) == 2
+
+
+@pytest.mark.asyncio
+async def test_partial_watermark_decrements_counter(db_session, chats, redis):
+    for text in ("a", "b", "c"):
+        await send_message(chat_id=1, sender_id=2, db=db_session, text=text)
+
+    read = await mark_read(db_session, {(1, 1): 2})
+    await db_session.commit()
+
+    assert read == [{"chat_id": 1, "reader_id": 1, "up_to_id": 2, "count": 2}]
+    await unread_counters.decrement(1, 1, 2)
+    assert await unread_counters.get_counters(1) == {"total": 1, "chats": {1: 1}}
+
+
+@pytest.mark.asyncio
+async def test_marking_backlog_writes_one_row(db_session, chats, redis):
+    for i in range(30):
+        await send_message(chat_id=1, sender_id=2, db=db_session, text=f"m{i}")
+    statements = []
+
+    def collect(*args):
+        statements.append(args[2])
+
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", collect)
+    try:
+        read = await mark_read(db_session, {(1, 1): 30})
+        await db_session.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", collect)
+
+    assert read == [{"chat_id": 1, "reader_id": 1, "up_to_id": 30, "count": 30}]
+    writes = [s.split()[:3] for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE"))]
+    assert writes == [["INSERT", "INTO", "chat_participants"], ["INSERT", "INTO", "outbox_events"]]
+    assert all((await _read_flags(db_session)).values())
+
+    # Следующий сдвиг — UPDATE той же строки
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="ещё")
+    assert (await mark_read(db_session, {(1, 1): 31}))[0]["count"] == 1
+    await db_session.commit()
+    participant = await db_session.get(ChatParticipant, (1, 1))
+    assert participant.last_read_message_id == 31
+
+
+@pytest.mark.asyncio
+async def test_watermark_never_runs_ahead_of_chat(db_session, chats, redis):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=2, sender_id=3, db=db_session, text="чужой чат")
+
+    read = await mark_read(db_session, {(1, 1): 10**9})
+    await db_session.commit()
+    assert read == [{"chat_id": 1, "reader_id": 1, "up_to_id": 1, "count": 1}]
+    # Назад watermark не двигается
+    assert await mark_read(db_session, {(1, 1): 1}) == []
+
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="после отметки")
+    page = await get_message_page(chat_id=1, db=db_session)
+    assert [m["is_read"] for m in page["messages"]] == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_is_read_of_own_messages_follows_partner(db_session, chats, redis):
+    await send_message(chat_id=1, sender_id=1, db=db_session, text="мой")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="ответ")
+
+    await get_chat_with_messages(chat_id=1, user_id=2, db=db_session)
+
+    seller_view = await get_message_page(chat_id=1, db=db_session)
+    assert [(m["sender_id"], m["is_read"]) for m in seller_view["messages"]] == [(1, True), (2, False)]
+
+
+@pytest.mark.asyncio
+async def test_open_chat_goes_through_buffer(db_session, chats, buffer, redis):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="b")
+
+    chat = await get_chat_with_messages(chat_id=1, user_id=1, db=db_session)
+
+    # Ответ уже видит сообщения прочитанными, запись — пачкой позже
+    assert [m["is_read"] for m in chat["messages"]] == [True, True]
+    assert buffer.pending == 1
+    assert not any((await _read_flags(db_session)).values())
+
+    await buffer.stop()
+    assert all((await _read_flags(db_session)).values())
+    assert await unread_counters.get_counters(1) == {"total": 0, "chats": {}}
+
+
+@pytest.mark.asyncio
+async def test_open_chat_endpoint_marks_incoming_read(db_session, chats, redis, client):
+    for text in ("first", "second"):
+        await client.post("/chat/1/send", params={"user_id": 2, "text": text})
+
+    response = await client.get("/chat/1", params={"user_id": 1})
+
+    assert response.status_code == 200
+    messages = response.json()["messages"]
+    assert [m["is_read"] for m in messages] == [True, True]
+    db_session.expire_all()
+    watermark = (await db_session.execute(
+        select(ChatParticipant.last_read_message_id).where(ChatParticipant.chat_id == 1, ChatParticipant.user_id == 1)
+    )).scalar_one()
+    assert watermark == messages[-1]["id"]
+    assert await _read_events(db_session) == [{"chat_id": 1, "reader_id": 1, "up_to_id": messages[-1]["id"]}]
@@ -0,0 +1,175 @@
+import io
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from core.config import settings
+from core.pocketbase_client import PocketBaseClient
+from core.storage import (
+    LocalStorage, PocketBaseStorage, S3Storage, StoredFile,
+    create_storage_backend, make_key,
+)
+
+
+def test_make_key_sanitizes_filename():
+    key = make_key("../../etc/пароль дня.txt", prefix="chats/1/")
+    chats, chat_id, uid, name = key.split("/")
+    assert (chats, chat_id) == ("chats", "1")
+    assert len(uid) == 32
+    assert name == "пароль_дня.txt"
+    assert make_key(None).endswith("/file")
+    assert make_key("..").endswith("/file")
+
+
+def test_create_storage_backend_by_setting():
+    with patch.object(settings, "STORAGE_BACKEND", "local"):
+        assert isinstance(create_storage_backend(), LocalStorage)
+    with patch.object(settings, "STORAGE_BACKEND", "ftp"):
+        with pytest.raises(ValueError):
+            create_storage_backend()
+
+
+@pytest.mark.asyncio
+async def test_local_storage_roundtrip(tmp_path):
+    storage = LocalStorage(tmp_path, "/files/")
+
+    stored = await storage.upload(io.BytesIO(b"data"), "a.txt")
+    assert stored.url == f"/files/{stored.key}"
+    assert (tmp_path / stored.key).read_bytes() == b"data"
+
+    await storage.delete(stored.key)
+    assert not (tmp_path / stored.key).exists()
+    # Повторное удаление не падает
+    await storage.delete(stored.key)
+
+
+@pytest.mark.asyncio
+async def test_local_storage_rejects_traversal(tmp_path):
+    storage = LocalStorage(tmp_path / "root")
+    with pytest.raises(ValueError):
+        await storage.upload(b"x", "a.txt", key="../outside.txt")
+    assert not (tmp_path / "outside.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_pocketbase_storage_upload_and_delete():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.path))
+        if request.url.path.endswith("auth-with-password"):
+            return httpx.Response(200, json={"token": "t"})
+        if request.method == "POST":
+            return httpx.Response(200, json={"id": "rec1", "field": "doc.pdf"})
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    storage = PocketBaseStorage(PocketBaseClient(client))
+
+    stored = await storage.upload(b"pdf", "doc.pdf", "application/pdf")
+    assert stored.key == "rec1/doc.pdf"
+    assert stored.url.endswith(f"/api/files/{settings.POCKETBASE_COLLECTION}/rec1/doc.pdf")
+
+    # 404 при удалении — запись уже удалена, ошибки нет
+    await storage.delete(stored.key)
+    assert requests[-1] == ("DELETE", f"/api/collections/{settings.POCKETBASE_COLLECTION}/records/rec1")
+    await client.aclose()
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.uploads = []
+        self.deleted = []
+
+    async def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        chunks = []
+        while chunk := await fileobj.read(4):
+            chunks.append(chunk)
+        self.uploads.append((bucket, key, b"".join(chunks), ExtraArgs, Config))
+
+    async def delete_object(self, Bucket, Key):
+        self.deleted.append((Bucket, Key))
+
+
+class FakeSession:
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.s3 = FakeS3Client()
+
+    @asynccontextmanager
+    async def _client(self):
+        self.opened += 1
+        try:
+            yield self.s3
+        finally:
+            self.closed += 1
+
+    def client(self, **kwargs):
+        return self._client()
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_reuses_client():
+    session = FakeSession()
+    storage = S3Storage("bucket", "http://s3", "http://cdn/", session=session)
+
+    first = await storage.upload(b"hello world", "a.txt", "text/plain")
+    second = await storage.upload(io.BytesIO(b"second"), "b.txt", key="fixed/b.txt")
+    await storage.delete(first.key)
+
+    assert session.opened == 1
+    assert second == StoredFile("fixed/b.txt", "http://cdn/fixed/b.txt")
+    bucket, key, body, extra, config = session.s3.uploads[0]
+    assert (bucket, key, body) == ("bucket", first.key, b"hello world")
+    assert extra == {"ContentType": "text/plain"}
+    assert config.max_concurrency == settings.S3_MULTIPART_CONCURRENCY
+    assert config.max_io_queue_size == 1
+    assert storage.upload_memory_bound() == settings.S3_MULTIPART_CHUNK_SIZE * (settings.S3_MULTIPART_CONCURRENCY + 2)
+    assert session.s3.deleted == [("bucket", first.key)]
+
+    await storage.stop()
+    assert session.closed == 1
+
+
+@pytest.mark.asyncio
+async def test_s3_presigned_put_uses_public_endpoint():
+    # Подпись считается локально, сеть не нужна
+    storage = S3Storage("bucket", "http://minio:9000", presign_endpoint_url="https://files.example.com")
+
+    ticket = await storage.presign_upload("chats/1/2/abc/a.png", "image/png", 1024)
+    await storage.stop()
+
+    assert ticket["method"] == "PUT"
+    assert ticket["url"].startswith("https://files.example.com/bucket/chats/1/2/abc/a.png?")
+    assert "X-Amz-Signature=" in ticket["url"]
+    assert ticket["headers"] == {"Content-Type": "image/png"}
+    assert ticket["expires_in"] == settings.PRESIGNED_URL_EXPIRES
+
+
+@pytest.mark.asyncio
+async def test_s3_presigned_multipart(monkeypatch):
+    monkeypatch.setattr(settings, "PRESIGNED_MULTIPART_THRESHOLD", 10)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 4)
+    session = FakeSession()
+    calls = []
+
+    async def create_multipart_upload(**kwargs):
+        calls.append(kwargs)
+        return {"UploadId": "up1"}
+
+    async def generate_presigned_url(operation, Params, ExpiresIn):
+        return f"http://s3/{operation}/{Params.get('PartNumber')}"
+
+    session.s3.create_multipart_upload = create_multipart_upload
+    session.s3.generate_presigned_url = generate_presigned_url
+    storage = S3Storage("bucket", "http://s3", session=session)
+
+    ticket = await storage.presign_upload("k", "video/mp4", 11)
+
+    assert calls == [{"Bucket": "bucket", "Key": "k", "ContentType": "video/mp4"}]
+    assert ticket["upload_id"] == "up1"
+    assert ticket["part_size"] == 4
+    assert [p["url"] for p in ticket["parts"]] == [f"http://s3/upload_part/{n}" for n in (1, 2, 3)]
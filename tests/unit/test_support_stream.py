@@ -0,0 +1,154 @@
+import json
+import pytest
+import httpx
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from models.support import SupportChat, SenderType
+from services.grok import stream_grok_model
+from services.support import stream_support_reply
+
+GROK_URL = "http://grok.test/v1/chat/completions"
+
+
+def _chunk(content: str) -> bytes:
+    body = {"choices": [{"index": 0, "delta": {"content": content}}]}
+    return f"data: {json.dumps(body)}\n\n".encode()
+
+
+class FakeStream(httpx.AsyncByteStream):
+    """Тело ответа OpenAI-совместимого API в формате SSE; помнит, закрыто ли."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def grok():
+    """Фейковый Grok: отвечает потоком из трёх фрагментов."""
+    state = {"requests": [], "stream": None}
+
+    def handler(request: httpx.Request):
+        state["requests"].append(json.loads(request.content))
+        state["stream"] = FakeStream([
+            b": keep-alive\n\n", _chunk("При"), _chunk("вет"), _chunk("!"), b"data: [DONE]\n\n",
+        ])
+        return httpx.Response(200, stream=state["stream"], headers={"content-type": "text/event-stream"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with patch.object(settings, "GROK_API_URL", GROK_URL), \
+            patch("services.grok.read_prompt", new_callable=AsyncMock, return_value="system prompt"):
+        state["client"] = client
+        yield state
+
+
+@pytest.mark.asyncio
+async def test_stream_grok_model_yields_deltas(grok):
+    deltas = [d async for d in stream_grok_model("Привет", user_id=1, client=grok["client"])]
+
+    assert deltas == ["При", "вет", "!"]
+    assert grok["requests"][0]["stream"] is True
+    assert grok["requests"][0]["messages"][-1] == {"role": "user", "content": "Привет"}
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_closes_upstream(grok):
+    stream = stream_grok_model("Привет", user_id=1, client=grok["client"])
+    assert await stream.__anext__() == "При"
+
+    await stream.aclose()
+
+    assert grok["stream"].closed
+
+
+def _grok_stub(*deltas, fail: bool = False):
+    async def fake(message, user_id=None, history=None):
+        for delta in deltas:
+            yield delta
+        if fail:
+            raise httpx.ConnectError("upstream down")
+    return fake
+
+
+async def _support_messages(db_session):
+    result = await db_session.execute(select(SupportChat).order_by(SupportChat.id))
+    return [(m.sender, m.message) for m in result.scalars().all()]
+
+
+@pytest.mark.asyncio
+async def test_reply_persisted_after_completion(db_session):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    with patch("services.support.stream_grok_model", _grok_stub("Да", ", конечно")):
+        deltas = [d async for d in stream_support_reply(7, "Можно?", session_factory=factory)]
+
+    assert deltas == ["Да", ", конечно"]
+    assert await _support_messages(db_session) == [
+        (SenderType.user, "Можно?"),
+        (SenderType.assistant, "Да, конечно"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_interrupted_reply_not_persisted(db_session):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    with patch("services.support.stream_grok_model", _grok_stub("Да", ", конечно")):
+        stream = stream_support_reply(7, "Можно?", session_factory=factory)
+        await stream.__anext__()
+        await stream.aclose()
+
+    assert await _support_messages(db_session) == [(SenderType.user, "Можно?")]
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event = "message"
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_sse_endpoint(client, db_session):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    with patch("services.support.AsyncSessionLocal", factory), \
+            patch("services.support.stream_grok_model", _grok_stub("Здравствуйте", "!")):
+        response = await client.post("/support/chat/stream", json={"user_id": 7, "message": "Привет"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert _events(response.text) == [
+        ("message", {"delta": "Здравствуйте"}),
+        ("message", {"delta": "!"}),
+        ("done", {"reply": "Здравствуйте!"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sse_endpoint_reports_model_error(client, db_session):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    with patch("services.support.AsyncSessionLocal", factory), \
+            patch("services.support.stream_grok_model", _grok_stub("Част", fail=True)):
+        response = await client.post("/support/chat/stream", json={"user_id": 7, "message": "Привет"})
+
+    events = _events(response.text)
+    assert events[0] == ("message", {"delta": "Част"})
+    assert events[-1][0] == "error"
+    assert await _support_messages(db_session) == [(SenderType.user, "Привет")]
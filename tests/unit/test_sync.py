@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+
+from core.config import settings
+from crud.chat_service import get_chat_with_messages, get_or_create_chat, send_message
+from crud.outbox import add_events
+from crud.sync import get_changes
+from models.announcement import Announcement
+from models.chat import Chat
+from models.messages import Message
+from models.outbox import OutboxEvent
+from models.user import User
+
+
+@pytest_asyncio.fixture
+async def chats(db_session):
+    """Продавец 1 в двух чатах (с покупателями 2 и 3) и чужой чат 3–4."""
+    db_session.add_all([
+        User(id=i, name=f"U{i}", email=f"u{i}_sync@example.com", password="p") for i in range(1, 5)
+    ])
+    await db_session.commit()
+    db_session.add_all([Announcement(id=1, user_id=1), Announcement(id=2, user_id=4)])
+    await db_session.commit()
+    db_session.add_all([
+        Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2),
+        Chat(id=2, announcement_id=1, seller_id=1, buyer_id=3),
+        Chat(id=3, announcement_id=2, seller_id=4, buyer_id=3),
+    ])
+    await db_session.commit()
+
+
+@pytest.fixture(autouse=True)
+def no_lag(monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_CURSOR_LAG", 0)
+
+
+@pytest.mark.asyncio
+async def test_without_cursor_returns_head_and_reset(db_session, chats):
+    assert await get_changes(db_session, user_id=1) == {"cursor": 0, "reset": True}
+
+    # Пустой outbox: курсор 0 действителен, а не вечный reset
+    empty = await get_changes(db_session, user_id=1, cursor=0)
+    assert empty["cursor"] == 0 and "reset" not in empty
+
+    # message в канал чата и chat_updated в личные каналы обоих участников
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    assert await get_changes(db_session, user_id=1) == {"cursor": 3, "reset": True}
+
+
+@pytest.mark.asyncio
+async def test_delta_across_chats(db_session, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    cursor = (await get_changes(db_session, user_id=1))["cursor"]
+
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="привет")
+    await send_message(chat_id=2, sender_id=3, db=db_session, text="ещё")
+    await send_message(chat_id=3, sender_id=3, db=db_session, text="чужой чат")
+    await get_chat_with_messages(chat_id=1, user_id=1, db=db_session)
+
+    changes = await get_changes(db_session, user_id=1, cursor=cursor)
+
+    assert [m["message_text"] for m in changes["messages"]] == ["привет", "ещё"]
+    assert changes["reads"] == [{"chat_id": 1, "reader_id": 1, "up_to_id": 2}]
+    previews = {c["id"]: c for c in changes["chats"]}
+    assert set(previews) == {1, 2}
+    assert previews[1]["unread_count"] == 0 and previews[2]["unread_count"] == 1
+    assert previews[2]["last_message_text"] == "ещё"
+    assert changes["has_more"] is False
+
+    again = await get_changes(db_session, user_id=1, cursor=changes["cursor"])
+    assert again["messages"] == [] and again["reads"] == [] and again["chats"] == []
+    assert again["cursor"] == changes["cursor"]
+
+
+@pytest.mark.asyncio
+async def test_pages_with_has_more(db_session, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    cursor = (await get_changes(db_session, user_id=1))["cursor"]
+    for i in range(5):
+        await send_message(chat_id=1, sender_id=2, db=db_session, text=f"m{i}")
+
+    seen = []
+    while True:
+        changes = await get_changes(db_session, user_id=1, cursor=cursor, limit=2)
+        seen += [m["message_text"] for m in changes["messages"]]
+        cursor = changes["cursor"]
+        if not changes["has_more"]:
+            break
+
+    assert seen == [f"m{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_cursor_stays_behind_recent_events(db_session, chats, monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_CURSOR_LAG", 60)
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    await db_session.execute(
+        update(OutboxEvent).values(created_at=datetime.utcnow() - timedelta(minutes=5))
+    )
+    await db_session.commit()
+    cursor = (await get_changes(db_session, user_id=1))["cursor"]
+
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="свежее")
+    changes = await get_changes(db_session, user_id=1, cursor=cursor)
+
+    # Свежее событие отдаётся, но курсор за него не заходит — придёт повторно
+    assert [m["message_text"] for m in changes["messages"]] == ["свежее"]
+    assert changes["cursor"] == cursor
+
+
+@pytest.mark.asyncio
+async def test_full_page_cursor_stops_at_recent_events(db_session, chats, monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_CURSOR_LAG", 60)
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="старое")
+    await db_session.execute(
+        update(OutboxEvent).values(created_at=datetime.utcnow() - timedelta(minutes=5))
+    )
+    await db_session.commit()
+    # Курсор после событий "start": message и chat_updated продавца (id 1 и 3)
+    cursor = 3
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="свежее")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="ещё свежее")
+
+    # Страница полная: старое (message, chat_updated) и свежее message
+    changes = await get_changes(db_session, user_id=1, cursor=cursor, limit=3)
+
+    assert [m["message_text"] for m in changes["messages"]] == ["старое", "свежее"]
+    assert changes["cursor"] == 6
+    assert changes["has_more"] is False
+
+
+@pytest.mark.asyncio
+async def test_pruned_cursor_requires_reset(db_session, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="b")
+    await db_session.execute(OutboxEvent.__table__.delete().where(OutboxEvent.id == 1))
+    await db_session.commit()
+
+    assert await get_changes(db_session, user_id=1, cursor=1) == {"cursor": 6, "reset": True}
+
+
+@pytest.mark.asyncio
+async def test_sync_endpoint(client, db_session, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    first = (await client.get("/chat/sync", params={"user_id": 1})).json()
+    assert first["reset"] is True and first["messages"] == []
+
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="новое")
+    resp = await client.get("/chat/sync", params={"user_id": 1, "cursor": first["cursor"]})
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["reset"] is False
+    assert [m["message_text"] for m in body["messages"]] == ["новое"]
+    assert body["chats"][0]["id"] == 1 and body["chats"][0]["unread_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_new_empty_chat_in_previews(db_session, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="start")
+    cursor = (await get_changes(db_session, user_id=1))["cursor"]
+
+    chat = await get_or_create_chat(announcement_id=1, buyer_id=4, db=db_session)
+    changes = await get_changes(db_session, user_id=1, cursor=cursor)
+
+    assert [c["id"] for c in changes["chats"]] == [chat.id]
+    assert changes["messages"] == []
+    # Чужой пользователь о чате не узнаёт
+    assert (await get_changes(db_session, user_id=3, cursor=cursor))["chats"] == []
+
+
+@pytest.mark.asyncio
+async def test_message_update_returns_updated_message(db_session, chats):
+    message = await send_message(chat_id=1, sender_id=2, db=db_session, text="фото", message_type="image")
+    cursor = (await get_changes(db_session, user_id=1))["cursor"]
+
+    # Превью готово позже — так его записывает ThumbnailWorker
+    await db_session.execute(update(Message).where(Message.id == message.id).values(thumbnail_url="/t.webp"))
+    await add_events(db_session, [(1, "message_update", {"id": message.id, "chat_id": 1, "thumbnail_url": "/t.webp"}, None)])
+    await db_session.commit()
+
+    changes = await get_changes(db_session, user_id=1, cursor=cursor)
+
+    assert [(m["id"], m["thumbnail_url"]) for m in changes["messages"]] == [(message.id, "/t.webp")]
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.config import settings
+from core.storage import LocalStorage
+from crud import attachments
+from models.announcement import Announcement
+from models.attachment import Attachment
+from models.chat import Chat
+from models.messages import Message
+from models.outbox import OutboxEvent
+from models.user import User
+from services import thumbnails
+from services.thumbnails import ThumbnailWorker, render_thumbnail
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _jpeg(width=1200, height=800, color=(200, 30, 30)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_render_thumbnail(tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(_jpeg())
+
+    thumbnail = render_thumbnail(str(source), 320, 75)
+
+    with Image.open(io.BytesIO(thumbnail.data)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (320, 213)
+    if thumbnails.BLURHASH_AVAILABLE:
+        assert isinstance(thumbnail.blurhash, str) and len(thumbnail.blurhash) > 6
+
+
+@pytest_asyncio.fixture
+async def worker(db_session):
+    woken = []
+    worker = ThumbnailWorker(
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+        executor=ThreadPoolExecutor(1), workers=1, queue_size=2,
+    )
+    await worker.start(wake=lambda: woken.append(True))
+    worker.woken = woken
+    yield worker
+    await worker.stop()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(tmp_path, "/files")
+    with patch.object(attachments, "get_storage", return_value=storage), \
+            patch.object(thumbnails, "get_storage", return_value=storage):
+        yield storage
+
+
+async def _seed_chat(db_session):
+    db_session.add_all([
+        User(id=1, name="Seller", email="s_th@example.com", password="p"),
+        User(id=2, name="Buyer", email="b_th@example.com", password="p"),
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add(Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2))
+    await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_send_image_builds_thumbnail_in_background(db_session, client, worker, storage, tmp_path):
+    from api.v1 import chat as chat_api
+    await _seed_chat(db_session)
+    files = {"file": ("photo.jpg", _jpeg(), "image/jpeg")}
+
+    with patch.object(chat_api, "get_thumbnail_worker", return_value=worker):
+        response = await client.post("/chat/1/send", params={"user_id": 2}, files=files)
+        assert response.status_code == 200
+        assert response.json()["thumbnail_url"] is None
+        await worker.join()
+
+        # Повторная отправка того же фото получает готовое превью сразу
+        again = await client.post("/chat/1/send", params={"user_id": 1}, files=files)
+
+    attachment = (await db_session.execute(select(Attachment))).scalar_one()
+    await db_session.refresh(attachment)
+    assert attachment.thumbnail_url == f"/files/{attachment.thumbnail_key}"
+    assert (tmp_path / attachment.thumbnail_key).read_bytes()[8:12] == b"WEBP"
+
+    # Событие записано в outbox вместе с превью, relay разбужен
+    [event] = (await db_session.execute(
+        select(OutboxEvent).where(OutboxEvent.event_type == "message_update")
+    )).scalars().all()
+    data = json.loads(event.data)
+    assert event.chat_id == 1 and data["id"] == response.json()["id"]
+    assert data["thumbnail_url"] == attachment.thumbnail_url
+    assert again.json()["thumbnail_url"] == attachment.thumbnail_url
+    assert again.json()["blurhash"] == attachment.blurhash
+    assert worker.woken == [True] and worker.processed == 1
+
+
+@pytest.mark.asyncio
+async def test_late_message_gets_existing_thumbnail(db_session, worker, storage, tmp_path):
+    await _seed_chat(db_session)
+    db_session.add(Attachment(id=7, size=3, storage_key="a/photo.jpg", url="/files/a/photo.jpg", refcount=2,
+                              thumbnail_key="thumbnails/ready.webp", thumbnail_url="/files/thumbnails/ready.webp",
+                              blurhash="LEHV6n"))
+    await db_session.commit()
+    # Второе сообщение взяло вложение, пока превью первой задачи ещё не было видно
+    db_session.add_all([
+        Message(id=1, chat_id=1, sender_id=2, message_type="image", attachment_id=7,
+                thumbnail_url="/files/thumbnails/ready.webp", blurhash="LEHV6n"),
+        Message(id=2, chat_id=1, sender_id=1, message_type="image", attachment_id=7),
+    ])
+    await db_session.commit()
+
+    assert await worker.schedule(7, "image", io.BytesIO(_jpeg()))
+    await worker.join()
+
+    db_session.expire_all()
+    late = await db_session.get(Message, 2)
+    assert (late.thumbnail_url, late.blurhash) == ("/files/thumbnails/ready.webp", "LEHV6n")
+    [event] = (await db_session.execute(
+        select(OutboxEvent).where(OutboxEvent.event_type == "message_update")
+    )).scalars().all()
+    assert json.loads(event.data) == {
+        "id": 2, "chat_id": 1, "thumbnail_url": "/files/thumbnails/ready.webp", "blurhash": "LEHV6n",
+    }
+    assert worker.woken == [True]
+    # Своё построенное превью лишнее и удалено
+    assert not any((tmp_path / "thumbnails").glob("*.webp"))
+
+
+@pytest.mark.asyncio
+async def test_documents_and_overflow_are_skipped(worker, monkeypatch):
+    release = asyncio.Event()
+    seen = []
+
+    async def slow_process(job):
+        seen.append(job.path)
+        await release.wait()
+
+    monkeypatch.setattr(worker, "_process", slow_process)
+
+    assert not await worker.schedule(1, "document", io.BytesIO(b"pdf"))
+    assert await worker.schedule(1, "image", io.BytesIO(b"a"))
+    await asyncio.sleep(0)  # воркер забрал первую задачу
+    assert await worker.schedule(2, "image", io.BytesIO(b"b"))
+    assert await worker.schedule(3, "image", io.BytesIO(b"c"))
+    assert not await worker.schedule(4, "image", io.BytesIO(b"d"))
+    assert worker.dropped == 1
+
+    release.set()
+    await worker.join()
+    assert len(seen) == 3
+    assert not any(os.path.exists(path) for path in seen)
+
+
+@pytest.mark.asyncio
+async def test_disabled_worker_accepts_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "THUMBNAILS_ENABLED", False)
+    worker = ThumbnailWorker()
+    await worker.start()
+
+    assert not worker.running
+    assert not await worker.schedule(1, "image", io.BytesIO(b"a"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(thumbnails.ffmpeg_path() is None, reason="нет ffmpeg")
+async def test_video_poster_frame(tmp_path):
+    video = tmp_path / "clip.mp4"
+    process = await asyncio.create_subprocess_exec(
+        thumbnails.ffmpeg_path(), "-v", "error", "-f", "lavfi", "-i", "color=c=blue:s=640x360:d=2",
+        str(video),
+    )
+    await process.wait()
+
+    frame = tmp_path / "frame.jpg"
+    assert await thumbnails.extract_poster_frame(str(video), str(frame))
+    assert render_thumbnail(str(frame), 320, 75).data
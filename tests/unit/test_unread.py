@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from core.config import settings
+from models.user import User
+from models.announcement import Announcement
+from models.chat import Chat
+from models.chat_participant import ChatParticipant
+from models.messages import Message
+from crud.chat_service import send_message, get_chat_with_messages
+from services import unread as unread_counters
+from services.unread import rebuild_unread_counters, reconcile_periodically
+
+
+@pytest.fixture
+def redis():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch("services.unread.get_async_redis", return_value=client):
+        yield client
+
+
+async def _seed_chat(db_session):
+    """Продавец id=1, покупатель id=2, чат id=1."""
+    db_session.add_all([
+        User(id=1, name="Seller", email="seller_u@example.com", password="pass", user_role_id=2),
+        User(id=2, name="Buyer", email="buyer_u@example.com", password="pass"),
+    ])
+    await db_session.commit()
+    db_session.add(Announcement(id=1, user_id=1))
+    await db_session.commit()
+    db_session.add(Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2))
+    await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_send_increments_recipient(db_session, redis):
+    await _seed_chat(db_session)
+
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="b")
+    await send_message(chat_id=1, sender_id=1, db=db_session, text="c")
+
+    assert await unread_counters.get_counters(1) == {"total": 2, "chats": {1: 2}}
+    assert await unread_counters.get_counters(2) == {"total": 1, "chats": {1: 1}}
+
+
+@pytest.mark.asyncio
+async def test_open_chat_resets_counter(db_session, redis):
+    await _seed_chat(db_session)
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+
+    await get_chat_with_messages(chat_id=1, user_id=1, db=db_session)
+
+    assert await unread_counters.get_counters(1) == {"total": 0, "chats": {}}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_fixes_drift(db_session, redis):
+    await _seed_chat(db_session)
+    db_session.add_all([
+        Message(id=1, chat_id=1, sender_id=1, message_text="z"),
+        Message(id=2, chat_id=1, sender_id=2, message_text="x"),
+        Message(id=3, chat_id=1, sender_id=2, message_text="y"),
+        # Покупатель прочитал всё, продавец — ничего
+        ChatParticipant(chat_id=1, user_id=2, last_read_message_id=3),
+    ])
+    await db_session.commit()
+    # Расхождения: лишний счётчик и счётчик несуществующего пользователя
+    await redis.hset("unread:1", mapping={1: 7, 99: 1})
+    await redis.hset("unread:42", mapping={5: 3})
+
+    users = await rebuild_unread_counters(db_session)
+
+    assert users == 1
+    assert await unread_counters.get_counters(1) == {"total": 2, "chats": {1: 2}}
+    assert await redis.exists("unread:42") == 0
+
+
+@pytest.mark.asyncio
+async def test_send_survives_redis_outage(db_session):
+    from redis.exceptions import ConnectionError
+
+    await _seed_chat(db_session)
+    broken = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch.object(broken, "hincrby", side_effect=ConnectionError("down")), \
+            patch("services.unread.get_async_redis", return_value=broken):
+        message = await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+
+    assert message.id is not None
+
+
+@pytest.mark.asyncio
+async def test_unread_endpoint(client, redis):
+    await redis.hset("unread:5", mapping={3: 2, 4: 1})
+
+    response = await client.get("/chat/unread", params={"user_id": 5})
+
+    assert response.status_code == 200
+    assert response.json() == {"total": 3, "chats": {"3": 2, "4": 1}}
+
+
+@pytest.mark.asyncio
+async def test_counters_rebuilt_on_start(db_session, redis):
+    await _seed_chat(db_session)
+    db_session.add(Message(chat_id=1, sender_id=2, message_text="x"))
+    await db_session.commit()
+    # Пустой Redis: первый деплой или потеря данных
+    await redis.flushall()
+
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    await asyncio.wait_for(reconcile_periodically(factory, interval=0), 1)
+
+    assert await unread_counters.get_counters(1) == {"total": 1, "chats": {1: 1}}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_changes_made_during_aggregate(db_session, redis, monkeypatch):
+    await _seed_chat(db_session)
+    db_session.add_all([
+        Message(id=1, chat_id=1, sender_id=2, message_text="x"),
+        Message(id=2, chat_id=1, sender_id=1, message_text="y"),
+    ])
+    await db_session.commit()
+    await redis.hset("unread:1", mapping={1: 5})
+    monkeypatch.setattr(settings, "UNREAD_REBUILD_BATCH", 1)
+    count_unread = unread_counters._count_unread
+
+    async def slow_aggregate(db):
+        counters = await count_unread(db)
+        # Пока шёл агрегат: новые сообщения продавцу и пользователю 3,
+        # которого в снимке нет
+        await unread_counters.increment(1, 1)
+        await unread_counters.increment(3, 1)
+        return counters
+
+    monkeypatch.setattr(unread_counters, "_count_unread", slow_aggregate)
+    assert await rebuild_unread_counters(db_session) == 2
+
+    assert await unread_counters.get_counters(1) == {"total": 2, "chats": {1: 2}}
+    assert await unread_counters.get_counters(2) == {"total": 1, "chats": {1: 1}}
+    assert await unread_counters.get_counters(3) == {"total": 1, "chats": {1: 1}}
+    assert await redis.exists(unread_counters.REBUILD_FLAG) == 0
+    assert [key async for key in redis.scan_iter(match="unread_tmp:*")] == []
+
+    # После сборки изменения снова идут только в живой хэш
+    await unread_counters.increment(1, 1)
+    assert await unread_counters.get_counters(1) == {"total": 3, "chats": {1: 3}}
+    assert [key async for key in redis.scan_iter(match="unread_tmp:*")] == []
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_rebuilds(redis, monkeypatch):
+    calls = []
+
+    async def rebuild(db):
+        calls.append(db)
+        await asyncio.sleep(0.01)
+        return 0
+
+    class Session:
+        async def __aenter__(self):
+            return "db"
+
+        async def __aexit__(self, *args):
+            return False
+
+    monkeypatch.setattr(unread_counters, "rebuild_unread_counters", rebuild)
+    await asyncio.gather(*(reconcile_periodically(Session, interval=0) for _ in range(3)))
+
+    assert calls == ["db"]
+    assert 0 < await redis.ttl(unread_counters.REBUILD_LOCK) <= settings.UNREAD_REBUILD_LOCK_TTL
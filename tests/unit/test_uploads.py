@@ -0,0 +1,159 @@
+import io
+import pytest
+import httpx
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI, File, UploadFile
+
+from core.config import settings
+from core.pocketbase_client import PocketBaseClient
+from models.attachment import Attachment
+from core.uploads import BodySizeLimitMiddleware, upload_size
+from models.messages import Message
+
+
+def _limited_app(limit: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_body_size=limit)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": upload_size(file)}
+
+    return app
+
+
+async def _chunks(total: int, chunk: int = 64 * 1024):
+    yield (
+        b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n"
+    )
+    sent = 0
+    while sent < total:
+        size = min(chunk, total - sent)
+        sent += size
+        yield b"x" * size
+
+
+@pytest.mark.asyncio
+async def test_body_within_limit_passes():
+    transport = httpx.ASGITransport(app=_limited_app(1024 * 1024))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/upload", files={"file": ("a.bin", b"x" * 1000)})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+
+
+@pytest.mark.asyncio
+async def test_large_content_length_rejected_upfront():
+    transport = httpx.ASGITransport(app=_limited_app(1024))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/upload", files={"file": ("a.bin", b"x" * 4096)})
+
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_streamed_body_cut_off_at_limit():
+    """Без Content-Length (chunked) лимит проверяется по мере приёма."""
+    transport = httpx.ASGITransport(app=_limited_app(256 * 1024))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(
+            "/upload",
+            content=_chunks(2 * 1024 * 1024),
+            headers={"content-type": "multipart/form-data; boundary=xyz"},
+        )
+
+    assert response.status_code == 413
+
+
+def test_upload_size_enforces_limit(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 10)
+    spool = io.BytesIO(b"x" * 11)
+    spool.seek(5)
+
+    with pytest.raises(Exception) as exc_info:
+        upload_size(UploadFile(spool, filename="a.bin"))
+    assert exc_info.value.status_code == 413
+
+    spool = io.BytesIO(b"x" * 10)
+    spool.seek(5)
+    assert upload_size(UploadFile(spool, filename="a.bin")) == 10
+    assert spool.tell() == 0
+
+
+@pytest.mark.asyncio
+async def test_pocketbase_streams_file_object(monkeypatch):
+    monkeypatch.setattr(settings, "POCKETBASE_URL", "http://pb")
+    monkeypatch.setattr(settings, "POCKETBASE_COLLECTION", "files")
+    received = {}
+
+    class RecordingFile(io.BytesIO):
+        reads = []
+
+        def read(self, size=-1):
+            self.reads.append(size)
+            return super().read(size)
+
+    def handler(request: httpx.Request):
+        if request.url.path.endswith("auth-with-password"):
+            return httpx.Response(200, json={"token": "t"})
+        received["body"] = request.read()
+        return httpx.Response(200, json={"id": "rec1", "field": "video.mp4"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    pb = PocketBaseClient(client=client)
+    payload = b"\x00\x01" * 100_000
+
+    url = await pb.upload_file(RecordingFile(payload), "video.mp4", "video/mp4")
+
+    assert url == "http://pb/api/files/files/rec1/video.mp4"
+    # Файл читается порциями, а не целиком
+    assert RecordingFile.reads and all(0 < size <= 64 * 1024 for size in RecordingFile.reads)
+    assert payload in received["body"]
+    assert b"Content-Type: video/mp4" in received["body"]
+
+
+@pytest.mark.asyncio
+async def test_send_passes_spool_to_storage(client):
+    from api.v1 import chat as chat_api
+
+    message = Message(id=1, chat_id=1, sender_id=2, message_type="video", file_url="http://pb/f")
+    uploaded = {}
+
+    async def fake_store(db, fileobj, filename, content_type=None):
+        uploaded["type"] = type(fileobj)
+        uploaded["content"] = fileobj.read()
+        uploaded["meta"] = (filename, content_type)
+        return Attachment(id=3, url="http://pb/f")
+
+    with patch.object(chat_api, "store_attachment", AsyncMock(side_effect=fake_store)), \
+            patch.object(chat_api, "ensure_chat_member", AsyncMock()) as member, \
+            patch.object(chat_api, "send_message", AsyncMock(return_value=message)) as send:
+        response = await client.post(
+            "/chat/1/send", params={"user_id": 2},
+            files={"file": ("clip.mp4", b"v" * 5000, "video/mp4")},
+        )
+
+    assert response.status_code == 200
+    assert not issubclass(uploaded["type"], (bytes, bytearray))
+    assert uploaded["content"] == b"v" * 5000
+    assert uploaded["meta"] == ("clip.mp4", "video/mp4")
+    assert send.await_args.kwargs["attachment_id"] == 3
+    assert (member.await_args.kwargs["chat_id"], member.await_args.kwargs["user_id"]) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_send_rejects_oversized_file(client, monkeypatch):
+    from api.v1 import chat as chat_api
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1000)
+    with patch.object(chat_api, "store_attachment", AsyncMock()) as store, \
+            patch.object(chat_api, "ensure_chat_member", AsyncMock()):
+        response = await client.post(
+            "/chat/1/send", params={"user_id": 2},
+            files={"file": ("clip.mp4", b"v" * 5000, "video/mp4")},
+        )
+
+    assert response.status_code == 413
+    store.assert_not_awaited()
@@ -0,0 +1,272 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from api.v1 import websocket as ws_api
+from api.v1.websocket import ConnectionManager
+from core.config import settings
+from crud.chat_service import get_or_create_chat, mark_read, message_is_read, send_message, user_channel
+from models.announcement import Announcement
+from models.chat import Chat
+from models.messages import Message
+from models.outbox import OutboxEvent
+from models.user import User
+from services import receipts as receipts_module
+from services.outbox import OutboxRelay
+from services.receipts import ReadReceiptBuffer
+
+
+class FakeSocket:
+    """Сокет в том же event loop: входящие фреймы — из очереди, исходящие — в sent."""
+
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: list[dict] = []
+        self.accepted = False
+        self.closed_with = None
+
+    async def accept(self):
+        self.accepted = True
+
+    async def receive_json(self):
+        frame = await self.incoming.get()
+        if frame is None:
+            raise WebSocketDisconnect()
+        return frame
+
+    async def send_text(self, payload: str):
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed_with = code
+
+    def of_type(self, frame_type: str) -> list[dict]:
+        return [frame for frame in self.sent if frame["type"] == frame_type]
+
+
+@pytest_asyncio.fixture
+async def manager(db_session, monkeypatch):
+    manager = ConnectionManager()
+    monkeypatch.setattr(ws_api, "manager", manager)
+    monkeypatch.setattr(ws_api, "AsyncSessionLocal", async_sessionmaker(db_session.bind, expire_on_commit=False))
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def chats(db_session):
+    """Продавец 1 в чатах 1 и 2, чужой чат 3 между 3 и 4."""
+    db_session.add_all([
+        User(id=i, name=f"U{i}", email=f"u{i}_ws@example.com", password="p") for i in range(1, 5)
+    ])
+    await db_session.commit()
+    db_session.add_all([Announcement(id=1, user_id=1), Announcement(id=2, user_id=4)])
+    await db_session.commit()
+    now = datetime.utcnow()
+    db_session.add_all([
+        Chat(id=1, announcement_id=1, seller_id=1, buyer_id=2, last_message_at=now - timedelta(hours=1)),
+        Chat(id=2, announcement_id=1, seller_id=1, buyer_id=3, last_message_at=now),
+        Chat(id=3, announcement_id=2, seller_id=4, buyer_id=3),
+    ])
+    await db_session.commit()
+
+
+async def _open(socket: FakeSocket, user_id: int, chat_id: int = None) -> asyncio.Task:
+    if chat_id is None:
+        task = asyncio.create_task(ws_api.user_websocket_endpoint(socket, user_id=user_id))
+    else:
+        task = asyncio.create_task(ws_api.websocket_endpoint(socket, chat_id=chat_id, user_id=user_id))
+    for _ in range(100):
+        if socket.sent or socket.closed_with or task.done():
+            break
+        await asyncio.sleep(0.01)
+    return task
+
+
+async def _send(manager: ConnectionManager, socket: FakeSocket, frame: dict):
+    await socket.incoming.put(frame)
+    await asyncio.sleep(0.05)
+    await manager.flush()
+
+
+async def _close(socket: FakeSocket, task: asyncio.Task):
+    await socket.incoming.put(None)
+    await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_user_socket_receives_all_chats(manager, chats):
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1)
+
+    assert socket.accepted
+    assert socket.sent[0] == {"type": "subscribed", "data": {"chats": [2, 1]}}
+    assert len(manager.connections) == 1
+
+    await manager.broadcast(1, {"type": "message", "data": {"id": 10}})
+    await manager.broadcast(2, {"type": "message", "data": {"id": 11}})
+    await manager.broadcast(3, {"type": "message", "data": {"id": 12}})
+    await manager.flush()
+    assert [frame["data"]["id"] for frame in socket.of_type("message")] == [10, 11]
+
+    await _close(socket, task)
+    assert manager.connections == {} and manager.active_connections == {}
+
+
+@pytest.mark.asyncio
+async def test_subscribe_and_unsubscribe_frames(manager, chats):
+    socket = FakeSocket()
+    task = await _open(socket, user_id=3)
+
+    await _send(manager, socket, {"type": "unsubscribe", "chat_id": 2})
+    await _send(manager, socket, {"type": "subscribe", "chat_id": 1})
+    await manager.broadcast(2, {"type": "message", "data": {"id": 1}})
+    await manager.flush()
+
+    assert socket.of_type("unsubscribed") == [{"type": "unsubscribed", "data": {"chats": [2]}}]
+    assert socket.of_type("error")[0]["data"]["chat_id"] == 1
+    assert socket.of_type("message") == []
+    assert 1 not in manager.active_connections
+
+    await _send(manager, socket, {"type": "ping"})
+    assert socket.sent[-1] == {"type": "pong"}
+    await _close(socket, task)
+
+
+@pytest.mark.asyncio
+async def test_chats_limit(manager, chats, monkeypatch):
+    monkeypatch.setattr(settings, "WS_USER_CHATS_LIMIT", 1)
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1)
+
+    # Самый свежий чат подписан сразу, остальные — фреймом subscribe
+    assert socket.sent[0]["data"]["chats"] == [2]
+    await _send(manager, socket, {"type": "subscribe", "chat_id": 1})
+    assert socket.sent[-1] == {"type": "subscribed", "data": {"chats": [1]}}
+    assert socket in manager.active_connections[1]
+    await _close(socket, task)
+
+
+@pytest.mark.asyncio
+async def test_preview_and_unread_beyond_chats_limit(db_session, manager, chats, monkeypatch):
+    monkeypatch.setattr(settings, "WS_USER_CHATS_LIMIT", 1)
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1)
+    assert socket.sent[0]["data"]["chats"] == [2]
+
+    relay = OutboxRelay(session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+                        publish=manager.broadcast)
+    message = await send_message(chat_id=1, sender_id=2, db=db_session, text="за лимитом")
+    # Прочитано на другом устройстве
+    await mark_read(db_session, {(1, 1): message.id})
+    await db_session.commit()
+    await relay.publish_pending()
+    await manager.flush()
+
+    # Сообщения чата 1 не приходят, превью — через личный канал
+    assert socket.of_type("message") == []
+    [updated] = socket.of_type("chat_updated")
+    assert updated["data"]["chat_id"] == 1 and updated["data"]["sender_id"] == 2
+    assert updated["data"]["last_message_text"] == "за лимитом"
+    assert socket.of_type("chat_read")[0]["data"] == {"chat_id": 1, "up_to_id": message.id, "count": 1}
+    await _close(socket, task)
+
+
+@pytest.mark.asyncio
+async def test_new_chat_announced_on_personal_channel(db_session, manager, chats):
+    db_session.add(Announcement(id=3, user_id=1))
+    await db_session.commit()
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1)
+
+    published = []
+
+    async def publish(chat_id, event):
+        published.append(chat_id)
+        await manager.broadcast(chat_id, event)
+
+    relay = OutboxRelay(session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False), publish=publish)
+    chat = await get_or_create_chat(announcement_id=3, buyer_id=2, db=db_session)
+    await relay.publish_pending()
+    await manager.flush()
+
+    assert sorted(published) == [user_channel(2), user_channel(1)]
+    [created] = socket.of_type("chat_created")
+    assert created["data"]["chat_id"] == chat.id and "event_id" in created
+
+    await _send(manager, socket, {"type": "subscribe", "chat_id": chat.id})
+    assert socket.sent[-1] == {"type": "subscribed", "data": {"chats": [chat.id]}}
+    await _close(socket, task)
+
+
+@pytest.mark.asyncio
+async def test_chat_socket_checks_access_without_marking_read(db_session, manager, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="непрочитанное")
+
+    denied = FakeSocket()
+    await _open(denied, user_id=3, chat_id=1)
+    assert denied.closed_with == 4003 and not denied.accepted
+
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1, chat_id=1)
+    await _send(manager, socket, {"type": "ping"})
+    assert socket.accepted and socket.sent == [{"type": "pong"}]
+
+    db_session.expire_all()
+    assert (await db_session.execute(select(message_is_read()).order_by(Message.id))).scalar_one() is False
+    events = (await db_session.execute(select(OutboxEvent.event_type).order_by(OutboxEvent.id))).scalars().all()
+    assert events == ["message", "chat_updated", "chat_updated"]
+    await _close(socket, task)
+
+
+@pytest.mark.asyncio
+async def test_read_frames_go_to_buffer(db_session, manager, chats, monkeypatch):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+    await send_message(chat_id=2, sender_id=3, db=db_session, text="b")
+    buffer = ReadReceiptBuffer(session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+                               flush_interval=3600)
+    await buffer.start()
+    monkeypatch.setattr(receipts_module, "read_receipts", buffer)
+
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1)
+    await _send(manager, socket, {"type": "read", "chat_id": 1, "message_id": 1})
+    await _send(manager, socket, {"type": "read", "chat_id": 2, "message_id": 2})
+    await _close(socket, task)
+
+    chat_socket = FakeSocket()
+    task = await _open(chat_socket, user_id=3, chat_id=2)
+    # Чужой чат — ошибка без отметки; в /ws/{chat_id} чат по умолчанию — свой
+    await _send(manager, chat_socket, {"type": "read", "chat_id": 1, "message_id": 1})
+    await _send(manager, chat_socket, {"type": "read", "message_id": 2})
+    await _close(chat_socket, task)
+
+    assert chat_socket.of_type("error")[0]["data"]["chat_id"] == 1
+    assert buffer.stats()["received"] == 3
+    db_session.expire_all()
+    assert (await db_session.execute(select(message_is_read()).order_by(Message.id))).scalars().all() == [False, False]
+
+    await buffer.stop()
+    db_session.expire_all()
+    assert (await db_session.execute(select(message_is_read()).order_by(Message.id))).scalars().all() == [True, True]
+
+
+@pytest.mark.asyncio
+async def test_read_frame_without_buffer_writes_at_once(db_session, manager, chats):
+    await send_message(chat_id=1, sender_id=2, db=db_session, text="a")
+
+    socket = FakeSocket()
+    task = await _open(socket, user_id=1, chat_id=1)
+    await _send(manager, socket, {"type": "read", "message_id": 1})
+    await _close(socket, task)
+
+    db_session.expire_all()
+    assert (await db_session.execute(select(message_is_read()).order_by(Message.id))).scalar_one() is True
+    events = (await db_session.execute(select(OutboxEvent.event_type).order_by(OutboxEvent.id))).scalars().all()
+    assert events == ["message", "chat_updated", "chat_updated", "read", "chat_read"]